@@ -1,39 +1,195 @@
+import os
+import time
+import queue
+import random
+import threading
+
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
 
-# PASTE YOUR DISCORD WEBHOOK URL HERE
-WEBHOOK_URL = "https://discord.com/api/webhooks/1469328578926874657/rCGr8TqdQLkf5RP-9GFZ5pbbTymR0xobvnKq8fZ3dy2ewZ8pJjp3B2Y-VxgAzIgXZnHK"
+import config
+import metrics
 
-def send_discord_alert(device, ip, threat_score):
+# PASTE YOUR DISCORD WEBHOOK URL HERE (or set RAKSHAK_WEBHOOK_URL)
+WEBHOOK_URL = os.environ.get("RAKSHAK_WEBHOOK_URL", "https://discord.com/api/webhooks/1469328578926874657/rCGr8TqdQLkf5RP-9GFZ5pbbTymR0xobvnKq8fZ3dy2ewZ8pJjp3B2Y-VxgAzIgXZnHK")
+
+def build_alert_payload(device, ip, threat_score, repeats=0):
+    """Discord webhook message (Hacker Style) for one threat."""
+    fields = [
+        {"name": "📍 Device", "value": device, "inline": True},
+        {"name": "🌐 Destination", "value": ip, "inline": True},
+        {"name": "🔥 Threat Score", "value": str(threat_score), "inline": False}
+    ]
+    if repeats:
+        fields.append({"name": "🔁 Repeated", "value": f"{repeats} more time(s) in the last window", "inline": False})
+    return {
+        "username": "Cyber-Rakshak Sentinel",
+        "avatar_url": "https://cdn-icons-png.flaticon.com/512/9662/9662234.png",
+        "embeds": [{
+            "title": "🚨 RED ALERT: THREAT DETECTED",
+            "description": f"**Anomaly Detected in IoT Network**",
+            "color": 15548997, # Red Color
+            "fields": fields,
+            "footer": {"text": "Action: Connection Severed | Admin Notified"}
+        }]
+    }
+# --- SINKS ---
+class WebhookSink:
+    """POSTs payloads over a pooled keep-alive session. Any object with send(payload) -> bool can replace it."""
+
+    def __init__(self, url, timeout=5.0, pool_size=4):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.retry_after = 0.0
+
+    def send(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code == 429:
+            # Discord tells us how long to back off
+            try:
+                self.retry_after = float(response.json().get("retry_after", 1.0))
+            except ValueError:
+                self.retry_after = 1.0
+            return False
+        self.retry_after = 0.0
+        # Status 204 (Discord) or any other 2xx means success
+        return 200 <= response.status_code < 300
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one can be taken now)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def take(self):
+        self.tokens -= 1
+
+# --- BACKGROUND DISPATCHER ---
+class AlertDispatcher:
     """
-    Sends a REAL notification to Discord. No passwords required.
+    Sends alerts from a worker thread so a slow webhook never blocks the UI.
+
+    Alerts go through a bounded queue (new alerts are dropped and counted
+    when it is full). The first alert for a device/destination is sent right
+    away; repeats inside dedup_window are folded into one follow-up message
+    with a repeat count. Delivery is rate limited by a token bucket and
+    retried with exponential backoff.
     """
-    try:
-        # 1. Create the Message Payload (Hacker Style)
-        payload = {
-            "username": "Cyber-Rakshak Sentinel",
-            "avatar_url": "https://cdn-icons-png.flaticon.com/512/9662/9662234.png",
-            "embeds": [{
-                "title": "🚨 RED ALERT: THREAT DETECTED",
-                "description": f"**Anomaly Detected in IoT Network**",
-                "color": 15548997, # Red Color
-                "fields": [
-                    {"name": "📍 Device", "value": device, "inline": True},
-                    {"name": "🌐 Destination", "value": ip, "inline": True},
-                    {"name": "🔥 Threat Score", "value": str(threat_score), "inline": False}
-                ],
-                "footer": {"text": "Action: Connection Severed | Admin Notified"}
-            }]
-        }
-        
-        # 2. Send it!
-        response = requests.post(WEBHOOK_URL, json=payload)
-        
-        # 3. Check if it worked (Status 204 means success)
-        if response.status_code == 204:
+
+    def __init__(self, sink, queue_size=1000, rate=0.5, burst=5, max_retries=4,
+                 backoff=1.0, dedup_window=60.0):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.dedup_window = dedup_window
+        self._recent = {}   # (device, ip) -> [window_start, repeats, worst_score]
+        self.stats = {"queued": 0, "dropped": 0, "deduplicated": 0, "sent": 0, "failed": 0}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rakshak-alerts", daemon=True)
+        self._thread.start()
+
+    def submit(self, device, ip, threat_score):
+        """Non-blocking; returns False if the queue is full and the alert was dropped."""
+        try:
+            self.queue.put_nowait((device, ip, threat_score))
+            self.stats["queued"] += 1
             return True
-        else:
+        except queue.Full:
+            self.stats["dropped"] += 1
             return False
-            
-    except Exception as e:
-        return False
\ No newline at end of file
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                alert = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                alert = None
+            if alert is not None:
+                self._handle(*alert)
+            self._flush_expired()
+
+    def _handle(self, device, ip, threat_score):
+        now = time.monotonic()
+        key = (device, ip)
+        entry = self._recent.get(key)
+        if entry is not None and now - entry[0] < self.dedup_window:
+            entry[1] += 1
+            entry[2] = min(entry[2], threat_score)   # lower score = more anomalous
+            self.stats["deduplicated"] += 1
+            return
+        self._recent[key] = [now, 0, threat_score]
+        self._deliver(build_alert_payload(device, ip, threat_score))
+
+    def _flush_expired(self):
+        now = time.monotonic()
+        for key, (start, repeats, worst) in list(self._recent.items()):
+            if now - start >= self.dedup_window:
+                del self._recent[key]
+                if repeats:
+                    self._deliver(build_alert_payload(key[0], key[1], worst, repeats=repeats))
+
+    def _deliver(self, payload):
+        for attempt in range(self.max_retries + 1):
+            delay = self.bucket.wait_time()
+            if delay:
+                if self._stop_event.wait(delay):
+                    return False
+                self.bucket.wait_time()
+            self.bucket.take()
+            try:
+                with metrics.STAGE_SECONDS.time("alert"):
+                    delivered = self.sink.send(payload)
+                if delivered:
+                    self.stats["sent"] += 1
+                    return True
+            except Exception:
+                pass
+            # Exponential backoff with jitter (or the server's retry_after, if larger)
+            pause = max(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5), getattr(self.sink, "retry_after", 0.0))
+            if self._stop_event.wait(pause):
+                break
+        self.stats["failed"] += 1
+        return False
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        self._thread.join(timeout)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher(
+                WebhookSink(WEBHOOK_URL, timeout=config.ALERT_TIMEOUT),
+                queue_size=config.ALERT_QUEUE_SIZE, rate=config.ALERT_RATE, burst=config.ALERT_BURST,
+                max_retries=config.ALERT_RETRIES, dedup_window=config.ALERT_DEDUP_WINDOW)
+    return _dispatcher
+
+metrics.REGISTRY.callback("alert_queue_depth", "Alerts waiting for the dispatcher thread.",
+                          lambda: _dispatcher.queue.qsize() if _dispatcher is not None else 0)
+
+def send_discord_alert(device, ip, threat_score):
+    """
+    Queues a REAL notification to Discord. No passwords required.
+    Returns immediately; delivery happens on the alert dispatcher thread.
+    """
+    return get_dispatcher().submit(device, ip, threat_score)
\ No newline at end of file
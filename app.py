@@ -1,11 +1,12 @@
+import html
 import streamlit as st
 import pandas as pd
 import backend
 import alerts
+import config
+from traffic_store import THREAT_STATUS, to_local_datetime
 import time
-import plotly.express as px
 import plotly.graph_objects as go
-import random
 
 # --- PAGE SETUP ---
 st.set_page_config(
@@ -114,8 +115,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- INITIALIZATION ---
-if "data" not in st.session_state:
-    st.session_state["data"] = pd.DataFrame(columns=["Timestamp", "Device", "Destination", "Protocol", "AI_Status", "Anomaly_Score", "Alert"])
+# Traffic lives in one shared feed (backend.LiveFeed) that every session reads
+live_feed = backend.get_live_feed()
 
 if "scan_results" not in st.session_state:
     st.session_state["scan_results"] = None
@@ -132,6 +133,11 @@ with st.sidebar:
     
     st.markdown("### ⚙️ CONTROLS")
     run_simulation = st.checkbox("Active Monitoring", value=True)
+    # The switch drives the shared feed itself: unticked, nothing is drained or scored
+    if run_simulation:
+        live_feed.start()
+    else:
+        live_feed.stop()
     
     st.markdown("### ⚡ ACTIONS")
     # ATTACK BUTTON
@@ -141,6 +147,7 @@ with st.sidebar:
             counter_strike = backend.deploy_decoy_data(new_packet["Destination"])
             time.sleep(0.8)
         st.session_state["attack_data"] = {"packet": new_packet, "counter_strike": counter_strike}
+        live_feed.set_attack(new_packet)
         alerts.send_discord_alert(new_packet["Device"], new_packet["Destination"], new_packet["Anomaly_Score"])
         st.toast("Threat Detected", icon="🚨")
 
@@ -150,23 +157,61 @@ with st.sidebar:
         st.markdown("### 🛡️ RESPONSE CONSOLE")
         
         attack_info = st.session_state["attack_data"]["packet"]
-        
-        # 1. GENERATE FULL 'GOVERNMENT' REPORT
+        attacker_ip = attack_info.get("Remote_IP") or attack_info["Destination"]
+
+        # 1. GENERATE FULL 'GOVERNMENT' REPORT FROM THE EVENT STORE
+        incident = backend.incident_report(attacker_ip, attack_info.get("Epoch"))
+        if incident:
+            incident_id = incident["incident_id"]
+            timeline = "\n".join(
+                f"{time.strftime('%H:%M:%S', time.localtime(e['epoch']))}  {e['device']:<24} {e['protocol']:<5} "
+                f"{e['size']:>8,.0f} B  {e['status']}  {e['alert']}" for e in incident["timeline"]) or "(none)"
+            evidence = f"""
+[STORED EVIDENCE // LAST {(incident['end'] - incident['start']) / 60:.0f} MIN]
+-------------------------------------------------------------
+EVENTS      : {incident['events']:,} ({incident['events_estimated']:,} est. packets, {incident['bytes'] / 1e6:,.2f} MB)
+FLAGGED     : {incident['flagged']:,} ({incident['threats']:,} threats)
+DEVICES     : {', '.join(f'{d} ({n})' for d, n in incident['devices'].items()) or '-'}
+PROTOCOLS   : {', '.join(f'{p} ({n})' for p, n in incident['protocols'].items()) or '-'}
+ALERTS      : {'; '.join(incident['alerts']) or '-'}
+
+[TIMELINE // FLAGGED EVENTS]
+-------------------------------------------------------------
+{timeline}
+"""
+        else:
+            incident_id = f"CR-{int(attack_info.get('Epoch', time.time()))}"
+            evidence = "\n[STORED EVIDENCE]\n-------------------------------------------------------------\nEVENT STORE UNAVAILABLE\n"
+
+        # Packets are cut from the evidence rings on request (a scan of up to a few hundred MB)
+        packets = st.session_state["attack_data"].get("pcap")
+        if packets is None:
+            pcap_line = "NOT EXTRACTED (USE 'EXTRACT PACKET CAPTURE')"
+        elif not packets["rings"]:
+            pcap_line = "NO RAW CAPTURE BUFFER"
+        else:
+            pcap_line = (f"INCIDENT_{incident_id}.pcapng ({packets['packets']:,} packets, "
+                         f"{packets['bytes'] / 1e3:,.1f} KB from {packets['rings']} ring(s))")
+        evidence += f"""
+[PACKET EVIDENCE]
+-------------------------------------------------------------
+PCAP        : {pcap_line}
+"""
         report_text = f"""[TOP SECRET // GOVT OF INDIA // CYBER DEFENSE]
 =============================================================
        CYBER-RAKSHAK: INCIDENT FORENSIC REPORT
 =============================================================
-INCIDENT ID : CR-{random.randint(1000,9999)}-X
+INCIDENT ID : {incident_id}
 TIMESTAMP   : {attack_info['Timestamp']}
 STATUS      : 🔴 CRITICAL THREAT CONTAINED
 
 [THREAT INTELLIGENCE]
 -------------------------------------------------------------
-SOURCE IP   : {attack_info['Destination']}
+SOURCE IP   : {attacker_ip} ({attack_info['Destination']})
 PROTOCOL    : {attack_info['Protocol']}
 PAYLOAD     : ENCRYPTED_BINARY_BLOB (POSSIBLE RANSOMWARE)
 ANOMALY SC  : {attack_info['Anomaly_Score']} (EXTREME)
-
+{evidence}
 [AI ANALYSIS]
 -------------------------------------------------------------
 > Isolation Forest detected deviation in packet size/frequency.
@@ -186,9 +231,27 @@ VERIFIED BY : CYBER-RAKSHAK AI CORE v2.0
         st.download_button(
             label="📄 DOWNLOAD FULL FORENSIC LOG", 
             data=report_text, 
-            file_name=f"INCIDENT_REPORT_{attack_info['Timestamp']}.txt", 
+            file_name=f"INCIDENT_REPORT_{incident_id}.txt", 
             use_container_width=True
         )
+        if packets is None:
+            if st.button("📦 EXTRACT PACKET CAPTURE", use_container_width=True):
+                with st.spinner("Cutting packets from the evidence buffer..."):
+                    start = incident["start"] if incident else attack_info.get("Epoch", time.time()) - 3600
+                    result = backend.packet_evidence(attacker_ip, incident_id, start=start)
+                st.session_state["attack_data"]["pcap"] = result or {"packets": 0, "bytes": 0, "rings": 0}
+                st.rerun()
+        elif packets["packets"]:
+            with open(packets["path"], "rb") as f:
+                st.download_button(
+                    label="📦 DOWNLOAD PACKET CAPTURE (PCAPNG)",
+                    data=f.read(),
+                    file_name=f"INCIDENT_{incident_id}.pcapng",
+                    mime="application/vnd.tcpdump.pcap",
+                    use_container_width=True
+                )
+        else:
+            st.caption(f"No buffered packets to or from {attacker_ip}.")
         
         # 2. Kill Switch
         st.markdown("**2. Active Defense**")
@@ -199,13 +262,14 @@ VERIFIED BY : CYBER-RAKSHAK AI CORE v2.0
                 time.sleep(0.01)
                 progress_bar.progress(i*2)
             
-            attacker_ip = st.session_state["attack_data"]["packet"]["Destination"]
-            res = backend.sever_connection(attacker_ip)
+            # Take down recent threat-intel matches in the same apply
+            res = backend.sever_connection(attacker_ip, extra_ips=backend.intel_matches())
             if res["status"] == "success": st.success("Target Blocked")
             else: st.warning("Simulation Blocked")
             
             time.sleep(2)
             st.session_state["attack_data"] = None
+            live_feed.set_attack(None)
             st.rerun()
             
     st.markdown("---")
@@ -231,171 +295,255 @@ VERIFIED BY : CYBER-RAKSHAK AI CORE v2.0
             st.session_state["scan_results"] = None
             st.rerun()
 
+# --- SHARED, CACHED RENDER DATA ---
+# Keyed by the feed version, so each tick is computed once no matter how
+# many operators are watching.
+@st.cache_data(max_entries=4, show_spinner=False)
+def traffic_snapshot(version):
+    def copy_out(store):
+        cols = store.columns(newest_first=False)
+        return {"stats": store.stats(), "records": store.records(config.TRAFFIC_TABLE_ROWS),
+                "epoch": cols["Epoch"].copy(), "score": cols["Anomaly_Score"].copy()}
+    return live_feed.read(copy_out)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def traffic_table_html(version):
+    snapshot = traffic_snapshot(version)
+    # Custom HTML Table
+    html_rows = []
+    for row in snapshot["records"]:
+        row_class = "alert-row" if row['AI_Status'] == THREAT_STATUS else ""
+        # Destinations include DNS names seen on the wire, so every cell is escaped
+        cells = "".join([f"<td>{html.escape(str(row[col]))}</td>" for col in ("Timestamp", "Device", "Destination", "Protocol", "AI_Status")])
+        html_rows.append(f"<tr class='{row_class}'>{cells}</tr>")
+    return f"""
+    <div class="css-card" style="padding:10px;">
+    <table class='modern-table'>
+        <thead><tr><th>TIME</th><th>DEVICE</th><th>DEST</th><th>PROTO</th><th>STATUS</th></tr></thead>
+        <tbody>{''.join(html_rows)}</tbody>
+    </table>
+    </div>
+    """
+
+@st.cache_resource
+def anomaly_layout():
+    return go.Layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font_color="#888",
+        margin=dict(l=10, r=10, t=10, b=10),
+        height=250,
+        xaxis=dict(showgrid=False, title="Timestamp"),
+        yaxis=dict(showgrid=True, gridcolor="#333", title="Anomaly_Score")
+    )
+
+@st.cache_resource
+def threat_map(under_attack):
+    """The map only has two states, so each figure is built once per process."""
+    # --- MAP LOGIC (FIXED) ---
+    start_lat, start_lon = 20.5937, 78.9629  # India
+
+    fig = go.Figure()
+
+    # Only draw the RED LINE if there is an active attack
+    if under_attack:
+        end_lat, end_lon = 39.9042, 116.4074 # Beijing (Target)
+
+        # 1. The Line
+        fig.add_trace(go.Scattergeo(
+            lat = [start_lat, end_lat], lon = [start_lon, end_lon],
+            mode = 'lines', line = dict(width = 2, color = '#ff4b4b'), opacity = 0.8
+        ))
+        # 2. The Target Dot
+        fig.add_trace(go.Scattergeo(
+            lat = [end_lat], lon = [end_lon],
+            mode = 'markers', marker = dict(size = 20, color = '#ff4b4b', opacity=0.3), hoverinfo='none'
+        ))
+        # 3. Text Labels
+        fig.add_trace(go.Scattergeo(
+            lat = [start_lat, end_lat], lon = [start_lon, end_lon],
+            mode = 'markers+text',
+            marker = dict(size = 8, color = '#ffffff'),
+            text = ["You", "⚠️ ATTACKER"], textposition="top center",
+            textfont = dict(color="white", size=10, family="Helvetica")
+        ))
+    else:
+        # SAFE STATE: Just show "You"
+        fig.add_trace(go.Scattergeo(
+            lat = [start_lat], lon = [start_lon],
+            mode = 'markers+text',
+            marker = dict(size = 10, color = '#ccff00'), # Green dot
+            text = ["🛡️ You (Secure)"], textposition="top center",
+            textfont = dict(color="#ccff00", size=11, family="Helvetica")
+        ))
+
+    # --- MAP STYLING (FIXED - NO WHITE BOX) ---
+    fig.update_layout(
+        template="plotly_dark", # Force Dark Theme
+        geo = dict(
+            projection_type = "equirectangular",
+            showland = True, landcolor = "#262626", # Matches Metric BG
+            showocean = True, oceancolor = "#1a1a1a", # Matches Card BG
+            showcountries = True, countrycolor = "#444",
+            showcoastlines = False,
+            bgcolor = "rgba(0,0,0,0)",
+            showframe = False
+        ),
+        margin = dict(l=0, r=0, t=10, b=0),
+        paper_bgcolor = "rgba(0,0,0,0)", # Transparent
+        plot_bgcolor = "rgba(0,0,0,0)",
+        height = 300,
+        showlegend = False
+    )
+    return fig
+
+# --- PARTIAL UPDATES ---
+# Each live panel is a fragment that reruns on its own timer without
+# re-executing the page. Streamlit builds without fragments fall back to
+# the full-page rerun loop at the bottom.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+def live_panel(seconds):
+    def wrap(fn):
+        if _fragment is None:
+            return fn
+        return _fragment(run_every=seconds if run_simulation else None)(fn)
+    return wrap
+
+def human_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:,.0f} {unit}" if unit == "B" else f"{num_bytes:,.1f} {unit}"
+        num_bytes /= 1024
+
+@live_panel(config.DASHBOARD_METRICS_REFRESH)
+def metrics_panel():
+    traffic_stats = traffic_snapshot(live_feed.version)["stats"]
+    pipeline = backend.pipeline_metrics()
+    c1, c2, c3, c4 = st.columns(4)
+
+    # Packet rate from the scored counter between two refreshes of this panel
+    scored = pipeline.get("packets_scored_total", 0)
+    flagged = pipeline.get("packets_flagged_total", 0)
+    now = time.monotonic()
+    last_time, last_scored = st.session_state.get("load_sample", (now, scored))
+    st.session_state["load_sample"] = (now, scored)
+    rate = (scored - last_scored) / (now - last_time) if now > last_time and scored >= last_scored else 0.0
+    inference = pipeline.get("stage_seconds", {}).get("inference") or {}
+    load = backend.top_talkers("device", "1m", 1)
+
+    active_threats = traffic_stats["threats_in_window"]
+
+    top = f" · top: {load['top'][0][0]}" if load["top"] else ""
+    c1.metric("Network Load", f"{human_bytes(load['bytes_per_s'])}/s", f"{rate:,.0f} pkt/s{top}", delta_color="off")
+    if scored:
+        p95 = f"p95 inference {inference['p95'] * 1000:.1f} ms" if inference.get("p95") is not None else "Stable"
+        c2.metric("Secure Traffic", f"{100 * (1 - flagged / scored):.1f}%", p95, delta_color="off")
+    else:
+        c2.metric("Secure Traffic", "—", "No traffic yet", delta_color="off")
+
+    if active_threats:
+        c3.metric("Active Threats", f"{active_threats}", "CRITICAL", delta_color="inverse")
+        c4.metric("System Status", "COMPROMISED", "Action Req", delta_color="inverse")
+    else:
+        c3.metric("Active Threats", "0", "None", delta_color="off")
+        c4.metric("System Status", "SECURE", "Optimal")
+
+@live_panel(config.DASHBOARD_MAP_REFRESH)
+def map_panel():
+    st.markdown('<div class="css-card">', unsafe_allow_html=True)
+    st.subheader("🌍 Real-Time Threat Tracer")
+    st.plotly_chart(threat_map(live_feed.attack_packet is not None), use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@live_panel(config.DASHBOARD_TABLE_REFRESH)
+def table_panel():
+    version = live_feed.version
+    traffic_stats = traffic_snapshot(version)["stats"]
+    st.markdown("### 📝 Live Traffic")
+    st.markdown(traffic_table_html(version), unsafe_allow_html=True)
+    protocols = " · ".join(f"{p} {n:,}" for p, n in sorted(traffic_stats["protocols"].items(), key=lambda kv: -kv[1])[:4])
+    sampled = f" (~{traffic_stats['events_estimated']:,} before sampling)" if traffic_stats["events_estimated"] > traffic_stats["events"] else ""
+    st.caption(f"Latest {min(traffic_stats['buffered'], config.TRAFFIC_TABLE_ROWS)} of {traffic_stats['events']:,} events{sampled} · "
+               f"{traffic_stats['bytes_total'] / 1e6:,.1f} MB · {traffic_stats['threats_total']} threats · {protocols}")
+
+@live_panel(config.DASHBOARD_CHART_REFRESH)
+def anomaly_panel():
+    snapshot = traffic_snapshot(live_feed.version)
+    st.markdown("### 📈 Anomaly Score")
+    if snapshot["stats"]["buffered"]:
+        active_threats = snapshot["stats"]["threats_in_window"]
+        line_color = '#ff4b4b' if active_threats else '#ccff00'
+        # Cached layout + one WebGL trace over the shared history window
+        fig_graph = go.Figure(go.Scattergl(
+            x=to_local_datetime(snapshot["epoch"]), y=snapshot["score"], mode="lines",
+            line=dict(color=line_color, width=3), fill='tozeroy',
+            fillcolor=f"rgba({255 if active_threats else 204}, {75 if active_threats else 255}, 0, 0.1)"
+        ), layout=anomaly_layout())
+
+        st.markdown('<div class="css-card">', unsafe_allow_html=True)
+        st.plotly_chart(fig_graph, use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+@live_panel(config.DASHBOARD_CHART_REFRESH)
+def talkers_panel():
+    st.markdown("### 📊 Top Talkers")
+    c_dim, c_win = st.columns(2)
+    dimension = c_dim.selectbox("By", ["device", "destination", "source", "protocol"], key="talkers_dimension")
+    window = c_win.radio("Window", ["1m", "15m", "1h"], horizontal=True, key="talkers_window")
+    result = backend.top_talkers(dimension, window, config.TALKERS_ROWS)
+    if not result["top"]:
+        st.caption("No traffic seen yet.")
+        return
+    total = result["bytes_per_s"] or 1.0
+    st.dataframe(pd.DataFrame({
+        dimension.title(): [str(key) for key, _, _, _ in result["top"]],
+        "Traffic": [human_bytes(nbytes) for _, nbytes, _, _ in result["top"]],
+        "Rate": [f"{human_bytes(rate)}/s" for _, _, rate, _ in result["top"]],
+        "Share": [f"{100 * rate / total:.0f}%" for _, _, rate, _ in result["top"]],
+    }), hide_index=True, use_container_width=True)
+
 # --- MAIN DASHBOARD LAYOUT ---
 st.title("🛡️ Command Center")
 
-# --- TOP METRICS ROW (Card Style) ---
-dashboard_placeholder = st.empty()
+# --- ROW 1: METRICS ---
+metrics_panel()
+
+# --- ROW 2: MAP & ATTACK DETAILS ---
+col_map, col_details = st.columns([2, 1])
 
-# --- MAIN LOOP ---
-if run_simulation:
-    # Traffic Logic
-    if st.session_state["attack_data"] and random.random() < 0.6:
-        new_packet = st.session_state["attack_data"]["packet"].copy()
-        new_packet["Timestamp"] = time.strftime("%H:%M:%S")
-        new_packet["AI_Status"] = "🚨 THREAT" 
+with col_map:
+    map_panel()
+
+with col_details:
+    if st.session_state["attack_data"]:
+        data = st.session_state["attack_data"]
+        cs = data["counter_strike"]
+        st.markdown('<div class="css-card" style="border: 1px solid #ff4b4b;">', unsafe_allow_html=True)
+        st.subheader("🚨 Threat Intelligence")
+        st.write(f"**Target:** {cs['target']}")
+        st.write(f"**Payload:** {cs['filename']}")
+        st.code(cs['payload'][:100] + "...", language="sql")
+        st.markdown("</div>", unsafe_allow_html=True)
     else:
-        new_packet = backend.get_data_stream(num_packets=1)[0]
-    
-    # Update Data
-    df_new = pd.DataFrame([new_packet])
-    st.session_state["data"] = pd.concat([df_new, st.session_state["data"]], ignore_index=True).head(30)
-    df = st.session_state["data"]
-    
-    with dashboard_placeholder.container():
-        # --- ROW 1: METRICS ---
-        c1, c2, c3, c4 = st.columns(4)
-        if "total_packets" not in st.session_state: st.session_state["total_packets"] = 2450 
-        st.session_state["total_packets"] += random.randint(50, 150)
-        
-        threats = df[df["AI_Status"] == "🚨 THREAT"]
-        
-        c1.metric("Network Load", f"{st.session_state['total_packets']:,}", "+120/s")
-        c2.metric("Secure Traffic", "99.1%", "Stable")
-        
-        if not threats.empty:
-            c3.metric("Active Threats", f"{len(threats)}", "CRITICAL", delta_color="inverse")
-            c4.metric("System Status", "COMPROMISED", "Action Req", delta_color="inverse")
-        else:
-            c3.metric("Active Threats", "0", "None", delta_color="off")
-            c4.metric("System Status", "SECURE", "Optimal")
+        st.markdown('<div class="css-card">', unsafe_allow_html=True)
+        st.subheader("✅ System Diagnostics")
+        st.write("Firewall: **Active**")
+        st.write("IPS Engine: **Running**")
+        st.write("Last Scan: **Just Now**")
+        st.progress(100)
+        st.markdown("</div>", unsafe_allow_html=True)
 
-        # --- ROW 2: MAP & ATTACK DETAILS ---
-        col_map, col_details = st.columns([2, 1])
-        
-        with col_map:
-            st.markdown('<div class="css-card">', unsafe_allow_html=True)
-            st.subheader("🌍 Real-Time Threat Tracer")
-            
-            # --- MAP LOGIC (FIXED) ---
-            start_lat, start_lon = 20.5937, 78.9629  # India
-            
-            fig = go.Figure()
-            
-            # Only draw the RED LINE if there is an active attack
-            if st.session_state["attack_data"]:
-                end_lat, end_lon = 39.9042, 116.4074 # Beijing (Target)
-                
-                # 1. The Line
-                fig.add_trace(go.Scattergeo(
-                    lat = [start_lat, end_lat], lon = [start_lon, end_lon],
-                    mode = 'lines', line = dict(width = 2, color = '#ff4b4b'), opacity = 0.8
-                ))
-                # 2. The Target Dot
-                fig.add_trace(go.Scattergeo(
-                    lat = [end_lat], lon = [end_lon],
-                    mode = 'markers', marker = dict(size = 20, color = '#ff4b4b', opacity=0.3), hoverinfo='none'
-                ))
-                # 3. Text Labels
-                fig.add_trace(go.Scattergeo(
-                    lat = [start_lat, end_lat], lon = [start_lon, end_lon],
-                    mode = 'markers+text',
-                    marker = dict(size = 8, color = '#ffffff'),
-                    text = ["You", "⚠️ ATTACKER"], textposition="top center",
-                    textfont = dict(color="white", size=10, family="Helvetica")
-                ))
-            else:
-                # SAFE STATE: Just show "You"
-                fig.add_trace(go.Scattergeo(
-                    lat = [start_lat], lon = [start_lon],
-                    mode = 'markers+text',
-                    marker = dict(size = 10, color = '#ccff00'), # Green dot
-                    text = ["🛡️ You (Secure)"], textposition="top center",
-                    textfont = dict(color="#ccff00", size=11, family="Helvetica")
-                ))
-
-            # --- MAP STYLING (FIXED - NO WHITE BOX) ---
-            fig.update_layout(
-                template="plotly_dark", # Force Dark Theme
-                geo = dict(
-                    projection_type = "equirectangular",
-                    showland = True, landcolor = "#262626", # Matches Metric BG
-                    showocean = True, oceancolor = "#1a1a1a", # Matches Card BG
-                    showcountries = True, countrycolor = "#444",
-                    showcoastlines = False,
-                    bgcolor = "rgba(0,0,0,0)",
-                    showframe = False
-                ),
-                margin = dict(l=0, r=0, t=10, b=0),
-                paper_bgcolor = "rgba(0,0,0,0)", # Transparent
-                plot_bgcolor = "rgba(0,0,0,0)",
-                height = 300,
-                showlegend = False
-            )
-            st.plotly_chart(fig, use_container_width=True)
-            st.markdown('</div>', unsafe_allow_html=True)
-
-        with col_details:
-            if st.session_state["attack_data"]:
-                data = st.session_state["attack_data"]
-                cs = data["counter_strike"]
-                st.markdown('<div class="css-card" style="border: 1px solid #ff4b4b;">', unsafe_allow_html=True)
-                st.subheader("🚨 Threat Intelligence")
-                st.write(f"**Target:** {cs['target']}")
-                st.write(f"**Payload:** {cs['filename']}")
-                st.code(cs['payload'][:100] + "...", language="sql")
-                st.markdown("</div>", unsafe_allow_html=True)
-            else:
-                st.markdown('<div class="css-card">', unsafe_allow_html=True)
-                st.subheader("✅ System Diagnostics")
-                st.write("Firewall: **Active**")
-                st.write("IPS Engine: **Running**")
-                st.write("Last Scan: **Just Now**")
-                st.progress(100)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-        # --- ROW 3: TABLE & GRAPH ---
-        col_table, col_graph = st.columns([2, 1])
-        
-        with col_table:
-            st.markdown("### 📝 Live Traffic")
-            # Custom HTML Table
-            display_df = df[["Timestamp", "Device", "Destination", "Protocol", "AI_Status"]]
-            html_rows = []
-            for row in display_df.to_dict('records'):
-                row_class = "alert-row" if row['AI_Status'] == "🚨 THREAT" else ""
-                cells = "".join([f"<td>{val}</td>" for val in row.values()])
-                html_rows.append(f"<tr class='{row_class}'>{cells}</tr>")
-            
-            final_html = f"""
-            <div class="css-card" style="padding:10px;">
-            <table class='modern-table'>
-                <thead><tr><th>TIME</th><th>DEVICE</th><th>DEST</th><th>PROTO</th><th>STATUS</th></tr></thead>
-                <tbody>{''.join(html_rows)}</tbody>
-            </table>
-            </div>
-            """
-            st.markdown(final_html, unsafe_allow_html=True)
-
-        with col_graph:
-            st.markdown("### 📈 Anomaly Score")
-            if not df.empty:
-                fig_graph = px.line(df, x="Timestamp", y="Anomaly_Score")
-                fig_graph.update_layout(
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    font_color="#888",
-                    margin=dict(l=10, r=10, t=10, b=10),
-                    height=250,
-                    xaxis=dict(showgrid=False),
-                    yaxis=dict(showgrid=True, gridcolor="#333")
-                )
-                line_color = '#ff4b4b' if not threats.empty else '#ccff00'
-                fig_graph.update_traces(line_color=line_color, line_width=3, fill='tozeroy', fillcolor=f"rgba({255 if not threats.empty else 204}, {75 if not threats.empty else 255}, 0, 0.1)")
-                
-                st.markdown('<div class="css-card">', unsafe_allow_html=True)
-                st.plotly_chart(fig_graph, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
-
-    time.sleep(1.5)
+# --- ROW 3: TABLE & GRAPH ---
+col_table, col_graph = st.columns([2, 1])
+
+with col_table:
+    table_panel()
+
+with col_graph:
+    anomaly_panel()
+    talkers_panel()
+
+if run_simulation and _fragment is None:
+    time.sleep(config.DASHBOARD_TICK)
     st.rerun()
@@ -2,11 +2,30 @@ import time
 import pandas as pd
 import numpy as np
 import random
-import socket 
 import os
-import platform
-import subprocess
-from sklearn.ensemble import IsolationForest
+import ipaddress
+import threading
+
+import baselines
+import capture
+import config
+import daemon
+import decoys
+import devices
+import enrichment
+import event_store
+import evidence
+import firewall
+import intel
+import metrics
+import rules
+import scanner
+import talkers
+import sharding
+from flows import FlowTable, flow_key, is_local_address
+from model_store import ModelStore
+from scoring import BatchScorer
+from traffic_store import TrafficStore, THREAT_STATUS
 
 # --- SCAPY SETUP ---
 try:
@@ -16,25 +35,35 @@ except ImportError:
     SCAPY_AVAILABLE = False
     print("⚠️ WARNING: Scapy not found. Switching to Simulation Mode.")
 
-# --- 1. TRAIN THE AI MODEL ---
-print("🧠 Training AI Model...")
-clf = IsolationForest(contamination=0.1, random_state=42)
-X_train = np.random.normal(loc=[50, 0, 10], scale=[10, 0.5, 2], size=(100, 3))
-clf.fit(X_train)
-print("✅ AI Model Trained & Ready.")
+# --- 1. THE AI MODEL ---
+# The detector scores per-flow feature vectors (see flows.FEATURE_NAMES).
+# It is loaded from disk on first use; retrain with `python model_store.py retrain`.
+model_store = ModelStore(config.MODEL_PATH, check_interval=config.MODEL_CHECK_INTERVAL)
+
+def __getattr__(name):
+    # backend.clf stays available, but only touches the disk when first used
+    if name == "clf":
+        return model_store.get()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+flow_table = FlowTable(window=config.FLOW_WINDOW, idle_timeout=config.FLOW_IDLE_TIMEOUT, max_flows=config.FLOW_MAX)
+# Per-device baselines (baselines.py) take over from the global model once a device is warmed up
+scorer = BatchScorer(model_store.get, batch_size=config.SCORE_BATCH_SIZE,
+                     baselines=baselines.get_registry() if config.BASELINES_ENABLED else None)
 
 # --- 2. HELPER FUNCTIONS ---
 def get_location_from_ip(ip):
-    if ip.startswith("192.168") or ip.startswith("10."): return "Local Network (Home)"
-    elif ip.startswith("172.") or ip.startswith("142."): return "USA (Google/AWS)"
-    elif ip.startswith("104.") or ip.startswith("157."): return "USA (Cloudflare)"
-    else: return "Internet (Public)"
+    # Longest-prefix match against the CIDR tables in data/enrichment (LRU cached)
+    return enrichment.get_enricher().location(ip)
 
 def generate_fake_attack():
     return {
         "Timestamp": time.strftime("%H:%M:%S"),
+        "Epoch": time.time(),
         "Device": "Smart Bulb (IoT)",
         "Destination": "Unknown (China Server)",
+        "Local_IP": "192.168.1.23",
+        "Remote_IP": "203.0.113.55",
         "Size_KB": 0.5,
         "Direction": "Upload",
         "Protocol": "TCP",
@@ -44,85 +73,260 @@ def generate_fake_attack():
     }
 
 # --- 3. MAIN DATA STREAM FUNCTION ---
-def get_data_stream(num_packets=1):
+def get_device_classifier():
+    classifier = devices.get_classifier()
+    if not classifier.aliases:
+        classifier.aliases[scanner.get_local_ip()] = "My Laptop"
+    net_scanner = scanner.current_scanner()   # inventory only exists once a scan was requested
+    if net_scanner is not None:
+        classifier.sync_inventory(net_scanner.inventory)
+    return classifier
+
+def build_rows(records):
+    """
+    Enrichment stage: one dashboard row per capture record
+    (capture.parse_packet tuples), with direction, device and destination.
+    """
+    rows = []
+    remote_ips = []
+    local_ips = []
+    service_ports = set()   # (local ip, service port) fingerprints, de-duplicated per batch
+    for ts, src, dst, sport, dport, proto, size, flags in records:
+        if is_local_address(src):
+            direction = "Upload"
+            local_ip, remote_ip = src, dst
+        else:
+            direction = "Download"
+            local_ip, remote_ip = dst, src
+        local_ips.append(local_ip)
+        remote_ips.append(remote_ip)
+        if sport and dport:
+            service_ports.add((local_ip, min(sport, dport)))
+        rows.append({
+            "Timestamp": time.strftime("%H:%M:%S", time.localtime(ts)),
+            "Epoch": ts,
+            "Device": "",
+            "Destination": "",
+            "Local_IP": local_ip,
+            "Remote_IP": remote_ip,
+            "Size_KB": size,
+            "Direction": direction,
+            "Protocol": proto,
+            "AI_Status": "",
+            "Anomaly_Score": 0.0,
+            "Alert": "-",
+            "Sample_Rate": capture.sample_rate(flags)   # packets this row stands for under flow sampling
+        })
+    # One vectorized range lookup for the whole batch instead of one per packet
+    locations = enrichment.get_enricher().locations_batch(remote_ips)
+    # Local side -> "Type (ip)" from the scanner inventory's MAC vendor + port fingerprints
+    classifier = get_device_classifier()
+    classifier.observe_ports(service_ports)
+    labels = classifier.labels_batch(local_ips)
+    for row, location, label in zip(rows, locations, labels):
+        row["Destination"] = location
+        row["Device"] = label
+    return rows
+
+def enrich_records(records):
+    """
+    Flow aggregation + enrichment stage: turns capture records into
+    (flow features, dashboard row, device address) triples.
+    """
+    features = []
+    device_ips = []
+    with metrics.STAGE_SECONDS.time("enrich"):
+        for ts, src, dst, sport, dport, proto, size, flags in records:
+            key = flow_key(src, dst, sport, dport, proto)
+            slot = flow_table.update(ts, key, size, flags, upload=is_local_address(src))
+            features.append(flow_table.features(slot))
+            device_ips.append(baselines.device_of(src, dst))
+        return list(zip(features, build_rows(records), device_ips))
+
+def score_rows(enriched):
+    """Scoring stage: each row is scored on its flow's features, in vectorized batches."""
+    scored = []
+    for features, row, device_ip in enriched:
+        scored.extend(scorer.add(features, row, device_ip))
+    # Callers want everything handed in so far, so don't wait for a full batch
+    scored.extend(scorer.flush())
+    return scored
+
+def process_records(records, arp_events=(), dns_events=()):
+    """
+    Full pipeline for capture records; shared by live capture and pcap replay.
+    Threat-intel feeds and the fast-path rules see every packet first; only
+    what they let through is tracked in flows and scored by the model.
+    """
+    captured = records
+    rule_rows = []
+    if config.INTEL_ENABLED:
+        matcher = intel.get_intel()
+        if dns_events:
+            rule_rows.extend(build_dns_rows(matcher.check_dns(dns_events)))
+        records, hits = matcher.split(records)
+        rule_rows.extend(build_rule_rows(hits))
+    if config.RULES_ENABLED:
+        engine = rules.get_engine()
+        records, hits = engine.split(records)
+        rule_rows.extend(build_rule_rows(hits))
+        if arp_events:
+            net_scanner = scanner.current_scanner()
+            engine.sync_inventory(net_scanner.inventory if net_scanner is not None else None)
+            rule_rows.extend(build_arp_rows(engine.check_arp(arp_events)))
+    pipeline = get_sharded_pipeline()
+    if not records:
+        rows = []
+    elif pipeline is not None:
+        rows = score_sharded(pipeline, records)
+    else:
+        rows = score_rows(enrich_records(records))
+    rows = rule_rows + rows
+    talkers.get_talkers().observe(captured, rows)
+    store = event_store.get_store()
+    if store is not None:
+        store.append(rows)   # buffered; written as Parquet segments in the background
+    if evidence.capturing():
+        collector = evidence.get_collector()
+        for row in rows:
+            if row["AI_Status"] == THREAT_STATUS and row.get("Remote_IP"):
+                collector.incident(row["Remote_IP"], row.get("Epoch"))   # pcap cut in the background
+    metrics.PACKETS_SCORED.inc(len(rows))
+    metrics.PACKETS_FLAGGED.inc(sum(1 for row in rows if row["AI_Status"] != scorer.safe_label))
+    return rows
+
+def build_rule_rows(hits):
+    """Threat rows for packets a fast-path rule fired on (see rules.RulesEngine.split)."""
+    rows = build_rows([record for record, _, _, _ in hits])
+    for row, (_, rule, reason, offender) in zip(rows, hits):
+        row["AI_Status"] = THREAT_STATUS
+        row["Anomaly_Score"] = -1.0
+        row["Alert"] = reason
+        row["Remote_IP"] = offender   # what auto-block acts on, e.g. the scanner rather than its target
+    return rows
+
+def build_arp_rows(conflicts):
+    classifier = get_device_classifier()
+    rows = []
+    for ts, ip, mac, reason in conflicts:
+        rows.append({
+            "Timestamp": time.strftime("%H:%M:%S", time.localtime(ts)),
+            "Epoch": ts,
+            "Device": classifier.labels_batch([ip])[0],
+            "Destination": f"LAN ({mac})",
+            "Local_IP": ip,
+            "Remote_IP": "",          # never auto-block the address being impersonated
+            "Size_KB": 0,
+            "Direction": "-",
+            "Protocol": "ARP",
+            "AI_Status": THREAT_STATUS,
+            "Anomaly_Score": -1.0,
+            "Alert": reason,
+        })
+    return rows
+
+def build_dns_rows(lookups):
+    """Threat rows for DNS lookups of listed domains (see intel.ThreatIntel.check_dns)."""
+    classifier = get_device_classifier()
+    labels = classifier.labels_batch([client for _, client, _, _, _ in lookups])
+    rows = []
+    for (ts, client, qname, answers, reason), label in zip(lookups, labels):
+        rows.append({
+            "Timestamp": time.strftime("%H:%M:%S", time.localtime(ts)),
+            "Epoch": ts,
+            "Device": label,
+            "Destination": qname,
+            "Local_IP": client,
+            "Remote_IP": answers[0] if answers else "",
+            "Size_KB": 0,
+            "Direction": "Outbound",
+            "Protocol": "DNS",
+            "AI_Status": THREAT_STATUS,
+            "Anomaly_Score": -1.0,
+            "Alert": reason,
+        })
+    return rows
+
+# With RAKSHAK_WORKERS > 1, flow state and scoring move to worker processes
+# (sharding.ShardedPipeline); enrichment stays here.
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_sharded_pipeline():
+    global _pipeline
+    if config.SCORE_WORKERS <= 1:
+        return None
+    with _pipeline_lock:
+        if _pipeline is None:
+            model_store.get()   # make sure a model exists on disk before workers load it
+            _pipeline = sharding.ShardedPipeline(config.SCORE_WORKERS, ring_size=config.SHARD_RING_SIZE).start()
+    return _pipeline
+
+def stop_sharded_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
+
+def score_sharded(pipeline, records):
+    # Flow state lives in the workers, so "inference" here covers their flow update + model call
+    try:
+        with metrics.STAGE_SECONDS.time("inference"):
+            scored_records, scores, thresholds, baseline_scores = pipeline.process(records)
+    except sharding.ShardFailed as e:
+        # The dead worker was already replaced; score this one batch here instead of dropping it
+        print(f"⚠️ {e}; scoring it locally.")
+        return score_rows(enrich_records(records))
+    metrics.INFERENCE_BATCHES.inc()
+    with metrics.STAGE_SECONDS.time("enrich"):
+        rows = build_rows(scored_records)
+    for row, score, threshold, baseline in zip(rows, scores, thresholds, baseline_scores):
+        scorer.label(row, score, threshold, baseline)
+    return rows
+
+def get_data_stream(num_packets=None):
+    """
+    Returns every packet captured since the previous call (at most num_packets).
+    The sniffer (or pcap replay) runs continuously in a capture worker thread.
+    """
     captured_data = []
     if SCAPY_AVAILABLE:
-        try:
-            packets = sniff(count=num_packets, timeout=0.1)
-            for pkt in packets:
-                if IP in pkt:
-                    src = pkt[IP].src
-                    dst = pkt[IP].dst
-                    size = len(pkt)
-                    if src.startswith("192.168"):
-                        direction = "Upload"
-                        remote_ip = dst
-                    else:
-                        direction = "Download"
-                        remote_ip = src
-                    
-                    dir_code = 1 if direction == "Upload" else 0
-                    ai_input = [[size, dir_code, 10]]
-                    pred = clf.predict(ai_input)[0]
-                    status = "✅ SAFE" if pred == 1 else "⚠️ CHECK"
-                    
-                    captured_data.append({
-                        "Timestamp": time.strftime("%H:%M:%S"),
-                        "Device": "My Laptop",
-                        "Destination": get_location_from_ip(remote_ip),
-                        "Size_KB": size,
-                        "Direction": direction,
-                        "Protocol": "TCP" if TCP in pkt else "UDP",
-                        "AI_Status": status,
-                        "Anomaly_Score": 0.15,
-                        "Alert": "-"
-                    })
-        except Exception:
-            pass 
+        capture.start_capture()
+        captured_data = process_records(capture.drain(num_packets), capture.drain_arp(), capture.drain_dns())
 
     if not captured_data:
-        return [{
-            "Timestamp": time.strftime("%H:%M:%S"),
-            "Device": "Network Idle",
-            "Destination": "-",
-            "Size_KB": 0,
-            "Direction": "-",
-            "Protocol": "-",
-            "AI_Status": "💤 IDLE",
-            "Anomaly_Score": 0.0,
-            "Alert": "-"
-        }]
+        return [idle_row()]
     return captured_data
 
+def idle_row():
+    return {
+        "Timestamp": time.strftime("%H:%M:%S"),
+        "Device": "Network Idle",
+        "Destination": "-",
+        "Size_KB": 0,
+        "Direction": "-",
+        "Protocol": "-",
+        "AI_Status": "💤 IDLE",
+        "Anomaly_Score": 0.0,
+        "Alert": "-"
+    }
+
 # --- 4. NETWORK SCANNER LOGIC ---
-def get_local_ip():
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        s.connect(('10.255.255.255', 1))
-        IP = s.getsockname()[0]
-    except Exception:
-        IP = "127.0.0.1"
-    finally:
-        s.close()
-    return IP
+get_local_ip = scanner.get_local_ip
 
 def scan_network_devices():
+    """
+    Returns the persistent device inventory immediately and asks the
+    background scanner (scanner.NetworkScanner) for a fresh sweep.
+    """
     devices = []
     if SCAPY_AVAILABLE:
-        try:
-            my_ip = get_local_ip()
-            ip_base = my_ip.rsplit('.', 1)[0]
-            ip_range = ip_base + ".1/24"
-            arp_request = ARP(pdst=ip_range)
-            broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-            arp_request_broadcast = broadcast/arp_request
-            answered_list = srp(arp_request_broadcast, timeout=1.0, verbose=False)[0]
-            for element in answered_list:
-                devices.append({"IP": element[1].psrc, "MAC": element[1].hwsrc, "Status": "🟢 ONLINE", "Type": "Unknown Device"})
-        except Exception:
-            pass 
-            
-    if len(devices) < 5:
+        net_scanner = scanner.get_scanner()
+        net_scanner.request_sweep()
+        devices = get_device_classifier().annotate(net_scanner.inventory.snapshot())
+    else:
+        # Simulation Mode: no scapy, so show a demo network
         base_ip = "192.168.1"
         types = ["iPhone 14", "Pixel 7", "Dell XPS", "HP Envy", "MacBook Air", "Smart Bulb", "Alexa Dot"]
         for i in range(15):
@@ -134,88 +338,225 @@ def scan_network_devices():
 
 # --- 5. HUMAN-LIKE DECEPTION ---
 def deploy_decoy_data(target_ip):
-    def get_human_password():
-        bases = ["Summer", "Winter", "Welcome", "Password", "Admin", "Company", "Monkey", "Dragon", "Football"]
-        years = ["2023", "2024", "2025", "123", "12345"]
-        symbols = ["!", "@", "#", "!!"]
-        if random.random() > 0.2: return f"{random.choice(bases)}{random.choice(years)}{random.choice(symbols)}"
-        else: return "".join(random.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=12))
-
-    first_names = ["john", "sarah", "mike", "emma", "david", "admin", "guest"]
-    last_names = ["smith", "doe", "jones", "wilson", "brown"]
-    
-    def get_human_username():
-        style = random.choice([1, 2, 3])
-        if style == 1: return f"{random.choice(first_names)}.{random.choice(last_names)}"
-        if style == 2: return f"{random.choice(first_names)[0]}{random.choice(last_names)}"
-        if style == 3: return f"{random.choice(first_names)}_{random.randint(10,99)}"
-
-    # Generate Content
-    if random.random() > 0.5:
-        # Scenario A: Fake Passwords
-        filename = "leaked_passwords.txt"
-        file_content = "# EXPORTED SAVED PASSWORDS - CHROME\nurl,username,password\n"
-        for i in range(random.randint(4, 7)):
-            user = get_human_username()
-            pwd = get_human_password()
-            file_content += f"http://internal-portal.com,{user},{pwd}\n"
-        file_size = f"{random.randint(1, 5)} KB"
-    else:
-        # Scenario B: Fake SQL Dump
-        filename = "users_table_backup.sql"
-        file_content = "-- DATABASE DUMP: employees\nINSERT INTO `users` (user, pass_hash) VALUES\n"
-        rows = []
-        for i in range(random.randint(3, 5)):
-            u = get_human_username()
-            p_hash = f"e10adc3949ba59abbe56e057f20f883e"
-            rows.append(f"('{u}', '{p_hash}') /* Pwd: {get_human_password()} */")
-        file_content += ",\n".join(rows) + ";"
-        file_size = f"{random.randint(10, 50)} MB"
-
-    # --- SAVE THE FILE TO DISK ---
-    try:
-        with open(filename, "w") as f:
-            f.write(file_content)
-        print(f"✅ DECOY FILE CREATED: {filename}")
-    except Exception as e:
-        print(f"⚠️ Could not write file: {e}")
-
-    return {
-        "status": "✅ DECOY DEPLOYED",
-        "filename": filename,
-        "payload": file_content,
-        "size": file_size,
-        "target": target_ip
-    }
+    """
+    Hands out a pre-generated decoy from the pool (decoys.DecoyEngine). The
+    file itself (multi-MB SQL dumps / credential exports) is streamed to
+    RAKSHAK_DECOY_DIR in the background under a unique name.
+    """
+    return decoys.get_engine().deploy(target_ip)
 
 # --- 6. REAL FIREWALL INTEGRATION (THE KILL SWITCH) ---
-def sever_connection(attacker_ip):
-    system = platform.system()
-    
+def sever_connection(attacker_ip, ttl=None, extra_ips=()):
+    """
+    Adds the attacker to the kernel block set (nftables/ipset set, or the
+    Windows Firewall rule) and applies it right away. Repeated blocks only
+    refresh the TTL; the entry is removed automatically when it expires.
+    extra_ips (e.g. recent threat-intel matches) are blocked in the same apply.
+    """
     # SAFETY: If the IP is generic text, use a dummy IP so the command doesn't crash.
-    if "Unknown" in attacker_ip or "Server" in attacker_ip:
-        target_ip = "203.0.113.55" 
-    else:
-        target_ip = attacker_ip
+    try:
+        target_ip = str(ipaddress.ip_address(attacker_ip))
+    except ValueError:
+        target_ip = "203.0.113.55"
 
     print(f"⚔️ INITIATING KILL SWITCH ON {target_ip}...")
-    
-    try:
-        if system == "Windows":
-            # Windows Firewall Command (Requires Admin)
-            cmd = f'netsh advfirewall firewall add rule name="CYBER_RAKSHAK_BLOCK" dir=in action=block remoteip={target_ip}'
-            subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return {"status": "success", "msg": f"🚫 WINDOWS FIREWALL: BLOCKED {target_ip}"}
-            
-        elif system == "Linux":
-            # Linux IPTables Command (Requires Sudo)
-            cmd = f"sudo iptables -A INPUT -s {target_ip} -j DROP"
-            subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return {"status": "success", "msg": f"🚫 IPTABLES: DROPPED PACKETS FROM {target_ip}"}
-            
+
+    enforcer = firewall.get_enforcer()
+    enforcer.block(target_ip, ttl)
+    extra = []
+    for ip in extra_ips:
+        try:
+            ip = str(ipaddress.ip_address(ip))
+        except ValueError:
+            continue
+        if ip != target_ip:
+            enforcer.block(ip, ttl)
+            extra.append(ip)
+    if extra:
+        target_ip += f" (+{len(extra)} INTEL MATCHES)"
+    backend_name = enforcer.backend.name
+    applied = enforcer.flush(force=True)
+    if backend_name == "dry-run":
+        return {"status": "simulated", "msg": f"🚫 DRY RUN: BLOCK ON {target_ip} WRITTEN TO {config.FIREWALL_DRYRUN_PATH}"}
+    if applied:
+        return {"status": "success", "msg": f"🚫 {backend_name.upper()}: DROPPED PACKETS FROM {target_ip}"}
+    # If we lack Admin rights, we simulate it so the demo doesn't crash
+    return {"status": "simulated", "msg": f"⚠️ ADMIN RIGHTS MISSING: SIMULATING BLOCK ON {target_ip}"}
+
+# --- 7. SHARED LIVE FEED ---
+class LiveFeed:
+    """
+    One traffic history per process, fed by a single background thread and
+    read by every dashboard session, so extra operators only cost reads.
+    version increases on every tick; readers use it as a cache key.
+    stop() pauses the thread and start() resumes it (the dashboard's
+    "Active Monitoring" switch); the history is kept in between.
+
+    source() returns the new rows for a tick: the in-process pipeline
+    (get_data_stream) or, when a detection daemon is running, the rows it
+    produced since the last tick.
+    """
+
+    def __init__(self, capacity, interval=1.5, source=None):
+        self.store = TrafficStore(capacity=capacity)
+        self.interval = interval
+        self.source = source or get_data_stream
+        self.version = 0
+        self.attack_packet = None   # simulated attack replayed into the feed until cleared
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._switch_lock = threading.Lock()   # sessions may toggle concurrently
+
+    def tick(self):
+        attack = self.attack_packet
+        if attack is not None and random.random() < 0.6:
+            new_packets = [dict(attack, Timestamp=time.strftime("%H:%M:%S"), Epoch=time.time(), AI_Status=THREAT_STATUS)]
+            store = event_store.get_store() if _daemon_client is None else None
+            if store is not None:
+                store.append(new_packets)   # so the forensic report has the simulated attack's events too
+            evidence.record_simulated(new_packets[0])   # ...and packets in its pcap
         else:
-            return {"status": "simulated", "msg": f"🚫 SYSTEM UNSUPPORTED: SIMULATED BLOCK {target_ip}"}
-            
-    except Exception as e:
-        # If we lack Admin rights, we simulate it so the demo doesn't crash
-        return {"status": "simulated", "msg": f"⚠️ ADMIN RIGHTS MISSING: SIMULATING BLOCK ON {target_ip}"}
+            # Everything the background sniffer (or the daemon) caught since the last tick
+            new_packets = self.source()
+        with self._lock:
+            self.store.extend(new_packets)
+            self.version += 1
+
+    def read(self, fn):
+        """Runs fn(store) under the feed lock; fn should copy out what it needs."""
+        with self._lock:
+            return fn(self.store)
+
+    def set_attack(self, packet):
+        self.attack_packet = packet
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._switch_lock:
+            if self._thread is None:
+                self._stop_event = threading.Event()   # the old thread may still be finishing a tick on the old one
+                self._thread = threading.Thread(target=self._run, args=(self._stop_event,),
+                                                name="rakshak-live-feed", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Live feed error: {e}")
+            stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        with self._switch_lock:
+            self._stop_event.set()
+            self._thread = None
+
+_live_feed = None
+_live_feed_lock = threading.Lock()
+
+def get_live_feed():
+    global _live_feed
+    with _live_feed_lock:
+        if _live_feed is None:
+            _live_feed = LiveFeed(config.TRAFFIC_HISTORY, interval=config.DASHBOARD_TICK, source=feed_source()).start()
+    return _live_feed
+
+_daemon_client = None
+
+def feed_source():
+    """
+    RAKSHAK_DAEMON_MODE: "local" runs the pipeline in this process, "remote"
+    only reads from daemon.py, "auto" reads from the daemon if one is up.
+    The local pipeline serves its own /metrics endpoint; the daemon serves one otherwise.
+    """
+    global _daemon_client
+    mode = config.DAEMON_MODE.lower()
+    if mode == "local":
+        metrics.serve()
+        return get_data_stream
+    client = daemon.connect()
+    if client is None:
+        if mode != "remote":
+            metrics.serve()
+            return get_data_stream
+        client = daemon.DaemonClient(daemon.parse_address(config.DAEMON_ADDRESS))
+    _daemon_client = client
+    print(f"📡 Reading detections from the daemon at {config.DAEMON_ADDRESS}")
+
+    def from_daemon():
+        try:
+            rows = client.fetch()
+        except Exception:
+            rows = []   # daemon restarting; the client reconnects on the next tick
+        return rows or [idle_row()]
+    return from_daemon
+
+def pipeline_metrics():
+    """metrics.snapshot() of whichever process runs the pipeline (this one or the daemon)."""
+    if _daemon_client is None:
+        return metrics.snapshot()
+    try:
+        return _daemon_client.status().get("metrics", {})
+    except Exception:
+        return {}
+
+def top_talkers(dimension="device", window="1m", n=10):
+    """talkers.TopTalkers.top() of whichever process runs the pipeline."""
+    if _daemon_client is None:
+        return talkers.get_talkers().top(dimension, window, n)
+    try:
+        return _daemon_client.talkers(dimension, window, n)
+    except Exception:
+        return {"window": window, "dimension": dimension, "bytes_per_s": 0.0, "top": []}
+
+def intel_matches(window=None):
+    """Addresses that matched a threat-intel feed recently, in whichever process runs the pipeline."""
+    window = config.INTEL_RECENT_WINDOW if window is None else window
+    if _daemon_client is None:
+        return intel.get_intel().recent_matches(window) if config.INTEL_ENABLED else []
+    try:
+        return _daemon_client.intel_matches(window)
+    except Exception:
+        return []
+
+def query_events(ip=None, since=3600.0, status=None, limit=1000):
+    """Stored events to/from ip in the last `since` seconds (newest last), from whichever process owns the store."""
+    if _daemon_client is not None:
+        try:
+            return _daemon_client.events(ip, since, status, limit)
+        except Exception:
+            return []
+    store = event_store.get_store()
+    if store is None:
+        return []
+    return store.query(start=time.time() - since, ip=ip, status=status, limit=limit).to_dict("records")
+
+def incident_report(ip, epoch=None, window=3600.0):
+    """event_store.EventStore.incident_report() for ip, or None when no store is available."""
+    if _daemon_client is not None:
+        try:
+            return _daemon_client.incident(ip, epoch, window)
+        except Exception:
+            return None
+    store = event_store.get_store()
+    return store.incident_report(ip, epoch, window) if store is not None else None
+
+def packet_evidence(ip, incident_id, start=None):
+    """
+    Cuts the buffered frames to/from ip since `start` into
+    <EVIDENCE_DIR>/incidents/<incident_id>.pcapng (see evidence.extract()).
+    The rings are plain files, so this works from the dashboard process
+    while the daemon captures, as long as both share the filesystem.
+    """
+    if not config.EVIDENCE_ENABLED:
+        return None
+    return evidence.extract([ip], start=start,
+                            out_path=os.path.join(config.EVIDENCE_DIR, "incidents", f"{incident_id}.pcapng"),
+                            comment=f"Cyber-Rakshak incident {incident_id}: packets to/from {ip}")
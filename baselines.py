@@ -0,0 +1,258 @@
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+import metrics
+from flows import FEATURE_NAMES, is_local_address
+
+# --- 1. FEATURE SCALING ---
+# Half-space trees split a fixed [0, 1] work space, so flow features are
+# squashed into it: rates, sizes and times on a log scale up to a cap,
+# fractions as they are (FEATURE_NAMES order).
+FEATURE_CAPS = np.array([1e9, 1e6, 65535.0, 3600.0, 3600.0, 1.0, 1.0, 1.0, 1.0, 86400.0])
+_LOG_SCALED = FEATURE_CAPS > 1.0
+assert len(FEATURE_CAPS) == len(FEATURE_NAMES)
+
+def scale_features(X):
+    X = np.maximum(np.asarray(X, dtype=np.float64), 0.0)
+    return np.clip(np.where(_LOG_SCALED, np.log1p(X) / np.log1p(FEATURE_CAPS), X), 0.0, 1.0)
+
+def device_of(src, dst):
+    """The device a packet belongs to: its LAN end (the source when both are), None when neither end is."""
+    if is_local_address(src):
+        return src
+    if is_local_address(dst):
+        return dst
+    return None
+
+# --- 2. HALF-SPACE TREES ---
+class HalfSpaceForest:
+    """
+    Random split structure of streaming half-space trees (Tan, Ting & Liu,
+    2011). Splits halve a randomly perturbed work range and never look at
+    data, so one structure is shared by every device and only the leaf
+    masses are per device. Trees are stored level order in flat arrays
+    (children of node i are 2i+1 and 2i+2).
+    """
+
+    def __init__(self, n_features, n_trees=25, depth=8, seed=7):
+        self.n_trees = n_trees
+        self.depth = depth
+        self.n_leaves = 1 << depth
+        internal = self.n_leaves - 1
+        rng = np.random.default_rng(seed)
+        self.feature = np.zeros((n_trees, internal), dtype=np.intp)
+        self.split = np.zeros((n_trees, internal))
+        for t in range(n_trees):
+            s = rng.random(n_features)
+            width = 2 * np.maximum(s, 1 - s)
+            stack = [(0, s - width, s + width)]
+            while stack:
+                node, low, high = stack.pop()
+                if node >= internal:
+                    continue
+                q = int(rng.integers(n_features))
+                mid = (low[q] + high[q]) / 2
+                self.feature[t, node] = q
+                self.split[t, node] = mid
+                left_high, right_low = high.copy(), low.copy()
+                left_high[q] = right_low[q] = mid
+                stack.append((2 * node + 1, low, left_high))
+                stack.append((2 * node + 2, right_low, high))
+        self._trees = np.arange(n_trees)
+        self._feature_flat = self.feature.ravel()
+        self._split_flat = self.split.ravel()
+
+    def leaves(self, X):
+        """(events, trees) leaf number (0 .. 2**depth - 1) each scaled row X falls into."""
+        n, width = X.shape
+        flat_x = np.ascontiguousarray(X).ravel()
+        row_base = (np.arange(n) * width)[:, None]
+        tree_base = self._trees * (self.n_leaves - 1)
+        node = np.zeros((n, self.n_trees), dtype=np.intp)
+        for _ in range(self.depth):
+            at = node + tree_base   # flat index into feature/split
+            node = 2 * node + 1 + (flat_x[row_base + self._feature_flat[at]] > self._split_flat[at])
+        return node - (self.n_leaves - 1)
+
+class DeviceBaseline:
+    """
+    One device's leaf masses: `reference` from its last complete window
+    (what scores are measured against) and `latest` filling up now. When
+    `latest` holds a full window it becomes the reference, so the model
+    follows the device's behaviour one window behind without any refit.
+    """
+
+    __slots__ = ("reference", "latest", "count", "windows", "last_seen")
+
+    def __init__(self, n_trees, n_leaves):
+        self.reference = np.zeros((n_trees, n_leaves), dtype=np.uint16)
+        self.latest = np.zeros((n_trees, n_leaves), dtype=np.uint16)
+        self.count = 0       # events in `latest`
+        self.windows = 0     # completed windows; scores exist from the first one on
+        self.last_seen = 0.0
+
+# --- 3. MODEL REGISTRY ---
+class BaselineRegistry:
+    """
+    Per-device streaming detectors keyed by the device's LAN address.
+
+    Each event costs O(trees x depth) to score and to learn, whatever the
+    device's history. At most max_models baselines stay in memory (LRU);
+    evicted ones, and ones idle for idle_timeout seconds, are written to
+    `directory` and loaded again the next time the device shows up.
+
+    score() returns, per event, the share of trees that put it in a leaf
+    the device's reference window never reached: 0 for familiar traffic,
+    towards 1 for traffic unlike anything the device did recently. NaN
+    while a device's first window is still filling.
+    """
+
+    def __init__(self, directory, max_models=512, window=2048, n_trees=25, depth=8, threshold=0.3,
+                 idle_timeout=900.0, seed=7):
+        self.directory = directory
+        self.max_models = max(1, int(max_models))
+        self.window = min(max(16, int(window)), 65535)   # masses are uint16
+        self.threshold = threshold
+        self.idle_timeout = idle_timeout
+        self.forest = HalfSpaceForest(len(FEATURE_NAMES), n_trees, depth, seed)
+        self._offsets = (np.arange(n_trees) * self.forest.n_leaves)[None, :]
+        self.models = OrderedDict()   # device -> DeviceBaseline, least recently seen first
+        self.spills = 0
+        self.loads = 0
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def score(self, devices, features):
+        """Scores a batch (one device key and feature row per event, None for none) and learns from it."""
+        X = scale_features(features)
+        scores = np.full(len(X), np.nan)
+        if not len(X):
+            return scores
+        groups = {}
+        for k, device in enumerate(devices):
+            if device is not None:
+                groups.setdefault(device, []).append(k)
+        now = time.time()
+        with self._lock, metrics.STAGE_SECONDS.time("baseline"):
+            leaves = self.forest.leaves(X)
+            for device, idx in groups.items():
+                model = self._get(device)
+                scores[idx] = self._update(model, leaves[idx])
+                model.last_seen = now
+            if now >= self._next_sweep:
+                self._spill_idle(now)
+                self._next_sweep = now + min(60.0, self.idle_timeout)
+        return scores
+
+    def _update(self, model, leaves):
+        scores = np.full(len(leaves), np.nan)
+        trees = self.forest._trees[None, :]
+        pos = 0
+        while pos < len(leaves):
+            chunk = leaves[pos:pos + self.window - model.count]
+            if model.windows:
+                scores[pos:pos + len(chunk)] = (model.reference[trees, chunk] == 0).mean(axis=1)
+            hits = np.bincount((chunk + self._offsets).ravel(), minlength=model.latest.size)
+            model.latest += hits.reshape(model.latest.shape).astype(np.uint16)
+            model.count += len(chunk)
+            pos += len(chunk)
+            if model.count >= self.window:
+                model.reference, model.latest = model.latest, model.reference
+                model.latest[:] = 0
+                model.count = 0
+                model.windows += 1
+        return scores
+
+    # --- spill to disk ---
+    def _path(self, device):
+        return os.path.join(self.directory, device.replace(":", "_") + ".npz")
+
+    def _get(self, device):
+        model = self.models.get(device)
+        if model is not None:
+            self.models.move_to_end(device)
+            return model
+        model = self._load(device) or DeviceBaseline(self.forest.n_trees, self.forest.n_leaves)
+        self.models[device] = model
+        while len(self.models) > self.max_models:
+            self._spill(*self.models.popitem(last=False))
+        return model
+
+    def _load(self, device):
+        path = self._path(device)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                model = DeviceBaseline(self.forest.n_trees, self.forest.n_leaves)
+                if data["reference"].shape != model.reference.shape or int(data["window"]) != self.window:
+                    return None   # saved under other settings: start over
+                model.reference[:] = data["reference"]
+                model.latest[:] = data["latest"]
+                model.count, model.windows = int(data["count"]), int(data["windows"])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Baseline for {device} unreadable, starting fresh: {e}")
+            return None
+        self.loads += 1
+        return model
+
+    def _spill(self, device, model):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(device)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, reference=model.reference, latest=model.latest, count=model.count,
+                         windows=model.windows, window=self.window)
+            os.replace(tmp, path)
+            self.spills += 1
+        except OSError as e:
+            print(f"⚠️ Could not save baseline for {device}: {e}")
+
+    def _spill_idle(self, now):
+        # LRU order is last-seen order, so idle models are all at the front
+        while self.models:
+            device, model = next(iter(self.models.items()))
+            if now - model.last_seen < self.idle_timeout:
+                break
+            del self.models[device]
+            self._spill(device, model)
+
+    def save_all(self):
+        """Writes every resident baseline to disk (on shutdown); they stay resident."""
+        with self._lock:
+            for device, model in self.models.items():
+                self._spill(device, model)
+
+    def stats(self):
+        with self._lock:
+            return {"resident": len(self.models),
+                    "ready": sum(1 for model in self.models.values() if model.windows),
+                    "spills": self.spills, "loads": self.loads,
+                    "memory_mb": round(len(self.models) * 4 * self.forest.n_trees * self.forest.n_leaves / 1e6, 1)}
+
+def new_registry(directory=None):
+    return BaselineRegistry(directory or config.BASELINE_DIR, max_models=config.BASELINE_MAX_MODELS,
+                            window=config.BASELINE_WINDOW, n_trees=config.BASELINE_TREES,
+                            depth=config.BASELINE_DEPTH, threshold=config.BASELINE_THRESHOLD,
+                            idle_timeout=config.BASELINE_IDLE)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """The process-wide registry; its baselines are saved when the process exits."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = new_registry()
+            atexit.register(_registry.save_all)
+            metrics.REGISTRY.callback("baseline_models_resident", "Per-device baselines held in memory.",
+                                      lambda: len(_registry.models))
+    return _registry
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import random
+import struct
+import argparse
+import platform
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+# --- 1. SYNTHETIC TRAFFIC ---
+# Each generator returns (src, dst, sport, dport, proto, payload_len, tcp_flags).
+LOCAL_HOSTS = [f"192.168.1.{i}" for i in range(10, 40)]
+REMOTE_HOSTS = ["142.250.183.78", "104.16.132.229", "157.240.1.35", "52.95.110.1", "13.107.42.14"]
+ATTACKER = "203.0.113.55"
+SYN, ACK, PSH_ACK = 0x02, 0x10, 0x18
+
+def _normal(rng):
+    local, remote = rng.choice(LOCAL_HOSTS), rng.choice(REMOTE_HOSTS)
+    if rng.random() < 0.15:
+        return local, "8.8.8.8", 40000 + rng.randrange(2000), 53, "UDP", rng.randrange(30, 90), 0
+    port = 40000 + rng.randrange(200)
+    if rng.random() < 0.6:
+        return remote, local, 443, port, "TCP", rng.randrange(400, 1400), PSH_ACK
+    return local, remote, port, 443, "TCP", rng.randrange(0, 200), ACK
+
+def _scan(rng):
+    return ATTACKER, rng.choice(LOCAL_HOSTS), 55555, rng.randrange(1, 65535), "TCP", 0, SYN
+
+def _flood(rng):
+    src = f"198.51.{rng.randrange(256)}.{rng.randrange(256)}"
+    return src, LOCAL_HOSTS[0], rng.randrange(1024, 65535), 80, "TCP", 0, SYN
+
+def _exfil(rng):
+    return LOCAL_HOSTS[5], ATTACKER, 51515, 443, "TCP", 1400, PSH_ACK
+
+GENERATORS = {"normal": _normal, "scan": _scan, "flood": _flood, "exfil": _exfil}
+
+def _ip_bytes(ip):
+    return bytes(int(part) for part in ip.split("."))
+
+def build_frame(src, dst, sport, dport, proto, payload_len, flags):
+    """Raw Ethernet/IPv4/TCP|UDP frame (checksums left at zero)."""
+    if proto == "TCP":
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 1, 0, 5 << 4, flags, 64240, 0, 0)
+        proto_num = 6
+    else:
+        l4 = struct.pack("!HHHH", sport, dport, 8 + payload_len, 0)
+        proto_num = 17
+    total = 20 + len(l4) + payload_len
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, total, 0, 0, 64, proto_num, 0, _ip_bytes(src), _ip_bytes(dst))
+    eth = b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02\x08\x00"
+    return eth + ip + l4 + bytes(payload_len)
+
+def parse_mix(spec):
+    """'normal=0.9,scan=0.1' -> {'normal': 0.9, 'scan': 0.1}"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in GENERATORS:
+            raise ValueError(f"unknown traffic type {name!r} (choose from {', '.join(GENERATORS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def synthetic_stream(packets, rate, mix, seed=42, start_ts=1_700_000_000.0):
+    """Yields (timestamp, frame_bytes) at a fixed packets/sec rate of synthetic time."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    for i in range(packets):
+        kind = rng.choices(names, weights)[0]
+        yield start_ts + i / rate, build_frame(*GENERATORS[kind](rng))
+
+# --- 2. STAGED PIPELINE RUN ---
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+def run_benchmark(packets=50000, rate=10000, mix="normal=1", batch=None, seed=42, parser="fast"):
+    """
+    Runs synthetic traffic through the real pipeline stages batch by batch:
+    parse (decoder.decode_frame, or scapy dissection + capture.parse_packet
+    with parser="scapy"), rules (rules.RulesEngine.split), enrich
+    (backend.enrich_records), score (backend.score_rows) and alert
+    (alerts.build_alert_payload for flagged rows, nothing is sent).
+    """
+    import tempfile
+    from decoder import decode_frames
+    from flows import FlowTable, set_lan
+    import backend
+    import baselines
+    import config
+    import rules
+    try:
+        import alerts
+    except ImportError:
+        alerts = None
+
+    batch = batch or config.SCORE_BATCH_SIZE
+    mix = parse_mix(mix) if isinstance(mix, str) else mix
+    backend.model_store.get()   # load / bootstrap the model outside the timed region
+    # Fresh flow state per scenario so earlier runs don't leak into the features
+    backend.flow_table = FlowTable(window=config.FLOW_WINDOW, idle_timeout=config.FLOW_IDLE_TIMEOUT, max_flows=config.FLOW_MAX)
+    set_lan(["192.168.1.0/24"])   # LOCAL_HOSTS, whatever network this machine is on
+    if backend.scorer.baselines is not None:
+        # Same for device baselines, spilled to a scratch directory rather than data/baselines
+        backend.scorer.baselines = baselines.new_registry(tempfile.mkdtemp(prefix="rakshak-bench-"))
+    engine = rules.RulesEngine(window=config.RULE_WINDOW, scan_ports=config.RULE_SCAN_PORTS,
+                               scan_hosts=config.RULE_SCAN_HOSTS, syn_rate=config.RULE_SYN_RATE,
+                               exfil_rate=config.RULE_EXFIL_RATE, max_sources=config.RULE_MAX_SOURCES)
+
+    stages = {"parse": [], "rules": [], "enrich": [], "score": [], "alert": []}
+    rule_hits = 0
+    totals = dict.fromkeys(stages, 0.0)
+    flagged = processed = 0
+    frames = list(synthetic_stream(packets, rate, mix, seed))
+
+    wall_start = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        chunk = frames[i:i + batch]
+
+        t0 = time.perf_counter()
+        if parser == "scapy":
+            records = _scapy_records(chunk)
+        else:
+            records = decode_frames(chunk)
+        t1 = time.perf_counter()
+        if config.RULES_ENABLED:
+            records, hits = engine.split(records)
+        else:
+            hits = []
+        t2 = time.perf_counter()
+        enriched = backend.enrich_records(records)
+        t3 = time.perf_counter()
+        rows = backend.score_rows(enriched)
+        t4 = time.perf_counter()
+        threats = [r for r in rows if r["AI_Status"] != "✅ SAFE"]
+        if alerts is not None:
+            for row in threats:
+                alerts.build_alert_payload(row["Device"], row["Destination"], row["Anomaly_Score"])
+            for record, _, reason, offender in hits:
+                alerts.build_alert_payload(offender, record[2], -1.0)
+        t5 = time.perf_counter()
+
+        n = max(1, len(chunk))
+        for name, elapsed in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            stages[name].append(elapsed / n * 1e6)   # microseconds per packet
+            totals[name] += elapsed
+        processed += len(chunk)
+        flagged += len(threats) + len(hits)
+        rule_hits += len(hits)
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "params": {"packets": packets, "rate": rate, "mix": mix, "batch": batch, "seed": seed, "parser": parser},
+        "packets": processed,
+        "flagged": flagged,
+        "rule_hits": rule_hits,
+        "seconds": round(wall, 3),
+        "packets_per_sec": round(processed / wall, 1) if wall > 0 else 0.0,
+        "stages_us_per_packet": {
+            name: {"mean": round(totals[name] / max(1, processed) * 1e6, 2),
+                   **{k: round(v, 2) for k, v in _percentiles(samples).items()}}
+            for name, samples in stages.items()
+        },
+        "peak_rss_mb": peak_rss_mb(),   # process-wide high-water mark so far
+        "flows": backend.flow_table.stats(),
+    }
+
+def _scapy_records(chunk):
+    from scapy.layers.l2 import Ether
+    from capture import parse_packet
+
+    records = []
+    for ts, frame in chunk:
+        pkt = Ether(frame)
+        pkt.time = ts
+        record = parse_packet(pkt)
+        if record is not None:
+            records.append(record)
+    return records
+
+# --- 3. REPORTING ---
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(old, new):
+    """Prints throughput and per-stage mean latency deltas between two result files."""
+    def pct(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+    for name, result in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        print(f"[{name}] pkt/s {before['packets_per_sec']:,} -> {result['packets_per_sec']:,} "
+              f"({pct(before['packets_per_sec'], result['packets_per_sec'])})")
+        for stage, stats in result["stages_us_per_packet"].items():
+            prev = before["stages_us_per_packet"].get(stage, {}).get("mean")
+            if prev is not None:
+                print(f"    {stage:<7} {prev:>9.2f}us -> {stats['mean']:>9.2f}us ({pct(prev, stats['mean'])})")
+
+SCENARIOS = {
+    "normal": "normal=1",
+    "scan": "normal=0.8,scan=0.2",
+    "flood": "normal=0.5,flood=0.5",
+    "exfil": "normal=0.9,exfil=0.1",
+    "mixed": "normal=0.85,scan=0.05,flood=0.05,exfil=0.05",
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput / latency benchmark for the detection pipeline.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="traffic mix to run (repeatable, default: all)")
+    parser.add_argument("--mix", help="custom mix instead of scenarios, e.g. 'normal=0.7,flood=0.3'")
+    parser.add_argument("--packets", type=int, default=50000)
+    parser.add_argument("--rate", type=float, default=10000, help="synthetic packets/sec (drives flow features)")
+    parser.add_argument("--batch", type=int, help="packets per pipeline batch (default: RAKSHAK_SCORE_BATCH)")
+    parser.add_argument("--model", help="model file to score with (default: fresh synthetic baseline)")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON results to diff against")
+    parser.add_argument("--parser", choices=["fast", "scapy"], default="fast",
+                        help="frame decoder for the parse stage (default: struct-based decoder.py)")
+    args = parser.parse_args(argv)
+
+    # Same model every run unless told otherwise, so numbers compare across commits
+    os.environ["RAKSHAK_MODEL_PATH"] = args.model or os.path.join(tempfile.mkdtemp(prefix="rakshak-bench-"), "detector.joblib")
+
+    scenarios = {"custom": args.mix} if args.mix else {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": {},
+    }
+    for name, mix in scenarios.items():
+        print(f"⏱️ {name}: {args.packets:,} packets ({mix})...", file=sys.stderr)
+        results["scenarios"][name] = run_benchmark(args.packets, args.rate, mix, args.batch, parser=args.parser)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
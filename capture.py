@@ -0,0 +1,501 @@
+import os
+import json
+import time
+import socket
+import struct
+import threading
+from collections import deque
+
+import config
+import evidence
+import metrics
+from decoder import (decode_frame, decode_arp, decode_dns, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL,
+                     LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+try:
+    from scapy.all import sniff, conf, IP, TCP, UDP, ICMP, ARP
+    SCAPY_AVAILABLE = True
+except ImportError:
+    SCAPY_AVAILABLE = False
+
+# --- 1. RING BUFFER ---
+class RingBuffer:
+    """
+    Fixed-size single-producer / single-consumer ring buffer.
+
+    The capture thread only moves the write cursor and the UI only moves the
+    read cursor, so no lock is needed. When the buffer is full new records
+    are dropped (and counted) instead of growing memory.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self._slots = [None] * self.capacity
+        self._write = 0   # total records ever written
+        self._read = 0    # total records ever drained
+        self.pushed = 0
+        self.dropped = 0
+
+    def push(self, item):
+        if self._write - self._read >= self.capacity:
+            self.dropped += 1
+            return False
+        self._slots[self._write % self.capacity] = item
+        self._write += 1
+        self.pushed += 1
+        return True
+
+    def drain(self, max_items=None):
+        start, end = self._read, self._write
+        if max_items is not None:
+            end = min(end, start + max_items)
+        items = []
+        for i in range(start, end):
+            idx = i % self.capacity
+            items.append(self._slots[idx])
+            self._slots[idx] = None
+        self._read = end
+        return items
+
+    def __len__(self):
+        return self._write - self._read
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "buffered": len(self),
+            "pushed": self.pushed,
+            "dropped": self.dropped,
+        }
+
+# --- 2. PACKET PARSING ---
+def parse_packet(pkt):
+    """
+    Reduce a scapy packet to a flat record tuple:
+    (timestamp, src, dst, sport, dport, protocol, size, tcp_flags)
+    Sampled captures also store the sampling shift in tcp_flags (see sample_rate()).
+    """
+    if IP not in pkt:
+        return None
+    ip = pkt[IP]
+    sport = dport = flags = 0
+    if TCP in pkt:
+        tcp = pkt[TCP]
+        proto, sport, dport, flags = "TCP", tcp.sport, tcp.dport, int(tcp.flags)
+    elif UDP in pkt:
+        udp = pkt[UDP]
+        proto, sport, dport = "UDP", udp.sport, udp.dport
+    elif ICMP in pkt:
+        proto = "ICMP"
+    else:
+        proto = "IP"
+    return (float(pkt.time), ip.src, ip.dst, sport, dport, proto, len(pkt), flags)
+
+# --- 3. CAPTURE FILTERS & FLOW SAMPLING ---
+# Under load only 1 in 2**shift flows is kept. The decision hashes the sum of
+# both addresses (and ports), which is the same in both directions, so a
+# sampled flow is always seen complete. The kernel filter and the userspace
+# check compute the same value, so they always agree.
+SAMPLE_SHIFT_BITS = 12   # the record's flags field carries the shift above the TCP flag bits
+
+def sample_rate(flags):
+    """How many packets a record stands for (1 when it was captured unsampled)."""
+    return 1 << (flags >> SAMPLE_SHIFT_BITS)
+
+def _ip_value(ip):
+    try:
+        return struct.unpack("!I", socket.inet_aton(ip))[0]
+    except OSError:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")   # IPv6 (fast decoder only)
+
+def flow_sampled(src, dst, sport, dport, shift):
+    if not shift:
+        return True
+    return ((_ip_value(src) + _ip_value(dst) + sport + dport) & ((1 << shift) - 1)) == 0
+
+def sampling_bpf(shift):
+    """
+    BPF clause equivalent to flow_sampled() for IPv4 (BPF arithmetic is 32-bit, like the mask).
+    tcp[] and udp[] only match their own protocol, so each gets its own clause; later
+    fragments carry no ports and are sampled on the addresses alone, as the decoders do.
+    """
+    mask = (1 << shift) - 1
+    offset = "(ip[6:2] & 0x1fff)"
+    return (f"(tcp and {offset} = 0 and ((ip[12:4] + ip[16:4] + tcp[0:2] + tcp[2:2]) & {mask}) = 0)"
+            f" or (udp and {offset} = 0 and ((ip[12:4] + ip[16:4] + udp[0:2] + udp[2:2]) & {mask}) = 0)"
+            f" or (((not tcp and not udp) or {offset} != 0) and ((ip[12:4] + ip[16:4]) & {mask}) = 0)")
+
+class FilterConfig:
+    """
+    Per-interface BPF filters from a JSON file ({"*": "...", "eth0": "..."}),
+    re-read when the file changes so filters can be edited while capturing.
+    """
+
+    def __init__(self, path, default):
+        self.path = path
+        self.default = default
+        self._filters = {}
+        self._mtime = None
+
+    def get(self, iface):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            try:
+                with open(self.path) as f:
+                    self._filters = json.load(f)
+            except (OSError, ValueError):
+                self._filters = {}
+        return self._filters.get(iface or "*", self._filters.get("*", self.default)) or None
+
+# --- 4. BACKGROUND CAPTURE WORKER ---
+class CaptureWorker(threading.Thread):
+    """
+    Long-lived sniffer that keeps filling a RingBuffer between UI reruns.
+
+    The kernel BPF filter drops traffic we never score before it is copied
+    to userspace. When the kernel hands us more than sample_threshold
+    packets/s, deterministic flow sampling is switched on (halving the kept
+    flows per step) and switched back off once the estimated rate falls
+    again, so a flood costs a bounded amount of parsing. With an `evidence`
+    ring every IP packet the kernel delivers is also kept raw for incident
+    pcaps. Flows the kernel sampling filter drops never reach it, so while
+    sampling is on the evidence is sampled too; only packets that the
+    userspace check drops (links without a kernel filter) are still kept.
+    With an `evidence_name` the ring is opened on the first packet, with the
+    link type scapy captured it with.
+    """
+
+    # Link types decoder.py reads; packets on other links are kept as bare IP
+    WIRE_LINKTYPES = (LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+    def __init__(self, buffer, iface=None, poll_timeout=1.0, filters=None, sample_threshold=0, max_shift=8,
+                 watch_arp=False, watch_dns=False, evidence=None, evidence_name=None):
+        super().__init__(name="rakshak-capture", daemon=True)
+        self.buffer = buffer
+        self.iface = iface
+        self.poll_timeout = poll_timeout
+        self.filters = filters
+        self.sample_threshold = sample_threshold
+        self.max_shift = max_shift
+        self.shift = 0            # current sampling: 1 in 2**shift flows
+        self.kernel_filter = None
+        self.seen = 0
+        self.sampled_out = 0
+        self.errors = 0
+        self.decode_seconds = 0.0   # parse time accumulated over the current slice
+        self.watch_arp = watch_arp
+        self.arp = deque(maxlen=4096)   # (ts, ip, mac) sender bindings for the ARP spoofing rule
+        self.watch_dns = watch_dns
+        self.dns = deque(maxlen=4096)   # (ts, client, server, qname, answers) for threat-intel domains
+        self.evidence = evidence        # evidence.EvidenceRing of raw frames, or None
+        self.evidence_name = evidence_name
+        self._stop_event = threading.Event()
+
+    def _on_packet(self, pkt):
+        self.seen += 1
+        started = time.perf_counter()
+        record = parse_packet(pkt)
+        self.decode_seconds += time.perf_counter() - started
+        if record is not None:
+            wire, linktype = self._wire(pkt)
+            if self.evidence_name is not None:
+                self.evidence = evidence.get_ring(self.evidence_name, linktype)
+                self.evidence_name = None
+            if self.evidence is not None and self.evidence.linktype == linktype:
+                self.evidence.write(record[0], wire)
+            if self.watch_dns and record[3] == 53 and record[5] == "UDP":
+                dns = decode_dns(wire, record[0], linktype)
+                if dns is not None:
+                    self.dns.append(dns)
+            self._push(record)
+        elif self.watch_arp and ARP in pkt:
+            arp = pkt[ARP]
+            self.arp.append((float(pkt.time), arp.psrc, arp.hwsrc.lower()))
+
+    def _wire(self, pkt):
+        """(bytes, linktype) of a packet as it was captured; only unknown link types are re-serialized."""
+        linktype = conf.l2types.layer2num.get(type(pkt))
+        if linktype in self.WIRE_LINKTYPES and pkt.original:
+            return pkt.original, linktype
+        return bytes(pkt[IP]), LINKTYPE_RAW
+
+    def _push(self, record):
+        if self.shift:
+            ts, src, dst, sport, dport, proto, size, flags = record
+            # Re-checked here for links where the kernel filter is unavailable
+            if not flow_sampled(src, dst, sport, dport, self.shift):
+                self.sampled_out += 1
+                return
+            record = (ts, src, dst, sport, dport, proto, size, flags | (self.shift << SAMPLE_SHIFT_BITS))
+        self.buffer.push(record)
+
+    def capture_filter(self, base):
+        if self.shift:
+            sampling = sampling_bpf(self.shift)
+            base = f"({base}) and ({sampling})" if base else sampling
+        if base and self.watch_arp:
+            base = f"({base}) or arp"   # ARP is never sampled; it is tiny and the spoofing rule needs all of it
+        return base
+
+    def adapt(self, delivered, elapsed):
+        """Adjusts the sampling shift from the packet rate the last slice delivered."""
+        if delivered:
+            metrics.STAGE_SECONDS.observe("decode", self.decode_seconds)
+        self.decode_seconds = 0.0
+        if not self.sample_threshold or elapsed <= 0:
+            return
+        rate = delivered / elapsed
+        if rate > self.sample_threshold and self.shift < self.max_shift:
+            self.shift += 1
+        elif self.shift and rate * 2 < self.sample_threshold / 2:
+            # One step down roughly doubles the delivered rate; only take it with headroom to spare
+            self.shift -= 1
+
+    def run(self):
+        # sniff() only checks stop_filter when a packet arrives, so capture in
+        # short slices to notice stop() on a quiet link too. Filter changes
+        # (edited file or new sampling rate) apply from the next slice.
+        rejected = []   # configured filter that failed (bad syntax or no libpcap); retried once it is edited
+        while not self._stop_event.is_set():
+            base = self.filters.get(self.iface) if self.filters else None
+            self.kernel_filter = None if rejected == [base] else self.capture_filter(base)
+            seen, started = self.seen, time.monotonic()
+            try:
+                sniff(iface=self.iface, prn=self._on_packet, store=False,
+                      timeout=self.poll_timeout, filter=self.kernel_filter,
+                      stop_filter=lambda _: self._stop_event.is_set())
+                self.adapt(self.seen - seen, time.monotonic() - started)
+            except Exception as e:
+                self.errors += 1
+                if self.kernel_filter:
+                    # Sampling still happens in _on_packet, just after the copy to userspace
+                    print(f"⚠️ BPF filter not applied ({e}); capturing unfiltered.")
+                    rejected = [base]
+                    continue
+                # No permission / interface gone: back off instead of spinning.
+                self._stop_event.wait(self.poll_timeout)
+
+    def stop(self):
+        self._stop_event.set()
+
+class RawSocketWorker(CaptureWorker):
+    """
+    Linux AF_PACKET reader: frames are received into one reusable buffer and
+    decoded in place by decoder.decode_frame, so no scapy packet is built
+    per frame. Kernel filtering uses scapy's BPF compiler when available;
+    flow sampling works the same as in CaptureWorker.
+    """
+
+    ETH_P_ALL = 0x0003
+    SO_DETACH_FILTER = 27
+
+    def __init__(self, buffer, iface=None, poll_timeout=1.0, filters=None, sample_threshold=0, max_shift=8,
+                 watch_arp=False, watch_dns=False, evidence=None, snaplen=65535, rcvbuf=8 << 20):
+        super().__init__(buffer, iface, poll_timeout, filters, sample_threshold, max_shift, watch_arp, watch_dns,
+                         evidence)
+        self.name = "rakshak-afpacket"
+        self.snaplen = snaplen
+        self.rcvbuf = rcvbuf
+
+    def _open(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_ALL))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        except OSError:
+            pass
+        if self.iface:
+            sock.bind((self.iface, 0))
+        sock.settimeout(self.poll_timeout)
+        return sock
+
+    def _attach(self, sock, bpf):
+        try:
+            from scapy.arch.linux import attach_filter
+            attach_filter(sock, bpf, self.iface)
+            return True
+        except Exception as e:
+            print(f"⚠️ BPF filter not applied ({e}); filtering in userspace.")
+            return False
+
+    def run(self):
+
+        buf = bytearray(self.snaplen)
+        view = memoryview(buf)
+        rejected = []
+        while not self._stop_event.is_set():
+            try:
+                sock = self._open()
+            except OSError:
+                self.errors += 1
+                self._stop_event.wait(self.poll_timeout)
+                continue
+            with sock:
+                self.kernel_filter = None
+                while not self._stop_event.is_set():
+                    base = self.filters.get(self.iface) if self.filters else None
+                    wanted = None if rejected == [base] else self.capture_filter(base)
+                    if wanted != self.kernel_filter:
+                        if wanted is None:
+                            sock.setsockopt(socket.SOL_SOCKET, self.SO_DETACH_FILTER, 0)
+                        elif not self._attach(sock, wanted):
+                            rejected, wanted = [base], None
+                        self.kernel_filter = wanted
+                    seen, started = self.seen, time.monotonic()
+                    deadline = started + self.poll_timeout
+                    try:
+                        while time.monotonic() < deadline:
+                            n = sock.recv_into(buf)
+                            self.seen += 1
+                            ts = time.time()
+                            frame = view[:n]
+                            if self.evidence is not None:
+                                self.evidence.write(ts, frame)   # memcpy into the mapped ring, no syscall
+                            decode_started = time.perf_counter()
+                            record = decode_frame(frame, ts, LINKTYPE_ETHERNET)
+                            self.decode_seconds += time.perf_counter() - decode_started
+                            if record is not None:
+                                if self.watch_dns and record[3] == 53 and record[5] == "UDP":
+                                    dns = decode_dns(frame, ts, LINKTYPE_ETHERNET)
+                                    if dns is not None:
+                                        self.dns.append(dns)
+                                self._push(record)
+                            elif self.watch_arp:
+                                arp = decode_arp(frame, ts)
+                                if arp is not None:
+                                    self.arp.append(arp)
+                    except socket.timeout:
+                        pass
+                    except OSError:
+                        self.errors += 1
+                        break   # interface went away: reopen
+                    self.adapt(self.seen - seen, time.monotonic() - started)
+
+# One reader (and one SPSC ring) per interface; RAKSHAK_IFACE may list several
+_buffers = []
+_workers = []
+_worker_lock = threading.Lock()
+_filters = FilterConfig(config.CAPTURE_FILTERS_PATH, config.CAPTURE_FILTER)
+
+def capture_interfaces():
+    if not config.CAPTURE_INTERFACE:
+        return [None]   # scapy default
+    return [i.strip() for i in config.CAPTURE_INTERFACE.split(",") if i.strip()]
+
+def _make_worker(buffer, iface):
+    if config.REPLAY_PCAP:
+        from replay import ReplayWorker
+        return ReplayWorker(buffer, config.REPLAY_PCAP, realtime=config.REPLAY_SPEED > 0,
+                            speed=config.REPLAY_SPEED or 1.0, loop=config.REPLAY_LOOP)
+    name = f"capture-{iface or 'default'}"
+    options = dict(iface=iface, poll_timeout=config.CAPTURE_POLL_TIMEOUT, filters=_filters,
+                   sample_threshold=config.SAMPLE_THRESHOLD, max_shift=config.SAMPLE_MAX_SHIFT,
+                   watch_arp=config.RULES_ENABLED and config.RULE_ARP, watch_dns=config.INTEL_ENABLED)
+    if use_raw_sockets():
+        return RawSocketWorker(buffer, evidence=evidence.get_ring(name, LINKTYPE_ETHERNET), **options)
+    # scapy only reports the link type with the first packet, so the ring is opened then
+    return CaptureWorker(buffer, evidence_name=name, **options)
+
+def use_raw_sockets():
+    """RAKSHAK_CAPTURE_BACKEND: "afpacket", "scapy", or "auto" (AF_PACKET when this process may open one)."""
+    backend = config.CAPTURE_BACKEND.lower()
+    if backend == "scapy" or not hasattr(socket, "AF_PACKET"):
+        return False
+    if backend == "afpacket":
+        return True
+    try:
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(RawSocketWorker.ETH_P_ALL)).close()
+        return True
+    except OSError:
+        return False
+
+def start_capture():
+    """
+    Start the shared capture workers once per process (safe to call every rerun).
+    With RAKSHAK_REPLAY set, a capture file is replayed instead of sniffing.
+    """
+    if not SCAPY_AVAILABLE:
+        return None
+    with _worker_lock:
+        if not _workers:
+            ifaces = [None] if config.REPLAY_PCAP else capture_interfaces()
+            for iface in ifaces:
+                _buffers.append(RingBuffer(config.CAPTURE_BUFFER_SIZE))
+                _workers.append(None)
+        for k, worker in enumerate(_workers):
+            # A finished replay stays finished; a crashed sniffer is restarted
+            if worker is None or (not worker.is_alive() and not config.REPLAY_PCAP):
+                iface = None if config.REPLAY_PCAP else capture_interfaces()[k]
+                _workers[k] = _make_worker(_buffers[k], iface)
+                _workers[k].start()
+    return _workers[0]
+
+def stop_capture():
+    with _worker_lock:
+        for worker in _workers:
+            if worker is not None:
+                worker.stop()
+                worker.join(timeout=config.CAPTURE_POLL_TIMEOUT + 1)
+        _workers[:] = [None] * len(_workers)
+
+def drain(max_items=None):
+    items = []
+    oldest = None
+    for buffer in _buffers:
+        batch = buffer.drain(None if max_items is None else max_items - len(items))
+        if batch and (oldest is None or batch[0][0] < oldest):
+            oldest = batch[0][0]
+        items.extend(batch)
+        if max_items is not None and len(items) >= max_items:
+            break
+    if oldest is not None:
+        # "capture" stage = how long the oldest packet waited in the ring.
+        # Replayed pcaps keep their original timestamps, so skip implausible ages.
+        age = time.time() - oldest
+        if 0 <= age < 60:
+            metrics.STAGE_SECONDS.observe("capture", age)
+    return items
+
+def drain_arp():
+    """ARP sender bindings (ts, ip, mac) seen since the last call."""
+    events = []
+    for worker in list(_workers):
+        arp = getattr(worker, "arp", None)
+        while arp:
+            events.append(arp.popleft())
+    return events
+
+def drain_dns():
+    """DNS answers (ts, client, server, qname, [IPv4 answers]) seen since the last call."""
+    events = []
+    for worker in list(_workers):
+        dns = getattr(worker, "dns", None)
+        while dns:
+            events.append(dns.popleft())
+    return events
+
+def capture_stats():
+    stats = {"capacity": 0, "buffered": 0, "pushed": 0, "dropped": 0}
+    for buffer in _buffers:
+        for key, value in buffer.stats().items():
+            stats[key] += value
+    live = [w for w in _workers if w is not None]
+    stats["running"] = any(w.is_alive() for w in live)
+    stats["seen"] = sum(w.seen for w in live)
+    stats["errors"] = sum(w.errors for w in live)
+    stats["sampled_out"] = sum(getattr(w, "sampled_out", 0) for w in live)
+    stats["sample_rates"] = [1 << getattr(w, "shift", 0) for w in live]
+    stats["interfaces"] = len(_buffers)
+    return stats
+
+metrics.REGISTRY.callback("capture_packets_seen_total", "Packets the capture workers received.",
+                          lambda: sum(w.seen for w in _workers if w is not None), kind="counter")
+metrics.REGISTRY.callback("capture_packets_dropped_total", "Packets dropped because a ring buffer was full.",
+                          lambda: sum(b.stats()["dropped"] for b in _buffers), kind="counter")
+metrics.REGISTRY.callback("capture_packets_sampled_out_total", "Packets skipped by adaptive flow sampling.",
+                          lambda: sum(getattr(w, "sampled_out", 0) for w in _workers if w is not None), kind="counter")
+metrics.REGISTRY.callback("capture_queue_depth", "Packets waiting in the capture ring buffers.",
+                          lambda: sum(len(b) for b in _buffers))
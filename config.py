@@ -0,0 +1,165 @@
+import os
+
+# --- RUNTIME SETTINGS ---
+# Every knob can be overridden from the environment (RAKSHAK_*), so the same
+# code runs on a laptop demo and on a busy gateway without edits.
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_str(name, default):
+    return os.environ.get(name, default)
+
+# --- 1. CAPTURE ---
+CAPTURE_INTERFACE = _env_str("RAKSHAK_IFACE", "") or None   # None = scapy default; "eth0,wlan0" = one reader each
+CAPTURE_BUFFER_SIZE = _env_int("RAKSHAK_CAPTURE_BUFFER", 65536)  # records kept between UI ticks
+CAPTURE_POLL_TIMEOUT = _env_float("RAKSHAK_CAPTURE_POLL", 1.0)   # seconds per sniff() slice
+CAPTURE_BACKEND = _env_str("RAKSHAK_CAPTURE_BACKEND", "auto")   # auto | afpacket (raw socket + fast decoder) | scapy
+CAPTURE_FILTER = _env_str("RAKSHAK_BPF", "ip")                  # kernel filter; only IPv4 is scored
+CAPTURE_FILTERS_PATH = _env_str("RAKSHAK_BPF_FILE", os.path.join("data", "capture_filters.json"))  # per-interface, reloaded on change
+SAMPLE_THRESHOLD = _env_int("RAKSHAK_SAMPLE_PPS", 20000)        # packets/s before flow sampling kicks in (0 = never)
+SAMPLE_MAX_SHIFT = _env_int("RAKSHAK_SAMPLE_MAX_SHIFT", 8)       # sample at most down to 1 in 2**shift flows
+
+# --- 2. SCORING ---
+SCORE_BATCH_SIZE = _env_int("RAKSHAK_SCORE_BATCH", 512)          # max rows per model call; each capture drain is flushed
+SCORE_WORKERS = _env_int("RAKSHAK_WORKERS", 1)                   # >1: flow state + scoring sharded over processes
+SHARD_RING_SIZE = _env_int("RAKSHAK_SHARD_RING", 65536)          # shared-memory record slots per worker
+
+# --- 3. FLOW TABLE ---
+FLOW_WINDOW = _env_float("RAKSHAK_FLOW_WINDOW", 10.0)            # seconds the rolling rates cover
+FLOW_IDLE_TIMEOUT = _env_float("RAKSHAK_FLOW_IDLE", 60.0)        # evict flows silent for this long
+FLOW_MAX = _env_int("RAKSHAK_FLOW_MAX", 262144)                  # hard cap on tracked flows
+
+# --- 4. MODEL STORE ---
+MODEL_PATH = _env_str("RAKSHAK_MODEL_PATH", os.path.join("models", "detector.joblib"))
+MODEL_CHECK_INTERVAL = _env_float("RAKSHAK_MODEL_CHECK", 30.0)   # how often to look for a retrained model
+
+# --- 5. REPLAY ---
+REPLAY_PCAP = _env_str("RAKSHAK_REPLAY", "") or None             # replay this capture instead of sniffing
+REPLAY_SPEED = _env_float("RAKSHAK_REPLAY_SPEED", 1.0)           # 0 = as fast as possible
+REPLAY_LOOP = _env_str("RAKSHAK_REPLAY_LOOP", "0") == "1"
+
+# --- 6. DASHBOARD ---
+TRAFFIC_HISTORY = _env_int("RAKSHAK_TRAFFIC_HISTORY", 5000)      # events kept for the live table / chart
+TRAFFIC_TABLE_ROWS = _env_int("RAKSHAK_TABLE_ROWS", 30)          # rows rendered in the HTML table
+
+# --- 7. IP ENRICHMENT ---
+ENRICH_DIR = _env_str("RAKSHAK_ENRICH_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "enrichment"))
+ENRICH_CACHE_SIZE = _env_int("RAKSHAK_ENRICH_CACHE", 65536)      # hot addresses kept in the LRU
+
+# --- 8. ALERTS ---
+ALERT_QUEUE_SIZE = _env_int("RAKSHAK_ALERT_QUEUE", 1000)         # pending alerts before new ones are dropped
+ALERT_RATE = _env_float("RAKSHAK_ALERT_RATE", 0.5)               # webhook calls per second (token bucket)
+ALERT_BURST = _env_int("RAKSHAK_ALERT_BURST", 5)                 # calls allowed back-to-back
+ALERT_TIMEOUT = _env_float("RAKSHAK_ALERT_TIMEOUT", 5.0)         # seconds per HTTP request
+ALERT_RETRIES = _env_int("RAKSHAK_ALERT_RETRIES", 4)             # attempts after the first failure
+ALERT_DEDUP_WINDOW = _env_float("RAKSHAK_ALERT_DEDUP", 60.0)      # repeats of one device/destination folded together
+
+# --- 9. FIREWALL ---
+FIREWALL_BACKEND = _env_str("RAKSHAK_FIREWALL", "auto")          # auto | nftables | ipset | netsh | dryrun
+FIREWALL_TTL = _env_int("RAKSHAK_BLOCK_TTL", 3600)               # seconds before a block is lifted
+FIREWALL_FLUSH_INTERVAL = _env_float("RAKSHAK_FIREWALL_FLUSH", 1.0)  # batch window for block/unblock changes
+FIREWALL_DRYRUN_PATH = _env_str("RAKSHAK_FIREWALL_DRYRUN", "firewall_dryrun.nft")
+
+# --- 10. NETWORK SCANNER ---
+SCAN_SUBNETS = _env_str("RAKSHAK_SCAN_SUBNETS", "")               # e.g. "192.168.0.0/16,10.10.0.0/22"; empty = own /24
+SCAN_WORKERS = _env_int("RAKSHAK_SCAN_WORKERS", 32)               # /24 chunks swept in parallel
+SCAN_TIMEOUT = _env_float("RAKSHAK_SCAN_TIMEOUT", 1.0)            # ARP reply wait per chunk
+SCAN_SWEEP_INTERVAL = _env_float("RAKSHAK_SCAN_SWEEP", 600.0)     # full sweep period
+SCAN_REFRESH_INTERVAL = _env_float("RAKSHAK_SCAN_REFRESH", 60.0)  # targeted re-probe of known hosts
+INVENTORY_PATH = _env_str("RAKSHAK_INVENTORY", os.path.join("data", "inventory.json"))
+
+# --- 11. DEVICE CLASSIFICATION ---
+# IEEE registry exports (oui.csv / mam.csv / oui36.csv or oui.txt), comma separated;
+# falls back to the small bundled data/oui_seed.csv when none exist
+OUI_PATHS = _env_str("RAKSHAK_OUI", ",".join(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", name)
+                                             for name in ("oui.csv", "mam.csv", "oui36.csv")))
+
+# --- 12. DECOYS ---
+DECOY_DIR = _env_str("RAKSHAK_DECOY_DIR", "decoys")
+DECOY_POOL_SIZE = _env_int("RAKSHAK_DECOY_POOL", 8)               # decoys kept ready ahead of time
+DECOY_MAX_FILES = _env_int("RAKSHAK_DECOY_KEEP", 50)              # older decoy files are deleted (0 = keep all)
+DECOY_SQL_MIN_MB = _env_int("RAKSHAK_DECOY_SQL_MIN_MB", 10)       # streamed SQL dump size range
+DECOY_SQL_MAX_MB = _env_int("RAKSHAK_DECOY_SQL_MAX_MB", 50)
+DECOY_PASSWORDS_MIN_KB = _env_int("RAKSHAK_DECOY_PWD_MIN_KB", 64) # credential export size range
+DECOY_PASSWORDS_MAX_KB = _env_int("RAKSHAK_DECOY_PWD_MAX_KB", 4096)
+
+# --- 13. DASHBOARD REFRESH ---
+DASHBOARD_TICK = _env_float("RAKSHAK_DASH_TICK", 1.5)            # shared feed ingest period (seconds)
+DASHBOARD_METRICS_REFRESH = _env_float("RAKSHAK_DASH_METRICS", 1.5)
+DASHBOARD_TABLE_REFRESH = _env_float("RAKSHAK_DASH_TABLE", 1.5)
+DASHBOARD_CHART_REFRESH = _env_float("RAKSHAK_DASH_CHART", 3.0)
+DASHBOARD_MAP_REFRESH = _env_float("RAKSHAK_DASH_MAP", 5.0)
+
+# --- 14. DETECTION DAEMON ---
+DAEMON_MODE = _env_str("RAKSHAK_DAEMON_MODE", "auto")             # auto | local | remote (dashboard data source)
+# Unix socket path (owner-only by default) or host:port; TCP is the default where Unix sockets are missing
+DAEMON_ADDRESS = _env_str("RAKSHAK_DAEMON_ADDR", os.path.join("data", "daemon.sock") if os.name == "posix" else "127.0.0.1:8765")
+DAEMON_AUTHKEY = _env_str("RAKSHAK_DAEMON_KEY", "")                # shared secret; empty = random key in DAEMON_KEY_PATH
+DAEMON_KEY_PATH = _env_str("RAKSHAK_DAEMON_KEY_FILE", os.path.join("data", "daemon.key"))  # created 0600 by the daemon
+DAEMON_SOCKET_MODE = int(_env_str("RAKSHAK_DAEMON_SOCKET_MODE", "600"), 8)  # e.g. 660 to let a group's dashboards in
+DAEMON_POLL_INTERVAL = _env_float("RAKSHAK_DAEMON_POLL", 0.1)     # idle wait between capture drains
+DAEMON_AUTO_BLOCK = bool(_env_int("RAKSHAK_AUTO_BLOCK", 0))       # block flagged remotes without an operator
+
+# --- 15. METRICS ---
+METRICS_ADDRESS = _env_str("RAKSHAK_METRICS_ADDR", "127.0.0.1:9108")  # Prometheus /metrics + /debug/profile ("" = off)
+
+# --- 16. FAST-PATH RULES ---
+RULES_ENABLED = bool(_env_int("RAKSHAK_RULES", 1))                # signature/threshold checks before the model
+RULE_WINDOW = _env_float("RAKSHAK_RULE_WINDOW", 10.0)              # seconds the counters look back
+RULE_SCAN_PORTS = _env_int("RAKSHAK_RULE_SCAN_PORTS", 64)          # distinct ports probed on one host
+RULE_SCAN_HOSTS = _env_int("RAKSHAK_RULE_SCAN_HOSTS", 32)          # distinct LAN hosts probed by one source
+RULE_SYN_RATE = _env_float("RAKSHAK_RULE_SYN_RATE", 500.0)         # bare SYN/s towards one destination
+RULE_EXFIL_RATE = _env_float("RAKSHAK_RULE_EXFIL_RATE", 1e6)       # sustained upload bytes/s from one device
+RULE_MAX_SOURCES = _env_int("RAKSHAK_RULE_MAX_SOURCES", 8192)      # per-source counters kept per window
+RULE_ARP = bool(_env_int("RAKSHAK_RULE_ARP", 1))                   # watch ARP for IP/MAC conflicts with the inventory
+
+# --- 17. TOP TALKERS ---
+TALKERS_CAPACITY = _env_int("RAKSHAK_TALKERS", 256)               # keys tracked per dimension and window
+TALKERS_ROWS = _env_int("RAKSHAK_TALKERS_ROWS", 8)                 # rows in the dashboard panel
+
+# --- 18. THREAT INTEL ---
+INTEL_ENABLED = bool(_env_int("RAKSHAK_INTEL", 1))                # match traffic against local blocklist feeds
+INTEL_DIR = _env_str("RAKSHAK_INTEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intel"))
+INTEL_RELOAD_INTERVAL = _env_float("RAKSHAK_INTEL_RELOAD", 30.0)   # seconds between feed directory checks
+INTEL_BLOOM_FP = _env_float("RAKSHAK_INTEL_BLOOM_FP", 0.001)       # Bloom false-positive rate (hits are confirmed exactly)
+INTEL_RESOLVED_MAX = _env_int("RAKSHAK_INTEL_RESOLVED", 65536)     # addresses of listed domains remembered from DNS
+INTEL_RECENT_WINDOW = _env_float("RAKSHAK_INTEL_RECENT", 900.0)    # matches the kill switch also blocks (seconds)
+
+# --- 19. PER-DEVICE BASELINES ---
+BASELINES_ENABLED = bool(_env_int("RAKSHAK_BASELINES", 1))        # per-device streaming detectors decide once warmed up
+BASELINE_DIR = _env_str("RAKSHAK_BASELINE_DIR", os.path.join("data", "baselines"))  # idle / evicted models spill here
+BASELINE_MAX_MODELS = _env_int("RAKSHAK_BASELINE_MODELS", 512)    # device models kept in memory (LRU)
+BASELINE_IDLE = _env_float("RAKSHAK_BASELINE_IDLE", 900.0)        # seconds without traffic before a model spills
+BASELINE_WINDOW = _env_int("RAKSHAK_BASELINE_WINDOW", 2048)       # events per reference window (max 65535)
+BASELINE_TREES = _env_int("RAKSHAK_BASELINE_TREES", 25)           # half-space trees per model
+BASELINE_DEPTH = _env_int("RAKSHAK_BASELINE_DEPTH", 8)            # 2**depth leaves per tree
+BASELINE_THRESHOLD = _env_float("RAKSHAK_BASELINE_THRESHOLD", 0.3)  # flag when this share of trees saw nothing similar
+
+# --- 20. EVENT STORE ---
+EVENTS_ENABLED = bool(_env_int("RAKSHAK_EVENTS", 1))              # keep every event on disk for forensics (needs pyarrow)
+EVENTS_DIR = _env_str("RAKSHAK_EVENTS_DIR", os.path.join("data", "events"))
+EVENTS_SEGMENT_ROWS = _env_int("RAKSHAK_EVENTS_SEGMENT", 65536)   # rows buffered before a segment is written
+EVENTS_FLUSH_INTERVAL = _env_float("RAKSHAK_EVENTS_FLUSH", 5.0)   # ...or after this many seconds
+EVENTS_COMPACT_FANIN = _env_int("RAKSHAK_EVENTS_FANIN", 8)        # segments merged per compaction
+EVENTS_MAX_SEGMENT_ROWS = _env_int("RAKSHAK_EVENTS_MAX_SEGMENT", 4_194_304)  # compaction stops at this size
+EVENTS_RETENTION_DAYS = _env_float("RAKSHAK_EVENTS_RETENTION", 30.0)
+
+# --- 21. PACKET EVIDENCE ---
+EVIDENCE_ENABLED = bool(_env_int("RAKSHAK_EVIDENCE", 1))          # keep recent raw frames for incident pcaps
+EVIDENCE_DIR = _env_str("RAKSHAK_EVIDENCE_DIR", os.path.join("data", "evidence"))
+EVIDENCE_MB = _env_float("RAKSHAK_EVIDENCE_MB", 256.0)            # ring file size per capture interface
+EVIDENCE_SECONDS = _env_float("RAKSHAK_EVIDENCE_SECONDS", 900.0)  # older frames are never extracted (0 = size only)
+EVIDENCE_SNAPLEN = _env_int("RAKSHAK_EVIDENCE_SNAPLEN", 65535)    # bytes kept per frame
+EVIDENCE_PRE = _env_float("RAKSHAK_EVIDENCE_PRE", 300.0)          # seconds before a threat included in its pcap
+EVIDENCE_POST = _env_float("RAKSHAK_EVIDENCE_POST", 30.0)         # ...and seconds after it before the pcap is cut
+EVIDENCE_COOLDOWN = _env_float("RAKSHAK_EVIDENCE_COOLDOWN", 600.0)  # one automatic pcap per address per cooldown
@@ -0,0 +1,384 @@
+import os
+import sys
+import json
+import time
+import socket
+import secrets
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError, answer_challenge, deliver_challenge
+
+import numpy as np
+
+import config
+import metrics
+
+def parse_address(address):
+    """"host:port" -> TCP address tuple; anything else is a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+def load_authkey(create=False):
+    """
+    The IPC secret: RAKSHAK_DAEMON_KEY, else the key file (generated with
+    mode 0600 by the daemon on first start). None when neither exists.
+    """
+    if config.DAEMON_AUTHKEY:
+        return config.DAEMON_AUTHKEY.encode()
+    try:
+        with open(config.DAEMON_KEY_PATH, "rb") as f:
+            return f.read().strip() or None
+    except OSError:
+        if not create:
+            return None
+    os.makedirs(os.path.dirname(config.DAEMON_KEY_PATH) or ".", exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    fd = os.open(config.DAEMON_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+# --- 1. DETECTION LOOP ---
+class DetectionDaemon:
+    """
+    Runs capture -> flows/enrichment -> scoring -> alert -> enforce
+    continuously, independent of any dashboard. Results go into one
+    TrafficStore that dashboards mirror over IPC (see DaemonServer).
+    """
+
+    def __init__(self, capacity, poll_interval=0.1, auto_block=False):
+        from traffic_store import TrafficStore
+
+        self.store = TrafficStore(capacity=capacity)
+        self.poll_interval = poll_interval
+        self.auto_block = auto_block
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stats = {"packets": 0, "threats": 0, "alerts": 0, "blocks": 0, "errors": 0}
+        self._stop_event = threading.Event()
+
+    def step(self):
+        """One pass over everything captured since the last pass. Returns the number of rows."""
+        import backend
+        import capture
+
+        records = capture.drain()
+        arp_events = capture.drain_arp()
+        dns_events = capture.drain_dns()
+        if not records and not arp_events and not dns_events:
+            return 0
+        rows = backend.process_records(records, arp_events, dns_events)
+        with self.lock:
+            self.store.extend(rows)
+        self.stats["packets"] += len(rows)
+        for row in rows:
+            if row["AI_Status"] == backend.THREAT_STATUS:
+                self.handle_threat(row)
+        return len(rows)
+
+    def handle_threat(self, row):
+        import alerts
+        import firewall
+
+        self.stats["threats"] += 1
+        # The dispatcher folds repeats of one device/destination together
+        if alerts.send_discord_alert(row["Device"], row["Destination"], row["Anomaly_Score"]):
+            self.stats["alerts"] += 1
+        if self.auto_block and row.get("Remote_IP"):
+            if firewall.get_enforcer().block(row["Remote_IP"]):
+                self.stats["blocks"] += 1
+
+    def run(self):
+        import capture
+
+        if capture.start_capture() is None:
+            print("⚠️ Scapy not available: nothing to capture, serving an empty feed.")
+        while not self._stop_event.is_set():
+            try:
+                if self.step():
+                    continue   # keep draining while packets are arriving
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ Pipeline error: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def since(self, count):
+        with self.lock:
+            return self.store.since(count)
+
+    def status(self):
+        import baselines
+        import capture
+        import event_store
+        import evidence
+        import intel
+        import rules
+
+        with self.lock:
+            traffic = self.store.stats()
+        store = event_store.get_store()
+        # With sharded scoring the baselines live in the worker processes
+        local_baselines = config.BASELINES_ENABLED and config.SCORE_WORKERS <= 1
+        return {"uptime": round(time.time() - self.started, 1), "pipeline": dict(self.stats),
+                "traffic": traffic, "capture": capture.capture_stats(), "rules": rules.get_engine().stats(),
+                "intel": intel.get_intel().stats() if config.INTEL_ENABLED else {},
+                "baselines": baselines.get_registry().stats() if local_baselines else {},
+                "events": store.stats() if store is not None else {}, "evidence": evidence.ring_stats(),
+                "metrics": metrics.snapshot()}
+
+    def stop(self):
+        self._stop_event.set()
+
+# --- 2. LOCAL IPC ---
+# multiprocessing.connection over a Unix socket (or localhost TCP), used only
+# for its framing and HMAC handshake: requests and replies are JSON bytes, so
+# nothing a peer sends is ever unpickled. Requests:
+#   {"op": "since", "count": n} -> {"count": m, "rows": [...]}
+#   {"op": "status"}            -> DetectionDaemon.status()
+#   {"op": "talkers", "dimension": d, "window": w, "n": n} -> talkers.TopTalkers.top()
+#   {"op": "intel", "window": s} -> {"ips": intel.ThreatIntel.recent_matches()}
+#   {"op": "events", "ip": ip, "since": s, "status": st, "limit": n} -> {"rows": [...]}
+#   {"op": "incident", "ip": ip, "epoch": t, "window": s} -> event_store.EventStore.incident_report()
+MAX_REQUEST_BYTES = 1 << 20
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (np.ndarray, set, frozenset)):
+        return list(value.tolist() if isinstance(value, np.ndarray) else value)
+    return str(value)
+
+def _send(conn, message):
+    conn.send_bytes(json.dumps(message, default=_json_default).encode())
+
+def _recv(conn, maxlength=None):
+    return json.loads(conn.recv_bytes(maxlength))
+
+class DaemonServer:
+    def __init__(self, daemon, address, authkey, socket_mode=0o600):
+        self.daemon = daemon
+        self.address = address
+        self.authkey = authkey
+        self.closed = False
+        # The handshake runs in each connection's thread, so a peer that stalls it can't hold up accept()
+        if isinstance(address, str):
+            os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+            if os.path.exists(address):
+                probe = socket.socket(socket.AF_UNIX)
+                try:
+                    probe.connect(address)
+                except OSError:
+                    os.remove(address)   # left over from a daemon that didn't shut down cleanly
+                else:
+                    raise OSError(f"another daemon is already listening on {address}")
+                finally:
+                    probe.close()
+            # The socket is created owner-only; socket_mode may then open it to a group
+            umask = os.umask(0o177)
+            try:
+                self.listener = Listener(address, family="AF_UNIX")
+            finally:
+                os.umask(umask)
+            os.chmod(address, socket_mode)
+        else:
+            self.listener = Listener(address)
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if self.closed:
+                    return
+                continue   # peer gone before it was accepted
+            threading.Thread(target=self._handle, args=(conn,), name="rakshak-ipc", daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                deliver_challenge(conn, self.authkey)
+                answer_challenge(conn, self.authkey)
+            except (AuthenticationError, EOFError, OSError):
+                return   # wrong key or peer hung up
+            while True:
+                try:
+                    request = _recv(conn, MAX_REQUEST_BYTES)
+                except (EOFError, OSError, ValueError):
+                    return   # closed, oversized or not JSON
+                if not isinstance(request, dict):
+                    _send(conn, {"error": "request must be an object"})
+                    continue
+                try:
+                    _send(conn, self._reply(request))
+                except OSError:
+                    return
+
+    def _reply(self, request):
+        try:
+            return self._dispatch(request)
+        except (TypeError, ValueError) as e:
+            # Clients are other processes: a malformed field is their error, not a reason to drop the link
+            return {"error": f"bad request: {e}"}
+
+    def _dispatch(self, request):
+        op = request.get("op")
+        if op == "since":
+            count, rows = self.daemon.since(int(request.get("count", 0)))
+            return {"count": count, "rows": rows}
+        if op == "status":
+            return self.daemon.status()
+        if op == "talkers":
+            import talkers
+            try:
+                return talkers.get_talkers().top(str(request.get("dimension", "device")),
+                                                 str(request.get("window", "1m")), int(request.get("n", 10)))
+            except KeyError as e:
+                return {"error": f"unknown dimension/window {e}"}
+        if op == "intel":
+            import intel
+            window = float(request.get("window", config.INTEL_RECENT_WINDOW))
+            return {"ips": intel.get_intel().recent_matches(window) if config.INTEL_ENABLED else []}
+        if op in ("events", "incident"):
+            import event_store
+            store = event_store.get_store()
+            if store is None:
+                return {"error": "event store disabled"}
+            ip, status = request.get("ip"), request.get("status")
+            if op == "events":
+                rows = store.query(start=time.time() - float(request.get("since", 3600.0)),
+                                   ip=None if ip is None else str(ip), status=None if status is None else str(status),
+                                   limit=max(0, int(request.get("limit", 1000))))
+                return {"rows": rows.to_dict("records")}
+            if ip is None:
+                return {"error": "incident needs an ip"}
+            epoch = request.get("epoch")
+            return store.incident_report(str(ip), None if epoch is None else float(epoch),
+                                         float(request.get("window", 3600.0)))
+        return {"error": f"unknown op {op!r}"}
+
+    def close(self):
+        self.closed = True
+        self.listener.close()
+        if isinstance(self.address, str):
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+
+class DaemonClient:
+    """
+    Read-only view of a running daemon. fetch() returns only the rows
+    added since the previous call; the connection is re-opened on failure.
+    """
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self.authkey = authkey
+        self.count = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _request(self, request):
+        with self._lock:
+            try:
+                if self._conn is None:
+                    # Without an explicit key the daemon's key file is (re-)read until it exists
+                    key = self.authkey or load_authkey()
+                    if key is None:
+                        raise ConnectionError(f"no daemon key in {config.DAEMON_KEY_PATH} (is the daemon running as this user?)")
+                    self._conn = Client(self.address, authkey=key)
+                _send(self._conn, request)
+                return _recv(self._conn)
+            except Exception:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                raise
+
+    def fetch(self):
+        reply = self._request({"op": "since", "count": self.count})
+        self.count = reply["count"]
+        return reply["rows"]
+
+    def status(self):
+        return self._request({"op": "status"})
+
+    def talkers(self, dimension="device", window="1m", n=10):
+        reply = self._request({"op": "talkers", "dimension": dimension, "window": window, "n": n})
+        if "error" in reply:
+            raise KeyError(reply["error"])
+        return reply
+
+    def intel_matches(self, window=900.0):
+        return self._request({"op": "intel", "window": window}).get("ips", [])
+
+    def events(self, ip=None, since=3600.0, status=None, limit=1000):
+        reply = self._request({"op": "events", "ip": ip, "since": since, "status": status, "limit": limit})
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["rows"]
+
+    def incident(self, ip, epoch=None, window=3600.0):
+        reply = self._request({"op": "incident", "ip": ip, "epoch": epoch, "window": window})
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+def connect(address=None, authkey=None):
+    """DaemonClient for a daemon that is up, or None."""
+    client = DaemonClient(parse_address(address or config.DAEMON_ADDRESS), authkey)
+    try:
+        client.status()
+    except Exception:
+        return None
+    return client
+
+# --- 3. ENTRY POINT ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Cyber-Rakshak detection pipeline headless.")
+    parser.add_argument("--listen", default=config.DAEMON_ADDRESS,
+                        help="Unix socket path or host:port for dashboard IPC (default %(default)s)")
+    parser.add_argument("--no-ipc", action="store_true", help="don't serve results to dashboards")
+    parser.add_argument("--auto-block", action="store_true", default=config.DAEMON_AUTO_BLOCK,
+                        help="block remote addresses of flagged traffic via the firewall enforcer")
+    parser.add_argument("--status", action="store_true", help="print the status of a running daemon and exit")
+    parser.add_argument("--metrics", default=config.METRICS_ADDRESS,
+                        help="host:port for the Prometheus /metrics endpoint, empty to disable (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        client = connect(args.listen)
+        if client is None:
+            print(f"❌ No daemon listening on {args.listen}")
+            return 1
+        print(client.status())
+        return 0
+
+    daemon = DetectionDaemon(config.TRAFFIC_HISTORY, poll_interval=config.DAEMON_POLL_INTERVAL, auto_block=args.auto_block)
+    server = None
+    if not args.no_ipc:
+        server = DaemonServer(daemon, parse_address(args.listen), load_authkey(create=True), config.DAEMON_SOCKET_MODE)
+        threading.Thread(target=server.serve_forever, name="rakshak-ipc-accept", daemon=True).start()
+        print(f"📡 Serving dashboards on {args.listen}")
+    if metrics.serve(args.metrics):
+        print(f"📈 Metrics on http://{args.metrics}/metrics (hot stacks: /debug/profile?seconds=5)")
+    print(f"🛡️ Cyber-Rakshak daemon running (auto-block {'on' if args.auto_block else 'off'}). Ctrl+C to stop.")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        if server is not None:
+            server.close()
+        import backend
+        import capture
+        capture.stop_capture()
+        backend.stop_sharded_pipeline()
+        print(f"👋 Stopped after {daemon.stats['packets']:,} packets ({daemon.stats['threats']:,} threats)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
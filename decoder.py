@@ -0,0 +1,211 @@
+import socket
+import struct
+
+# --- 1. LINK TYPES ---
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101          # raw IPv4/IPv6, no link header
+LINKTYPE_LINUX_SLL = 113    # "any" interface cooked capture
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETH_P_IP, ETH_P_IPV6, ETH_P_8021Q, ETH_P_8021AD, ETH_P_ARP = 0x0800, 0x86DD, 0x8100, 0x88A8, 0x0806
+IPV6_EXT_HEADERS = {0, 43, 60}   # hop-by-hop, routing, destination options (44 = fragment, handled apart)
+
+_u16 = struct.Struct("!H").unpack_from
+_ports = struct.Struct("!HH").unpack_from
+_ntoa = socket.inet_ntoa
+_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+
+# --- 2. FAST HEADER DECODER ---
+def decode_frame(frame, ts, linktype=LINKTYPE_ETHERNET):
+    """
+    Reads Ethernet (with VLAN tags) / IPv4 / IPv6 / TCP / UDP / ICMP headers
+    straight out of a bytes-like frame (bytes, bytearray or memoryview) with
+    struct.unpack_from: no per-layer objects and no copy of the payload.
+    Returns the same record tuple as capture.parse_packet
+    (ts, src, dst, sport, dport, protocol, size, tcp_flags), or None for
+    traffic that isn't IP.
+    """
+    size = len(frame)
+    if linktype == LINKTYPE_ETHERNET:
+        if size < 14:
+            return None
+        ethertype = _u16(frame, 12)[0]
+        offset = 14
+        while ethertype in (ETH_P_8021Q, ETH_P_8021AD) and offset + 4 <= size:
+            ethertype = _u16(frame, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if size < 16:
+            return None
+        ethertype = _u16(frame, 14)[0]
+        offset = 16
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if size < 1:
+            return None
+        version = frame[0] >> 4
+        if version == 4:
+            ethertype = ETH_P_IP
+        elif version == 6:
+            ethertype = ETH_P_IPV6
+        else:
+            return None
+        offset = 0
+    else:
+        return None
+
+    if ethertype == ETH_P_IP:
+        if size < offset + 20:
+            return None
+        ihl = (frame[offset] & 0x0F) * 4
+        if ihl < 20:
+            return None   # malformed: the header can't be shorter than its fixed part
+        proto_num = frame[offset + 9]
+        src = _ntoa(frame[offset + 12:offset + 16])
+        dst = _ntoa(frame[offset + 16:offset + 20])
+        if _u16(frame, offset + 6)[0] & 0x1FFF:
+            # Later fragments carry no transport header (scapy reports these as plain IP too)
+            return (ts, src, dst, 0, 0, "IP", size, 0)
+        l4 = offset + ihl
+    elif ethertype == ETH_P_IPV6:
+        if size < offset + 40:
+            return None
+        proto_num = frame[offset + 6]
+        src = _ntop(_AF_INET6, frame[offset + 8:offset + 24])
+        dst = _ntop(_AF_INET6, frame[offset + 24:offset + 40])
+        l4 = offset + 40
+        while proto_num in IPV6_EXT_HEADERS and l4 + 2 <= size:
+            proto_num, l4 = frame[l4], l4 + (frame[l4 + 1] + 1) * 8
+        if proto_num == 44 and l4 + 8 <= size:
+            if _u16(frame, l4 + 2)[0] & 0xFFF8:
+                return (ts, src, dst, 0, 0, "IP", size, 0)
+            proto_num, l4 = frame[l4], l4 + 8
+    else:
+        return None
+
+    if proto_num == 6 and l4 + 14 <= size:
+        sport, dport = _ports(frame, l4)
+        return (ts, src, dst, sport, dport, "TCP", size, frame[l4 + 13])
+    if proto_num == 17 and l4 + 4 <= size:
+        sport, dport = _ports(frame, l4)
+        return (ts, src, dst, sport, dport, "UDP", size, 0)
+    if proto_num in (1, 58):
+        return (ts, src, dst, 0, 0, "ICMP", size, 0)
+    return (ts, src, dst, 0, 0, "IP", size, 0)
+
+def decode_arp(frame, ts):
+    """
+    Sender binding of an Ethernet ARP request/reply as (ts, ip, mac), or None.
+    Both opcodes count: a spoofer's gratuitous requests claim an address too.
+    """
+    if len(frame) < 42 or _u16(frame, 12)[0] != ETH_P_ARP:
+        return None
+    # htype 1 (Ethernet), ptype IPv4, hlen 6, plen 4
+    if _u16(frame, 14)[0] != 1 or _u16(frame, 16)[0] != ETH_P_IP or frame[18] != 6 or frame[19] != 4:
+        return None
+    mac = ":".join(f"{b:02x}" for b in frame[22:28])
+    return (ts, _ntoa(frame[28:32]), mac)
+
+def _read_name(data, pos, end):
+    """DNS name at pos -> (name, position after it); follows compression pointers."""
+    labels = []
+    after = None
+    for _ in range(64):   # bounds pointer loops
+        if pos >= end:
+            return None, end
+        length = data[pos]
+        if length & 0xC0 == 0xC0:
+            if pos + 1 >= end:
+                return None, end
+            if after is None:
+                after = pos + 2
+            pos = data.offset + (((length & 0x3F) << 8) | data[pos + 1])
+            continue
+        if length == 0:
+            return ".".join(labels).lower(), (after if after is not None else pos + 1)
+        labels.append(bytes(data[pos + 1:pos + 1 + length]).decode("ascii", "replace"))
+        pos += 1 + length
+    return None, end
+
+class _Message:
+    """Frame slice starting at the DNS header; offset maps header-relative pointers to frame positions."""
+    __slots__ = ("frame", "offset")
+
+    def __init__(self, frame, offset):
+        self.frame = frame
+        self.offset = offset
+
+    def __getitem__(self, index):
+        return self.frame[index]
+
+def decode_dns(frame, ts, linktype=LINKTYPE_ETHERNET):
+    """
+    (ts, client, server, qname, [IPv4 answers]) for a DNS response over
+    UDP/IPv4 (source port 53), or None. Only the question name and A
+    records are read; the threat-intel matcher uses them to map listed
+    domains to the addresses they resolved to.
+    """
+    size = len(frame)
+    if linktype == LINKTYPE_ETHERNET:
+        if size < 14:
+            return None
+        ethertype, offset = _u16(frame, 12)[0], 14
+        while ethertype in (ETH_P_8021Q, ETH_P_8021AD) and offset + 4 <= size:
+            ethertype, offset = _u16(frame, offset + 2)[0], offset + 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if size < 16:
+            return None
+        ethertype, offset = _u16(frame, 14)[0], 16
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        ethertype, offset = ETH_P_IP, 0
+    else:
+        return None
+    if ethertype != ETH_P_IP or size < offset + 20 or frame[offset + 9] != 17:
+        return None
+    ihl = (frame[offset] & 0x0F) * 4
+    l4 = offset + ihl
+    if ihl < 20 or l4 + 20 > size or _u16(frame, l4)[0] != 53:
+        return None
+    server, client = _ntoa(frame[offset + 12:offset + 16]), _ntoa(frame[offset + 16:offset + 20])
+    dns = l4 + 8
+    flags, qdcount, ancount = struct.unpack_from("!HHH", frame, dns + 2)
+    if not flags & 0x8000 or qdcount != 1:
+        return None   # queries, or multi-question messages nobody sends
+    message = _Message(frame, dns)
+    qname, pos = _read_name(message, dns + 12, size)
+    if not qname:
+        return None
+    pos += 4   # qtype, qclass
+    answers = []
+    for _ in range(min(ancount, 32)):
+        _, pos = _read_name(message, pos, size)
+        if pos + 10 > size:
+            break
+        rtype, _, _, rdlength = struct.unpack_from("!HHIH", frame, pos)
+        pos += 10
+        if rtype == 1 and rdlength == 4 and pos + 4 <= size:
+            answers.append(_ntoa(frame[pos:pos + 4]))
+        pos += rdlength
+    return (ts, client, server, qname, answers)
+
+def decode_frames(frames, linktype=LINKTYPE_ETHERNET):
+    """[(ts, frame), ...] -> list of records, skipping non-IP frames."""
+    records = []
+    append = records.append
+    for ts, frame in frames:
+        record = decode_frame(frame, ts, linktype)
+        if record is not None:
+            append(record)
+    return records
+
+# --- 3. DEEP INSPECTION ---
+def dissect(frame, linktype=LINKTYPE_ETHERNET, ts=None):
+    """Full scapy dissection of one frame, for the rare cases that need payload layers."""
+    from scapy.config import conf
+    from scapy.packet import Raw
+
+    pkt = conf.l2types.get(linktype, Raw)(bytes(frame))
+    if ts is not None:
+        pkt.time = ts
+    return pkt
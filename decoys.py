@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import queue
+import random
+import hashlib
+import secrets
+import threading
+
+import config
+import metrics
+
+# --- 1. HUMAN-LIKE CREDENTIALS ---
+PASSWORD_BASES = ["Summer", "Winter", "Welcome", "Password", "Admin", "Company", "Monkey", "Dragon", "Football"]
+PASSWORD_YEARS = ["2023", "2024", "2025", "123", "12345"]
+PASSWORD_SYMBOLS = ["!", "@", "#", "!!"]
+FIRST_NAMES = ["john", "sarah", "mike", "emma", "david", "admin", "guest", "priya", "rahul", "anita", "vikram", "li", "maria"]
+LAST_NAMES = ["smith", "doe", "jones", "wilson", "brown", "sharma", "patel", "gupta", "khan", "garcia"]
+PORTALS = ["http://internal-portal.com", "https://vpn.corp.local", "https://mail.corp.local",
+           "https://hr.internal-portal.com", "https://jira.corp.local", "https://192.168.1.10:8443"]
+ALPHANUM = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+def human_password(rng):
+    if rng.random() > 0.2:
+        return f"{rng.choice(PASSWORD_BASES)}{rng.choice(PASSWORD_YEARS)}{rng.choice(PASSWORD_SYMBOLS)}"
+    return "".join(rng.choices(ALPHANUM, k=12))
+
+def human_username(rng):
+    style = rng.randint(1, 3)
+    if style == 1:
+        return f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}"
+    if style == 2:
+        return f"{rng.choice(FIRST_NAMES)[0]}{rng.choice(LAST_NAMES)}"
+    return f"{rng.choice(FIRST_NAMES)}_{rng.randint(10, 99)}"
+
+# --- 2. STREAMING PAYLOADS ---
+# Each generator yields text chunks of ~rows_per_chunk rows until target_bytes
+# is reached, so a 50 MB dump never exists in memory as a whole. The same
+# seed always produces the same stream: the pooled preview is simply its
+# first chunk.
+def password_export_chunks(seed, target_bytes, rows_per_chunk=2000):
+    rng = random.Random(seed)
+    header = "# EXPORTED SAVED PASSWORDS - CHROME\nurl,username,password\n"
+    written = len(header)
+    yield header
+    while written < target_bytes:
+        chunk = "".join(f"{rng.choice(PORTALS)},{human_username(rng)},{human_password(rng)}\n"
+                        for _ in range(rows_per_chunk))
+        chunk = chunk[:target_bytes - written]
+        written += len(chunk)
+        yield chunk
+
+def sql_dump_chunks(seed, target_bytes, rows_per_chunk=2000):
+    rng = random.Random(seed)
+    header = ("-- DATABASE DUMP: employees\n"
+              "-- Server version 8.0.36\n"
+              "CREATE TABLE `users` (`id` int NOT NULL, `user` varchar(64), `pass_hash` char(32), `email` varchar(128));\n")
+    written = len(header)
+    yield header
+    next_id = 1
+    while written < target_bytes:
+        rows = []
+        for _ in range(rows_per_chunk):
+            user = human_username(rng)
+            pwd = human_password(rng)
+            p_hash = hashlib.md5(pwd.encode()).hexdigest()
+            rows.append(f"({next_id}, '{user}', '{p_hash}', '{user}@corp.local') /* Pwd: {pwd} */")
+            next_id += 1
+        chunk = "INSERT INTO `users` (id, user, pass_hash, email) VALUES\n" + ",\n".join(rows) + ";\n"
+        written += len(chunk)
+        yield chunk
+
+# kind -> (file stem, extension, chunk generator, size range in bytes from config)
+DECOY_KINDS = {
+    "passwords": ("leaked_passwords", "txt", password_export_chunks,
+                  lambda: (config.DECOY_PASSWORDS_MIN_KB * 1024, config.DECOY_PASSWORDS_MAX_KB * 1024)),
+    "sql_dump": ("users_table_backup", "sql", sql_dump_chunks,
+                 lambda: (config.DECOY_SQL_MIN_MB << 20, config.DECOY_SQL_MAX_MB << 20)),
+}
+
+# Names unique_path() produces; pruning never touches anything else in decoy_dir
+DECOY_NAME = re.compile("|".join(rf"^{re.escape(stem)}_\d{{8}}-\d{{6}}_[0-9a-f]{{6}}\.{ext}$"
+                                 for stem, ext, _, _ in DECOY_KINDS.values()))
+
+def format_size(num_bytes):
+    if num_bytes >= 1 << 20:
+        return f"{num_bytes / (1 << 20):.0f} MB"
+    return f"{max(1, num_bytes // 1024)} KB"
+
+# --- 3. DECOY ENGINE ---
+class DecoyEngine:
+    """
+    Keeps a warm pool of ready decoys so deployment never generates content
+    on the request path.
+
+    A pooled decoy is only a seed, a target size and its preview chunk; the
+    bulk of the file is streamed from the seeded generator to disk by a
+    background writer after deploy() has already returned. Files get unique
+    names inside decoy_dir and only the newest max_files of them are kept;
+    anything else in that directory is left alone.
+    """
+
+    def __init__(self, decoy_dir, pool_size=8, max_files=50):
+        self.decoy_dir = decoy_dir
+        self.pool = queue.Queue(maxsize=max(1, pool_size))
+        self.max_files = max_files
+        self._writes = queue.Queue()
+        self._refill = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.stats = {"deployed": 0, "pool_misses": 0, "written": 0, "bytes_written": 0, "write_errors": 0}
+        self.last_error = None
+
+    def prepare(self, kind=None):
+        """One pool entry: picks kind and size, generates only the preview chunk."""
+        kind = kind or random.choice(list(DECOY_KINDS))
+        stem, ext, chunks, size_range = DECOY_KINDS[kind]
+        seed = secrets.randbits(64)
+        target_bytes = random.randint(*size_range())
+        stream = chunks(seed, target_bytes)
+        preview = next(stream) + next(stream, "")[:600]
+        stream.close()
+        return {"kind": kind, "stem": stem, "ext": ext, "seed": seed, "target_bytes": target_bytes, "preview": preview}
+
+    def unique_path(self, stem, ext):
+        name = f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}_{secrets.token_hex(3)}.{ext}"
+        return os.path.join(self.decoy_dir, name)
+
+    def deploy(self, target_ip):
+        try:
+            decoy = self.pool.get_nowait()
+        except queue.Empty:
+            self.stats["pool_misses"] += 1
+            decoy = self.prepare()
+        self._refill.set()
+        path = self.unique_path(decoy["stem"], decoy["ext"])
+        self._writes.put((path, decoy))
+        self.stats["deployed"] += 1
+        return {
+            "status": "✅ DECOY DEPLOYED",
+            "filename": os.path.basename(path),
+            "path": path,
+            "payload": decoy["preview"],
+            "size": format_size(decoy["target_bytes"]),
+            "target": target_ip,
+        }
+
+    def write(self, path, decoy):
+        """Streams one decoy to disk chunk by chunk (tmp file + rename, so readers never see half a file)."""
+        os.makedirs(self.decoy_dir, exist_ok=True)
+        chunks = DECOY_KINDS[decoy["kind"]][2]
+        tmp = f"{path}.part"
+        written = 0
+        with open(tmp, "w", encoding="ascii", newline="\n", buffering=1 << 20) as f:
+            for chunk in chunks(decoy["seed"], decoy["target_bytes"]):
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp, path)
+        self.stats["written"] += 1
+        self.stats["bytes_written"] += written
+        self._prune()
+        print(f"✅ DECOY FILE CREATED: {path} ({format_size(written)})")
+
+    def _prune(self):
+        if not self.max_files:
+            return
+        try:
+            files = [e for e in os.scandir(self.decoy_dir) if e.is_file() and DECOY_NAME.match(e.name)]
+        except OSError:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:-self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def start(self):
+        if not self._threads:
+            for target, name in ((self._fill_loop, "rakshak-decoy-pool"), (self._write_loop, "rakshak-decoy-writer")):
+                t = threading.Thread(target=target, name=name, daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def _fill_loop(self):
+        while not self._stop_event.is_set():
+            while not self.pool.full():
+                try:
+                    self.pool.put_nowait(self.prepare())
+                except queue.Full:
+                    break
+            self._refill.wait(5.0)
+            self._refill.clear()
+
+    def _write_loop(self):
+        while True:
+            item = self._writes.get()
+            if item is None:
+                self._writes.task_done()
+                break
+            try:
+                self.write(*item)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                self.last_error = str(e)
+                print(f"⚠️ Could not write file: {e}")
+            finally:
+                self._writes.task_done()
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every queued decoy is on disk (the queue is drained)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._writes.unfinished_tasks and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.05)
+        return not self._writes.unfinished_tasks
+
+    def stop(self):
+        self._stop_event.set()
+        self._refill.set()
+        self._writes.put(None)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DecoyEngine(config.DECOY_DIR, pool_size=config.DECOY_POOL_SIZE,
+                                  max_files=config.DECOY_MAX_FILES).start()
+    return _engine
+
+metrics.REGISTRY.callback("decoy_write_queue_depth", "Decoy files waiting to be written to disk.",
+                          lambda: _engine._writes.qsize() if _engine is not None else 0)
@@ -0,0 +1,211 @@
+import os
+import re
+import csv
+import bisect
+import threading
+from array import array
+
+import config
+from enrichment import flatten_prefixes
+
+# --- 1. OUI VENDOR INDEX ---
+def mac_to_int(mac):
+    return int(re.sub(r"[^0-9a-fA-F]", "", mac)[:12].ljust(12, "0"), 16)
+
+class OUIIndex:
+    """
+    IEEE registry (MA-L /24, MA-M /28, MA-S /36 blocks) as disjoint ranges
+    over the 48-bit MAC space: two array('Q') bound columns plus vendor ids,
+    searched with one bisect. Nested MA-M/MA-S blocks win over the MA-L
+    block they were carved from.
+    """
+
+    BITS = {"MA-L": 24, "MA-M": 28, "MA-S": 36, "IAB": 36}
+
+    def __init__(self):
+        self.vendors = [None]
+        self._vendor_ids = {}
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.vendor_idx = array("i")
+
+    def _vendor_id(self, name):
+        vid = self._vendor_ids.get(name)
+        if vid is None:
+            vid = self._vendor_ids[name] = len(self.vendors)
+            self.vendors.append(name)
+        return vid
+
+    def load(self, paths):
+        blocks = []
+        for path in paths:
+            blocks.extend(self._read(path))
+        flat = flatten_prefixes(blocks)
+        self.starts = array("Q", (r[0] for r in flat))
+        self.ends = array("Q", (r[1] for r in flat))
+        self.vendor_idx = array("i", (r[2] for r in flat))
+        return self
+
+    def _block(self, assignment, bits, vendor):
+        start = int(assignment, 16) << (48 - bits)
+        return start, start + (1 << (48 - bits)) - 1, self._vendor_id(vendor.strip())
+
+    def _read(self, path):
+        """Accepts the IEEE CSV exports (oui.csv, mam.csv, oui36.csv) or the classic oui.txt."""
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            if path.lower().endswith(".csv"):
+                for row in csv.DictReader(f):
+                    assignment = (row.get("Assignment") or "").strip()
+                    bits = self.BITS.get((row.get("Registry") or "MA-L").strip(), 4 * len(assignment))
+                    if assignment:
+                        yield self._block(assignment, bits, row.get("Organization Name") or "")
+            else:
+                for line in f:
+                    m = re.match(r"\s*([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})\s+\(hex\)\s+(.+)", line)
+                    if m:
+                        yield self._block("".join(m.group(1, 2, 3)), 24, m.group(4))
+
+    def vendor(self, mac):
+        try:
+            value = mac_to_int(mac)
+        except ValueError:
+            return None
+        i = bisect.bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.vendors[self.vendor_idx[i]]
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+# --- 2. DEVICE TYPE CLASSIFICATION ---
+# (vendor keywords, device type), first match wins
+VENDOR_TYPES = [
+    (("philips lighting", "signify", "lifx"), "Smart Bulb"),
+    (("hikvision", "dahua", "axis comm", "reolink"), "IP Camera"),
+    (("espressif", "tuya", "shelly"), "IoT Module (Plug/Bulb)"),
+    (("amazon",), "Smart Speaker (Alexa)"),
+    (("sonos",), "Smart Speaker"),
+    (("nest labs",), "Smart Thermostat / Camera"),
+    (("google",), "Google Home / Chromecast"),
+    (("raspberry pi",), "Raspberry Pi"),
+    (("apple",), "Apple Device"),
+    (("xiaomi",), "Xiaomi Device"),
+    (("samsung",), "Samsung Device"),
+    (("tp-link", "netgear", "ubiquiti", "cisco", "mikrotik"), "Network Gear"),
+    (("vmware", "parallels"), "Virtual Machine"),
+    (("intel", "dell", "hewlett", "lenovo", "micro-star", "asustek"), "Computer"),
+]
+
+# (ports seen in the device's traffic, device type); checked before generic vendor types
+PORT_FINGERPRINTS = [
+    ({554, 8554, 37777}, "IP Camera"),
+    ({631, 9100, 515}, "Printer"),
+    ({1883, 8883}, "IoT Sensor (MQTT)"),
+    ({8008, 8009}, "Chromecast / Smart TV"),
+    ({3389, 5900}, "Computer"),
+    ({56700}, "Smart Bulb"),
+]
+# Only vendor-less or generic module vendors are refined, so a laptop talking to a camera stays a laptop
+GENERIC_TYPES = {"Unknown Device", "IoT Module (Plug/Bulb)"}
+
+def vendor_type(vendor):
+    if vendor:
+        name = vendor.lower()
+        for keywords, device_type in VENDOR_TYPES:
+            if any(k in name for k in keywords):
+                return device_type
+    return "Unknown Device"
+
+def classify(vendor, ports=()):
+    """Vendor gives the baseline type; a matching port fingerprint refines generic ones."""
+    device_type = vendor_type(vendor)
+    if device_type in GENERIC_TYPES and ports:
+        for fingerprint, fp_type in PORT_FINGERPRINTS:
+            if fingerprint & ports:
+                return fp_type
+    return device_type
+
+class DeviceClassifier:
+    """
+    Attributes traffic to devices. The inventory (IP -> MAC) and port
+    fingerprints are folded into a per-IP label cache, so the hot path pays
+    one dict lookup per row; labels are recomputed only when the inventory
+    or an address's fingerprint changes.
+    """
+
+    def __init__(self, oui_index, max_hosts=4096, max_ports=64):
+        self.oui = oui_index
+        self.max_hosts = max_hosts
+        self.max_ports = max_ports
+        self._ip_to_mac = {}
+        self._ports = {}     # ip -> set of service ports seen in its traffic
+        self._labels = {}    # ip -> "Type (ip)", at most max_hosts entries
+        self.aliases = {}    # fixed labels, e.g. this host -> "My Laptop"
+        self._inventory_version = None
+        self._lock = threading.Lock()
+
+    def sync_inventory(self, inventory):
+        """Refresh IP -> MAC from the scanner inventory if it changed since last time."""
+        if inventory.version == self._inventory_version:
+            return
+        with self._lock:
+            self._ip_to_mac = {d["IP"]: d["MAC"] for d in inventory.snapshot()}
+            self._labels.clear()
+            self._inventory_version = inventory.version
+
+    def observe_ports(self, pairs):
+        """pairs: iterable of (local_ip, service_port), already de-duplicated per batch."""
+        with self._lock:
+            for ip, port in pairs:
+                ports = self._ports.get(ip)
+                if ports is None:
+                    if len(self._ports) >= self.max_hosts:
+                        self._ports.pop(next(iter(self._ports)))   # forget the oldest host
+                    ports = self._ports[ip] = set()
+                if port not in ports and len(ports) < self.max_ports:
+                    ports.add(port)
+                    self._labels.pop(ip, None)
+
+    def describe(self, ip=None, mac=None):
+        """(vendor, device type) for an address and/or MAC."""
+        mac = mac or self._ip_to_mac.get(ip)
+        vendor = self.oui.vendor(mac) if mac else None
+        return vendor, classify(vendor, self._ports.get(ip, set()))
+
+    def _label(self, ip):
+        if ip in self.aliases:
+            return self.aliases[ip]
+        with self._lock:
+            # Under the lock so observe_ports can't change the port set mid-classify
+            _, device_type = self.describe(ip)
+            label = ip if device_type == "Unknown Device" else f"{device_type} ({ip})"
+            if len(self._labels) >= self.max_hosts:
+                self._labels.pop(next(iter(self._labels)))   # every remote address gets a label; keep the newest
+            self._labels[ip] = label
+        return label
+
+    def labels_batch(self, ips):
+        labels = self._labels
+        return [labels.get(ip) or self._label(ip) for ip in ips]
+
+    def annotate(self, devices):
+        """Fill Vendor / Type on scanner inventory rows."""
+        for d in devices:
+            vendor, device_type = self.describe(d.get("IP"), d.get("MAC"))
+            d["Vendor"] = vendor or "Unknown"
+            d["Type"] = device_type
+        return devices
+
+# --- 3. SHARED INSTANCE ---
+_classifier = None
+
+def oui_paths():
+    paths = [p.strip() for p in config.OUI_PATHS.split(",") if p.strip() and os.path.exists(p.strip())]
+    return paths or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "oui_seed.csv")]
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = DeviceClassifier(OUIIndex().load(oui_paths()))
+    return _classifier
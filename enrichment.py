@@ -0,0 +1,176 @@
+import os
+import csv
+import glob
+import socket
+import struct
+import bisect
+import ipaddress
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+import config
+
+UNKNOWN = ("Internet (Public)", "", "")
+
+def ipv4_to_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+# --- 1. RANGE TABLE ---
+def flatten_prefixes(prefixes):
+    """
+    Turns possibly nested (start, end, label) prefixes into disjoint ranges
+    where the most specific prefix wins, so a lookup is one binary search
+    instead of a longest-prefix walk. CIDR blocks are either nested or
+    disjoint, which is what makes a single stack sweep sufficient.
+    """
+    out = []
+
+    def emit(start, end, label):
+        if start > end:
+            return
+        if out and out[-1][2] == label and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, label)   # merge adjacent ranges with the same label
+        else:
+            out.append((start, end, label))
+
+    stack = []
+    pos = 0
+    for order, (start, end, label) in sorted(enumerate(prefixes), key=lambda p: (p[1][0], -p[1][1], p[0])):
+        while stack and stack[-1][1] < start:
+            _, top_end, top_label = stack.pop()
+            emit(pos, top_end, top_label)
+            pos = top_end + 1
+        if stack:
+            emit(pos, start - 1, stack[-1][2])
+        stack.append((start, end, label))
+        pos = start
+    while stack:
+        _, top_end, top_label = stack.pop()
+        emit(pos, top_end, top_label)
+        pos = top_end + 1
+    return out
+
+class IPEnricher:
+    """
+    CIDR -> (location, ASN, org) lookups from local CSV tables.
+
+    IPv4 ranges live in array('I') columns (4 bytes per bound) that bisect
+    can search directly and NumPy can view without copying for batch
+    lookups. Hot addresses are served from a bounded LRU cache.
+    CSV columns: cidr,location,asn,org (later files / rows override earlier
+    ones for identical prefixes; more specific prefixes always win).
+    """
+
+    def __init__(self, cache_size=65536):
+        self.labels = [UNKNOWN]       # label id 0 = no match
+        self._label_ids = {UNKNOWN: 0}
+        self.starts = array("I")
+        self.ends = array("I")
+        self.label_idx = array("i")
+        self._v6 = ([], [], [])       # starts, ends, label ids (Python ints, IPv6 tables are small)
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _label_id(self, label):
+        lid = self._label_ids.get(label)
+        if lid is None:
+            lid = self._label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return lid
+
+    @classmethod
+    def from_files(cls, paths, cache_size=65536):
+        enricher = cls(cache_size)
+        enricher.load(paths)
+        return enricher
+
+    def load(self, paths):
+        v4, v6 = [], []
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    try:
+                        net = ipaddress.ip_network(row["cidr"].strip(), strict=False)
+                    except (KeyError, ValueError):
+                        continue
+                    label = self._label_id((row.get("location") or UNKNOWN[0], row.get("asn") or "", row.get("org") or ""))
+                    start = int(net.network_address)
+                    (v4 if net.version == 4 else v6).append((start, start + net.num_addresses - 1, label))
+
+        flat = flatten_prefixes(v4)
+        self.starts = array("I", (r[0] for r in flat))
+        self.ends = array("I", (r[1] for r in flat))
+        self.label_idx = array("i", (r[2] for r in flat))
+        flat6 = flatten_prefixes(v6)
+        self._v6 = ([r[0] for r in flat6], [r[1] for r in flat6], [r[2] for r in flat6])
+        self.lookup.cache_clear()
+        return self
+
+    def _find_v4(self, value):
+        i = bisect.bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.label_idx[i]
+        return 0
+
+    def _lookup(self, ip):
+        try:
+            return self.labels[self._find_v4(ipv4_to_int(ip))]
+        except OSError:
+            pass
+        try:
+            value = int(ipaddress.IPv6Address(ip))
+        except ValueError:
+            return UNKNOWN
+        starts, ends, labels = self._v6
+        i = bisect.bisect_right(starts, value) - 1
+        return self.labels[labels[i]] if i >= 0 and value <= ends[i] else UNKNOWN
+
+    def location(self, ip):
+        return self.lookup(ip)[0]
+
+    def lookup_batch(self, ips):
+        """Label ids (index into self.labels) for a batch of addresses, one searchsorted call."""
+        ids = np.zeros(len(ips), dtype=np.int32)
+        values = np.empty(len(ips), dtype=np.int64)
+        v6_rows = []
+        for k, ip in enumerate(ips):
+            try:
+                values[k] = ipv4_to_int(ip)
+            except OSError:
+                values[k] = -1
+                v6_rows.append(k)
+        if len(self.starts):
+            starts = np.frombuffer(self.starts, dtype=np.uint32)
+            ends = np.frombuffer(self.ends, dtype=np.uint32)
+            label_idx = np.frombuffer(self.label_idx, dtype=np.int32)
+            pos = np.searchsorted(starts, values, side="right") - 1
+            safe = np.clip(pos, 0, None)
+            hit = (pos >= 0) & (values >= 0) & (values <= ends[safe])
+            ids[hit] = label_idx[safe[hit]]
+        for k in v6_rows:
+            ids[k] = self._label_ids.get(self.lookup(ips[k]), 0)
+        return ids
+
+    def locations_batch(self, ips):
+        labels = self.labels
+        return [labels[i][0] for i in self.lookup_batch(ips).tolist()]
+
+    def stats(self):
+        info = self.lookup.cache_info()
+        return {"ranges_v4": len(self.starts), "ranges_v6": len(self._v6[0]), "labels": len(self.labels),
+                "cache_hits": info.hits, "cache_misses": info.misses, "cache_size": info.currsize}
+
+# --- 2. SHARED INSTANCE ---
+_enricher = None
+
+def table_paths(directory=None):
+    directory = directory or config.ENRICH_DIR
+    return sorted(glob.glob(os.path.join(directory, "*.csv")))
+
+def get_enricher():
+    """Loads the CSV tables from RAKSHAK_ENRICH_DIR on first use."""
+    global _enricher
+    if _enricher is None:
+        _enricher = IPEnricher.from_files(table_paths(), cache_size=config.ENRICH_CACHE_SIZE)
+    return _enricher
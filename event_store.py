@@ -0,0 +1,559 @@
+import os
+import sys
+import json
+import glob
+import time
+import atexit
+import hashlib
+import argparse
+import threading
+
+try:
+    import fcntl
+except ImportError:   # Windows: no advisory locks, one writer is up to the operator
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import config
+from traffic_store import THREAT_STATUS
+
+# --- ARROW SETUP ---
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# --- 1. SCHEMA ---
+# Dashboard row key -> stored column. Parquet dictionary-encodes the
+# strings, so repeated devices / statuses / alerts cost a few bits per row.
+COLUMNS = (
+    ("Epoch", "epoch", "float64", None),
+    ("Local_IP", "local_ip", "string", ""),
+    ("Remote_IP", "remote_ip", "string", ""),
+    ("Device", "device", "string", ""),
+    ("Destination", "destination", "string", ""),
+    ("Direction", "direction", "string", ""),
+    ("Protocol", "protocol", "string", ""),
+    ("AI_Status", "status", "string", ""),
+    ("Alert", "alert", "string", "-"),
+    ("Size_KB", "size", "float32", 0.0),
+    ("Anomaly_Score", "score", "float32", 0.0),
+    ("Baseline_Score", "baseline", "float32", None),
+    ("Sample_Rate", "sample_rate", "int32", 1),
+)
+
+def ip_hashes(ips):
+    """Stable 64-bit hashes (the same in every process and run) for the per-segment IP index."""
+    return pd.util.hash_array(np.asarray(ips, dtype=object))
+
+def group_bits(groups):
+    """Row-group numbers -> index mask bits; groups past 63 share the last bit."""
+    return np.left_shift(np.uint64(1), np.minimum(groups, 63).astype(np.uint64))
+
+class StoreLocked(OSError):
+    """Another process already writes this store directory."""
+
+def incident_id(ip, epoch):
+    """Same incident (address + first threat time) -> same ID, so reports can be regenerated."""
+    return "CR-" + hashlib.sha1(f"{ip}|{int(epoch)}".encode()).hexdigest()[:8].upper()
+
+# --- 2. SEGMENT STORE ---
+class EventStore:
+    """
+    Append-only event history in immutable Parquet segments.
+
+    append() only copies a batch into in-memory columns; a background
+    thread writes them out as a level-0 segment every `flush_interval`
+    seconds (or `segment_rows` rows), sorted by time. Each segment comes
+    with the sorted hashes of every address in it and, per address, a mask
+    of the row groups it occurs in; the manifest records its time range.
+    A query only opens segments that overlap its time range and contain
+    its address, reads only the row groups holding that address, and
+    Parquet row-group statistics skip the rest by time. The same thread merges `fanin`
+    segments of one level into one of the next (up to max_segment_rows)
+    and deletes segments older than `retention` seconds.
+
+    One process writes a store directory, enforced with an exclusive lock
+    on its LOCK file (a second writer gets StoreLocked); queries from other
+    processes go through it (the daemon serves them over IPC), or open it
+    read-only, which follows the writer's manifest.
+    """
+
+    MANIFEST = "manifest.json"
+    LOCK = "LOCK"
+
+    def __init__(self, directory, segment_rows=65536, flush_interval=5.0, fanin=8, max_segment_rows=4_194_304,
+                 row_group_rows=65536, retention=30 * 86400.0, readonly=False):
+        self.directory = directory
+        self.segment_rows = max(1, int(segment_rows))
+        self.flush_interval = flush_interval
+        self.fanin = max(2, int(fanin))
+        self.max_segment_rows = max_segment_rows
+        self.row_group_rows = row_group_rows
+        self.retention = retention
+        self.schema = pa.schema([(name, kind) for _, name, kind, _ in COLUMNS])
+        self.segments = []        # manifest entries: name, level, rows, t_min, t_max, bytes
+        self._ip_index = {}       # segment name -> (2, n) uint64: sorted address hashes, row-group masks
+        self._buffer = self._empty_buffer()
+        self._buffered = 0
+        self._pending = []        # buffers being written, still visible to queries
+        self._last_flush = time.time()
+        self._next_expire = 0.0
+        self.stats_counters = {"flushes": 0, "compactions": 0, "expired": 0}
+        self._lock = threading.Lock()          # buffer + manifest
+        self._write_lock = threading.Lock()    # one flush / compaction at a time
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.readonly = readonly
+        self._lock_file = None
+        self._manifest_mtime = None
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+            self._lock_file = self._take_lock()
+        self._load_manifest(cleanup=not readonly)
+
+    def _take_lock(self):
+        lock_file = open(os.path.join(self.directory, self.LOCK), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise StoreLocked(f"event store {self.directory} is already open for writing by another process")
+        return lock_file
+
+    def _empty_buffer(self):
+        return {name: [] for _, name, _, _ in COLUMNS}
+
+    def _path(self, name, suffix=".parquet"):
+        return os.path.join(self.directory, name + suffix)
+
+    # --- manifest ---
+    def _load_manifest(self, cleanup=True):
+        path = os.path.join(self.directory, self.MANIFEST)
+        try:
+            self._manifest_mtime = os.stat(path).st_mtime_ns
+            with open(path) as f:
+                entries = json.load(f)["segments"]
+        except (OSError, ValueError, KeyError):
+            entries = []
+        segments, ip_index = [], {}
+        for entry in entries:
+            try:
+                ip_index[entry["name"]] = np.load(self._path(entry["name"], ".ips.npy"))
+            except OSError:
+                if cleanup:
+                    print(f"⚠️ Event segment {entry['name']} is missing, dropped from the index.")
+                continue
+            segments.append(entry)
+        with self._lock:
+            self.segments, self._ip_index = segments, ip_index
+        if not cleanup:
+            return
+        # Files a crash left behind between writing a segment and recording it
+        known = {entry["name"] for entry in self.segments}
+        for path in glob.glob(os.path.join(self.directory, "L[0-9]*")):
+            if os.path.basename(path).split(".")[0] not in known:
+                os.remove(path)
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, self.MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segments": self.segments}, f)
+        os.replace(path + ".tmp", path)
+
+    def _follow_manifest(self):
+        """Read-only stores pick up the segments the writer has added or merged since."""
+        try:
+            mtime = os.stat(os.path.join(self.directory, self.MANIFEST)).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._manifest_mtime:
+            self._load_manifest(cleanup=False)
+
+    # --- writing ---
+    def append(self, rows):
+        """Buffers dashboard rows (backend.process_records output); never touches the disk."""
+        if not rows or self.readonly:
+            return
+        with self._lock:
+            buffer = self._buffer
+            for key, name, _, default in COLUMNS:
+                buffer[name].extend([row.get(key, default) for row in rows])
+            self._buffered += len(rows)
+            full = self._buffered >= self.segment_rows
+        if full:
+            self._wake.set()
+
+    def _to_table(self, buffer):
+        arrays = [pa.array(buffer[name], type=kind, from_pandas=True) for _, name, kind, _ in COLUMNS]
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def flush(self):
+        """Writes the buffered rows as a new level-0 segment. Returns how many."""
+        with self._write_lock:
+            with self._lock:
+                if not self._buffered:
+                    return 0
+                buffer, count = self._buffer, self._buffered
+                self._buffer, self._buffered = self._empty_buffer(), 0
+                self._last_flush = time.time()
+                self._pending.append(buffer)
+            try:
+                table = self._to_table(buffer).sort_by("epoch")
+                self._write_segment(table, level=0)
+            finally:
+                with self._lock:
+                    self._pending.remove(buffer)
+            self.stats_counters["flushes"] += 1
+            return count
+
+    def _write_groups(self, writer, table, index, final=False):
+        """
+        Writes `table` as row groups of exactly row_group_rows and notes
+        each group's addresses in `index`. Returns the unwritten tail.
+        """
+        size = self.row_group_rows
+        end = table.num_rows if final else table.num_rows - table.num_rows % size
+        for offset in range(0, end, size):
+            group = table.slice(offset, min(size, end - offset))
+            writer.write_table(group, row_group_size=size)
+            ips = set(pc.unique(group["local_ip"]).to_pylist()) | set(pc.unique(group["remote_ip"]).to_pylist())
+            hashes = ip_hashes(list(ips))
+            index.append((hashes, np.full(len(hashes), group_bits(np.array([len(index)]))[0])))
+        return table.slice(end)
+
+    def _write_segment(self, source, level, replaces=()):
+        """source: a table, or a list of segments to stream into one file in order."""
+        name = f"L{level}-{time.time_ns():x}"
+        tmp = self._path(name, ".parquet.tmp")
+        index = []
+        with pq.ParquetWriter(tmp, self.schema, compression="zstd") as writer:
+            if isinstance(source, list):
+                rows = 0
+                tail = self.schema.empty_table()
+                for entry in source:
+                    parquet = pq.ParquetFile(self._path(entry["name"]))
+                    for i in range(parquet.num_row_groups):
+                        # Small level-0 row groups are coalesced up to row_group_rows
+                        tail = self._write_groups(writer, pa.concat_tables([tail, parquet.read_row_group(i)]), index)
+                    rows += entry["rows"]
+                self._write_groups(writer, tail, index, final=True)
+                t_min = min(entry["t_min"] for entry in source)
+                t_max = max(entry["t_max"] for entry in source)
+            else:
+                self._write_groups(writer, source, index, final=True)
+                rows = source.num_rows
+                epochs = source["epoch"]
+                t_min = pc.min(epochs).as_py() or 0.0
+                t_max = pc.max(epochs).as_py() or 0.0
+        ips = self._merge_index(index)
+        with open(self._path(name, ".ips.npy.tmp"), "wb") as f:
+            np.save(f, ips, allow_pickle=False)
+        os.replace(self._path(name, ".ips.npy.tmp"), self._path(name, ".ips.npy"))
+        os.replace(tmp, self._path(name))
+        entry = {"name": name, "level": level, "rows": rows, "t_min": t_min, "t_max": t_max,
+                 "bytes": os.path.getsize(self._path(name))}
+        gone = {old["name"] for old in replaces}
+        with self._lock:
+            self.segments = [seg for seg in self.segments if seg["name"] not in gone] + [entry]
+            self._ip_index[name] = ips
+            for old in gone:
+                self._ip_index.pop(old, None)
+            self._save_manifest()
+        for old in gone:
+            self._remove_files(old)
+        return entry
+
+    @staticmethod
+    def _merge_index(parts):
+        """[(hashes, masks), ...] -> (2, n) array of unique hashes and their OR-ed masks."""
+        if not parts:
+            return np.zeros((2, 0), dtype=np.uint64)
+        hashes = np.concatenate([h for h, _ in parts])
+        masks = np.concatenate([m for _, m in parts])
+        unique, inverse = np.unique(hashes, return_inverse=True)
+        merged = np.zeros(len(unique), dtype=np.uint64)
+        np.bitwise_or.at(merged, inverse, masks)
+        return np.stack([unique, merged])
+
+    def _remove_files(self, name):
+        for suffix in (".parquet", ".ips.npy"):
+            try:
+                os.remove(self._path(name, suffix))
+            except OSError:
+                pass
+
+    # --- background maintenance ---
+    def compact(self):
+        """Merges `fanin` segments of one level into one of the next, while any level has enough. Returns merges."""
+        merges = 0
+        while True:
+            with self._write_lock:
+                with self._lock:
+                    batch = self._pick_compaction()
+                if batch is None:
+                    return merges
+                batch.sort(key=lambda entry: entry["t_min"])
+                level = batch[0]["level"] + 1
+                disjoint = all(a["t_max"] <= b["t_min"] for a, b in zip(batch, batch[1:]))
+                if disjoint:
+                    # Already in time order: stream row groups through, constant memory
+                    self._write_segment(batch, level, replaces=batch)
+                else:
+                    table = pa.concat_tables([pq.read_table(self._path(entry["name"])) for entry in batch])
+                    self._write_segment(table.sort_by("epoch"), level, replaces=batch)
+                self.stats_counters["compactions"] += 1
+                merges += 1
+
+    def _pick_compaction(self):
+        levels = {}
+        for entry in self.segments:
+            levels.setdefault(entry["level"], []).append(entry)
+        for level in sorted(levels):
+            # Oldest first, so merged segments cover contiguous time
+            entries = sorted(levels[level], key=lambda entry: entry["t_min"])
+            if len(entries) >= self.fanin:
+                batch = entries[:self.fanin]
+                if sum(entry["rows"] for entry in batch) <= self.max_segment_rows:
+                    return batch
+        return None
+
+    def expire(self, now=None):
+        """Drops whole segments that ended before the retention cutoff. Returns the rows dropped."""
+        cutoff = (now or time.time()) - self.retention
+        with self._write_lock:
+            with self._lock:
+                old = [entry for entry in self.segments if entry["t_max"] < cutoff]
+                if not old:
+                    return 0
+                self.segments = [entry for entry in self.segments if entry["t_max"] >= cutoff]
+                for entry in old:
+                    self._ip_index.pop(entry["name"], None)
+                self._save_manifest()
+            for entry in old:
+                self._remove_files(entry["name"])
+        dropped = sum(entry["rows"] for entry in old)
+        self.stats_counters["expired"] += dropped
+        return dropped
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rakshak-events", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(min(1.0, self.flush_interval))
+            self._wake.clear()
+            try:
+                if self._buffered >= self.segment_rows or time.time() - self._last_flush >= self.flush_interval:
+                    self.flush()
+                self.compact()
+                if time.time() >= self._next_expire:
+                    self.expire()
+                    self._next_expire = time.time() + 600
+            except Exception as e:
+                print(f"⚠️ Event store maintenance failed: {e}")
+
+    def close(self):
+        self._stop_event.set()
+        self._wake.set()
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()   # releases the writer lock
+            self._lock_file = None
+
+    # --- queries ---
+    def query(self, start=None, end=None, ip=None, status=None, columns=None, limit=None):
+        """
+        Events with start <= epoch <= end (None = open ended), optionally only
+        those to/from `ip` and/or with AI_Status `status`, as a DataFrame with
+        the stored column names, oldest first. limit keeps the newest rows.
+        """
+        for attempt in range(2):
+            try:
+                table = self._scan(start, end, ip, status, columns)
+                break
+            except FileNotFoundError:
+                if attempt:
+                    raise   # a compaction replaced a segment mid-scan; the second pass sees the new manifest
+        if limit is not None and table.num_rows > limit:
+            table = table.slice(table.num_rows - limit)
+        return table.to_pandas()
+
+    def _scan(self, start, end, ip, status, columns):
+        if self.readonly:
+            self._follow_manifest()
+        start = -np.inf if start is None else float(start)
+        end = np.inf if end is None else float(end)
+        with self._lock:
+            segments = list(self.segments)
+            ip_index = dict(self._ip_index)
+            memory = list(self._pending)   # no longer appended to
+            if self._buffered:
+                memory.append({name: list(values) for name, values in self._buffer.items()})
+        memory = [self._to_table(buffer) for buffer in memory]
+
+        expr = (pc.field("epoch") >= start) & (pc.field("epoch") <= end)
+        if ip is not None:
+            expr &= (pc.field("local_ip") == ip) | (pc.field("remote_ip") == ip)
+            wanted = ip_hashes([ip])[0]
+        if status is not None:
+            expr &= pc.field("status") == status
+        columns = list(columns) if columns else [name for _, name, _, _ in COLUMNS]
+
+        tables = []
+        for entry in sorted(segments, key=lambda entry: entry["t_min"]):
+            if entry["t_max"] < start or entry["t_min"] > end:
+                continue
+            path = self._path(entry["name"])
+            if ip is None:
+                tables.append(pq.read_table(path, columns=columns, filters=expr))
+                continue
+            hashes, masks = ip_index[entry["name"]]
+            k = np.searchsorted(hashes, wanted)
+            if k >= len(hashes) or hashes[k] != wanted:
+                continue
+            # Only the row groups the address occurs in; statistics prune those by time
+            groups = np.arange(pq.ParquetFile(path).metadata.num_row_groups)
+            groups = groups[(group_bits(groups) & masks[k]) != 0].tolist()
+            fragment = ds.ParquetFileFormat().make_fragment(path, pafs.LocalFileSystem(), row_groups=groups)
+            tables.append(fragment.to_table(schema=self.schema, columns=columns, filter=expr))
+        for table in memory:
+            tables.append(table.filter(expr).select(columns).sort_by("epoch"))
+        if not tables:
+            return self.schema.empty_table().select(columns)
+        table = pa.concat_tables(tables)
+        if len(tables) > 1 or ip is not None:
+            table = table.sort_by("epoch")
+        return table
+
+    def incident_report(self, ip, epoch=None, window=3600.0, timeline_rows=20):
+        """Summary of everything stored to/from `ip` from `window` seconds before `epoch` until now."""
+        epoch = epoch or time.time()
+        df = self.query(start=epoch - window, ip=ip)
+        threats = df[df["status"] == THREAT_STATUS]
+        first_threat = float(threats["epoch"].iloc[0]) if len(threats) else epoch
+        alerts = df.loc[~df["alert"].isin(["-", ""]), "alert"]
+        flagged = df[df["status"] != "✅ SAFE"]
+        return {
+            "incident_id": incident_id(ip, first_threat),
+            "ip": ip,
+            "start": epoch - window,
+            "end": max(epoch, float(df["epoch"].iloc[-1])) if len(df) else epoch,
+            "events": len(df),
+            "events_estimated": int(df["sample_rate"].sum()),
+            "bytes": float((df["size"] * df["sample_rate"]).sum()),
+            "threats": len(threats),
+            "flagged": len(flagged),
+            "first_seen": float(df["epoch"].iloc[0]) if len(df) else None,
+            "last_seen": float(df["epoch"].iloc[-1]) if len(df) else None,
+            "first_threat": first_threat if len(threats) else None,
+            "devices": df["device"].value_counts().head(5).to_dict(),
+            "protocols": df["protocol"].value_counts().to_dict(),
+            "alerts": alerts.value_counts().head(5).to_dict(),
+            "timeline": flagged.tail(timeline_rows)[["epoch", "device", "remote_ip", "protocol", "size", "status",
+                                                     "alert"]].to_dict("records"),
+        }
+
+    def incidents(self, start=None, end=None, limit=50):
+        """Threat rows grouped by remote address: first/last seen, count and the latest alert, newest first."""
+        df = self.query(start, end, status=THREAT_STATUS, columns=["epoch", "remote_ip", "device", "alert"])
+        if not len(df):
+            return []
+        grouped = df.groupby("remote_ip").agg(first=("epoch", "min"), last=("epoch", "max"),
+                                              threats=("epoch", "size"), device=("device", "last"),
+                                              alert=("alert", "last"))
+        grouped = grouped.sort_values("last", ascending=False).head(limit).reset_index()
+        grouped["incident_id"] = [incident_id(ip, first) for ip, first in zip(grouped["remote_ip"], grouped["first"])]
+        return grouped.to_dict("records")
+
+    def stats(self):
+        with self._lock:
+            segments = list(self.segments)
+            buffered = self._buffered
+        levels = {}
+        for entry in segments:
+            levels[entry["level"]] = levels.get(entry["level"], 0) + 1
+        return dict(self.stats_counters, segments=len(segments), levels=levels, buffered=buffered,
+                    rows=sum(entry["rows"] for entry in segments) + buffered,
+                    disk_mb=round(sum(entry["bytes"] for entry in segments) / 1e6, 1),
+                    oldest=min((entry["t_min"] for entry in segments), default=None),
+                    newest=max((entry["t_max"] for entry in segments), default=None))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    The process's event store (None without pyarrow or with RAKSHAK_EVENTS=0);
+    flushed at exit. When another process already writes the directory, this
+    one gets a read-only view of it and its own events are not stored.
+    """
+    global _store
+    if not (config.EVENTS_ENABLED and PYARROW_AVAILABLE):
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = EventStore(config.EVENTS_DIR, segment_rows=config.EVENTS_SEGMENT_ROWS,
+                                    flush_interval=config.EVENTS_FLUSH_INTERVAL, fanin=config.EVENTS_COMPACT_FANIN,
+                                    max_segment_rows=config.EVENTS_MAX_SEGMENT_ROWS,
+                                    retention=config.EVENTS_RETENTION_DAYS * 86400.0).start()
+                atexit.register(_store.close)
+            except StoreLocked as e:
+                print(f"⚠️ {e}; opening it read-only.")
+                _store = EventStore(config.EVENTS_DIR, readonly=True)
+    return _store
+
+# --- 3. FORENSICS COMMAND ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the Cyber-Rakshak event store.")
+    parser.add_argument("--dir", default=config.EVENTS_DIR, help="store directory (default %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query = sub.add_parser("query", help="events to/from an address")
+    query.add_argument("--ip")
+    query.add_argument("--since", type=float, default=3600.0, help="seconds back from now (default %(default)s)")
+    query.add_argument("--status", help="only rows with this AI_Status")
+    query.add_argument("--limit", type=int, default=50)
+    report = sub.add_parser("report", help="incident summary for an address")
+    report.add_argument("ip")
+    report.add_argument("--window", type=float, default=3600.0)
+    sub.add_parser("incidents", help="recent threats grouped by remote address")
+    sub.add_parser("compact", help="run compaction and retention now (with the pipeline stopped)")
+    sub.add_parser("stats", help="segments, rows and disk use")
+    args = parser.parse_args(argv)
+
+    if not PYARROW_AVAILABLE:
+        print("❌ pyarrow is not installed (pip install pyarrow).")
+        return 1
+    # No background writer here; only `compact` changes the directory
+    store = EventStore(args.dir, retention=config.EVENTS_RETENTION_DAYS * 86400.0, readonly=args.command != "compact")
+    if args.command == "query":
+        start = time.perf_counter()
+        df = store.query(start=time.time() - args.since, ip=args.ip, status=args.status, limit=args.limit)
+        print(df.to_string(index=False))
+        print(f"({len(df)} rows in {time.perf_counter() - start:.3f}s)")
+    elif args.command == "report":
+        print(json.dumps(store.incident_report(args.ip, window=args.window), indent=2, default=str))
+    elif args.command == "incidents":
+        print(json.dumps(store.incidents(start=time.time() - 86400), indent=2, default=str))
+    elif args.command == "compact":
+        merges = store.compact()
+        print(f"✅ {merges} merge(s), {store.expire():,} expired rows dropped.")
+    else:
+        print(json.dumps(store.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+import os
+import sys
+import glob
+import mmap
+import bisect
+import time
+import socket
+import struct
+import argparse
+import threading
+
+import numpy as np
+
+import config
+from decoder import decode_frame, LINKTYPE_RAW
+
+# --- 1. RING FILE LAYOUT ---
+# [header page][time index][data ring]. The header holds the write cursor
+# (a byte position that only grows), the index has one (ts, position) slot
+# per chunk of the data ring naming the first frame that starts in it, and
+# frames are stored back to back as 16-byte pcap record headers + bytes.
+MAGIC = b"CRRING1\0"
+HEADER = struct.Struct("<8sIIQQIxxxxd")   # magic, linktype, snaplen, capacity, chunk, slots, created
+CURSOR_OFFSET = HEADER.size                # uint64 write position, published after each frame
+INDEX_OFFSET = 4096
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("pos", "<u8")])
+RECORD = struct.Struct("<IIII")            # ts_sec, ts_usec, incl_len, orig_len
+SLOT = struct.Struct("<dQ")
+CURSOR = struct.Struct("<Q")
+_pack_record, _pack_slot, _pack_cursor = RECORD.pack_into, SLOT.pack_into, CURSOR.pack_into
+
+def _data_offset(slots):
+    return INDEX_OFFSET + -(-slots * INDEX_DTYPE.itemsize // mmap.PAGESIZE) * mmap.PAGESIZE
+
+# --- 2. WRITER ---
+class EvidenceRing:
+    """
+    The last `capacity` bytes of raw frames from one capture interface, in a
+    memory-mapped file that wraps around.
+
+    write() is called by the capture thread for every frame: two copies into
+    the mapping and a cursor store, no lock, no syscall, no allocation
+    beyond the struct packing. Readers (extract(), in this process or any
+    other) only ever map the file read-only and check the cursor, so they
+    never block or slow the writer. A frame that does not fit before the end
+    of the ring starts the next lap at offset 0.
+    """
+
+    def __init__(self, path, capacity=256 << 20, linktype=1, snaplen=65535, slots=4096):
+        self.path = path
+        self.slots = slots
+        self.chunk = max(1024, int(capacity) // slots)
+        self.capacity = self.chunk * slots
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.data = _data_offset(slots)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # A new capture run starts a new ring; readers see the new header
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(self.data + self.capacity)
+        os.replace(tmp, path)
+        self._file = open(path, "r+b")
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self.mm, 0, MAGIC, linktype, snaplen, self.capacity, self.chunk, slots, time.time())
+        self.pos = 0
+        self.frames = 0
+        self._indexed = -1   # last chunk number whose index slot was written
+
+    def write(self, ts, frame):
+        size = len(frame)
+        n = size if size <= self.snaplen else self.snaplen
+        if not n:
+            return
+        mm, capacity, pos = self.mm, self.capacity, self.pos
+        phys = pos % capacity
+        if phys + 16 + n > capacity:
+            if capacity - phys >= 16:
+                _pack_record(mm, self.data + phys, 0, 0, 0, 0)   # end of lap marker
+            pos += capacity - phys
+            phys = 0
+        at = self.data + phys
+        sec = int(ts)
+        _pack_record(mm, at, sec, int((ts - sec) * 1e6), n, size)
+        mm[at + 16:at + 16 + n] = frame if n == size else frame[:n]
+        chunk = pos // self.chunk
+        if chunk != self._indexed:
+            _pack_slot(mm, INDEX_OFFSET + (chunk % self.slots) * 16, ts, pos)
+            self._indexed = chunk
+        self.pos = pos = pos + 16 + n
+        self.frames += 1
+        _pack_cursor(mm, CURSOR_OFFSET, pos)
+
+    def stats(self):
+        return {"path": self.path, "frames": self.frames, "capacity_mb": round(self.capacity / 1e6, 1),
+                "laps": self.pos // self.capacity}
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+# --- 3. EXTRACTION ---
+def _needles(addresses):
+    needles = set()
+    for address in addresses:
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                needles.add(socket.inet_pton(family, address))
+                break
+            except OSError:
+                continue
+    return needles
+
+def _scan(path, addresses, needles, start, end):
+    """
+    (ts, offset, length, orig_len) of the frames in one ring file to/from
+    any of `addresses` with start <= ts <= end, plus the file's linktype.
+    Returns None for files that are not rings.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, linktype, _, capacity, chunk, slots, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            return None
+        data = _data_offset(slots)
+        cursor = CURSOR.unpack_from(mm, CURSOR_OFFSET)[0]
+        # Keep clear of the part of the oldest lap the writer is about to overwrite
+        floor = max(0, cursor - capacity + capacity // 16)
+        pos = _first_position(mm, slots, floor, cursor, start)
+        if pos is None:
+            return linktype, []
+        # Walk the headers for frame boundaries in the window (one run per lap of
+        # contiguous bytes), then let mmap.find look for the addresses in bulk
+        runs, run = [], []
+        while pos < cursor:
+            phys = pos % capacity
+            if capacity - phys < 16:
+                pos += capacity - phys
+                continue
+            at = data + phys
+            sec, usec, n, orig = RECORD.unpack_from(mm, at)
+            if not n:
+                pos += capacity - phys   # end of lap marker
+                continue
+            ts = sec + usec * 1e-6
+            if ts > end:
+                break
+            if ts >= start:
+                if run and at < run[-1][0]:
+                    runs.append(run)
+                    run = []
+                run.append((at, ts, pos, n, orig))
+            pos += 16 + n
+        if run:
+            runs.append(run)
+        hits = []
+        view = memoryview(mm)
+        try:
+            for run in runs:
+                offsets = [frame[0] for frame in run]
+                low, high = offsets[0] + 16, offsets[-1] + 16 + run[-1][3]
+                candidates = set()
+                for needle in needles:
+                    found = mm.find(needle, low, high)
+                    while found >= 0:
+                        candidates.add(bisect.bisect_right(offsets, found) - 1)
+                        found = mm.find(needle, found + 1, high)
+                for k in sorted(candidates):
+                    at, ts, pos, n, orig = run[k]
+                    record = decode_frame(view[at + 16:at + 16 + n], ts, linktype)
+                    if record is not None and (record[1] in addresses or record[2] in addresses):
+                        hits.append((ts, pos, n, orig))
+        finally:
+            view.release()
+        return linktype, hits
+    finally:
+        mm.close()
+
+def _first_position(mm, slots, floor, cursor, start):
+    """Where to start reading for `start`: the last indexed frame at or before it, else the oldest one."""
+    index = np.frombuffer(mm, dtype=INDEX_DTYPE, count=slots, offset=INDEX_OFFSET).copy()
+    valid = (index["pos"] >= floor) & (index["pos"] < cursor)
+    before = valid & (index["ts"] <= start)
+    if before.any():
+        return int(index["pos"][before].max())
+    if valid.any():
+        return int(index["pos"][valid].min())
+    return None
+
+def _write_pcapng(out, rings, comment):
+    """rings: [(path, linktype, hits)]; packet bytes are written straight from each ring's mapping."""
+    shb_options = _option(1, comment.encode()) if comment else b""
+    shb_options += _option(4, b"Cyber-Rakshak evidence ring") + _option(0, b"")
+    body = struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1) + shb_options
+    out.write(struct.pack("<II", 0x0A0D0D0A, len(body) + 12) + body + struct.pack("<I", len(body) + 12))
+    maps = []
+    try:
+        for iface, (path, linktype, _) in enumerate(rings):
+            body = struct.pack("<HHI", linktype, 0, 0) + _option(2, os.path.basename(path).encode()) + _option(0, b"")
+            out.write(struct.pack("<II", 1, len(body) + 12) + body + struct.pack("<I", len(body) + 12))
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            maps.append((mm, memoryview(mm), HEADER.unpack_from(mm, 0)[3], _data_offset(HEADER.unpack_from(mm, 0)[5])))
+        packets = sorted((ts, iface, pos, n, orig) for iface, (_, _, hits) in enumerate(rings) for ts, pos, n, orig in hits)
+        written = 0
+        for ts, iface, pos, n, orig in packets:
+            _, view, capacity, data = maps[iface]
+            at = data + pos % capacity + 16
+            pad = -n % 4
+            total = 32 + n + pad
+            usec = int(ts * 1e6)
+            out.write(struct.pack("<IIIIIII", 6, total, iface, usec >> 32, usec & 0xFFFFFFFF, n, orig))
+            out.write(view[at:at + n])
+            out.write(b"\0" * pad + struct.pack("<I", total))
+            written += n
+        return len(packets), written
+    finally:
+        for mm, view, _, _ in maps:
+            view.release()
+            mm.close()
+
+def _option(code, value):
+    return struct.pack("<HH", code, len(value)) + value + b"\0" * (-len(value) % 4)
+
+def extract(addresses, start=None, end=None, out_path=None, comment=None, directory=None, max_age=None):
+    """
+    Writes every buffered frame to/from any of `addresses` between start and
+    end (epoch seconds, open ended when None) from all rings in `directory`
+    into one pcapng file, oldest first. Frames older than max_age seconds
+    are treated as gone. Returns {"path", "packets", "bytes", "rings",
+    "complete"}, or None when no ring exists. "complete" is False if the
+    writer lapped the window while it was being copied; the file then only
+    holds what was still intact.
+    """
+    directory = directory or config.EVIDENCE_DIR
+    max_age = config.EVIDENCE_SECONDS if max_age is None else max_age
+    paths = sorted(glob.glob(os.path.join(directory, "*.ring")))
+    if not paths:
+        return None
+    addresses = set(addresses)
+    needles = _needles(addresses)
+    start = -np.inf if start is None else float(start)
+    if max_age:
+        start = max(start, time.time() - max_age)
+    end = np.inf if end is None else float(end)
+    out_path = out_path or os.path.join(directory, "incidents", f"evidence-{int(time.time())}.pcapng")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    tmp = out_path + ".tmp"
+    for _ in range(3):
+        rings = []
+        for path in paths:
+            try:
+                scanned = _scan(path, addresses, needles, start, end)
+            except (OSError, ValueError, struct.error):
+                continue   # ring being recreated by a restarting capture
+            if scanned is not None:
+                rings.append((path, *scanned))
+        with open(tmp, "wb") as out:
+            packets, written = _write_pcapng(out, rings, comment)
+        # A frame the writer lapped while we copied may be torn; rescanning skips it
+        complete = all(not hits or _cursor(path) - _capacity(path) <= hits[0][1] for path, _, hits in rings)
+        if complete:
+            break
+    os.replace(tmp, out_path)
+    return {"path": out_path, "packets": packets, "bytes": written, "rings": len(rings), "complete": complete}
+
+def _cursor(path):
+    with open(path, "rb") as f:
+        f.seek(CURSOR_OFFSET)
+        return CURSOR.unpack(f.read(CURSOR.size))[0]
+
+def _capacity(path):
+    with open(path, "rb") as f:
+        return HEADER.unpack(f.read(HEADER.size))[3]
+
+# --- 4. AUTOMATIC EXTRACTION ---
+class EvidenceCollector:
+    """
+    Cuts a pcap for every new threat address without waiting for someone to
+    open the report (by then the ring may have wrapped). incident() only
+    records the request; a background thread extracts `post` seconds later,
+    so the file covers `pre` seconds before the first threat and the attack
+    that follows it. An address gets one capture per `cooldown` seconds.
+    """
+
+    def __init__(self, directory, pre=300.0, post=30.0, cooldown=600.0):
+        self.directory = directory
+        self.pre = pre
+        self.post = post
+        self.cooldown = cooldown
+        self.last = {}      # address -> time of its last scheduled capture
+        self.pending = []   # (due, address, epoch)
+        self.written = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def incident(self, ip, epoch=None):
+        now = time.time()
+        epoch = epoch or now
+        with self._lock:
+            if now - self.last.get(ip, -np.inf) < self.cooldown:
+                return False
+            if len(self.last) > 4096:
+                self.last = {k: t for k, t in self.last.items() if now - t < self.cooldown}
+            self.last[ip] = now
+            self.pending.append((now + self.post, ip, epoch))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rakshak-evidence", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return True
+
+    def _run(self):
+        from event_store import incident_id
+
+        while True:
+            with self._lock:
+                due = [job for job in self.pending if job[0] <= time.time()]
+                self.pending = [job for job in self.pending if job[0] > time.time()]
+                wait = min((job[0] for job in self.pending), default=None)
+            for _, ip, epoch in due:
+                name = incident_id(ip, epoch)
+                try:
+                    result = extract([ip], start=epoch - self.pre, directory=self.directory,
+                                     out_path=os.path.join(self.directory, "incidents", f"{name}.pcapng"),
+                                     comment=f"Cyber-Rakshak incident {name}: packets to/from {ip}")
+                except Exception as e:
+                    print(f"⚠️ Evidence extraction for {ip} failed: {e}")
+                    continue
+                if result is not None:
+                    self.written += 1
+            self._wake.wait(None if wait is None else max(0.0, wait - time.time()))
+            self._wake.clear()
+
+_collector = None
+_collector_lock = threading.Lock()
+
+def get_collector():
+    global _collector
+    if not config.EVIDENCE_ENABLED:
+        return None
+    with _collector_lock:
+        if _collector is None:
+            _collector = EvidenceCollector(config.EVIDENCE_DIR, pre=config.EVIDENCE_PRE, post=config.EVIDENCE_POST,
+                                           cooldown=config.EVIDENCE_COOLDOWN)
+    return _collector
+
+# --- 5. SIMULATED TRAFFIC ---
+def synthetic_packet(src, dst, sport, dport, size, flags=0x18):
+    """A raw IPv4/TCP packet of `size` bytes (zero payload), for the simulated attack's evidence."""
+    size = max(40, min(int(size), 65535))
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, size, 0, 0x4000, 64, 6, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    checksum = sum(struct.unpack("!10H", ip))
+    checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    ip = ip[:10] + struct.pack("!H", ~((checksum & 0xFFFF) + (checksum >> 16)) & 0xFFFF) + ip[12:]
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 1, 1, 0x50, flags, 65535, 0, 0)
+    return ip + tcp + bytes(size - 40)
+
+def record_simulated(row, packets=4):
+    """Puts a few packets matching a simulated attack row in the "simulated" ring, so its report has evidence too."""
+    ring = get_ring(SIMULATED, LINKTYPE_RAW, capacity_mb=16)
+    if ring is None or not row.get("Remote_IP"):
+        return
+    local = row.get("Local_IP") or "192.168.1.23"
+    size = (row.get("Size_KB") or 0.5) * 1024 / packets
+    for k in range(packets):
+        if row.get("Direction") == "Download":
+            ring.write(row["Epoch"] + k * 1e-3, synthetic_packet(row["Remote_IP"], local, 443, 49152, size))
+        else:
+            ring.write(row["Epoch"] + k * 1e-3, synthetic_packet(local, row["Remote_IP"], 49152, 443, size))
+
+SIMULATED = "simulated"
+_rings = {}
+_rings_lock = threading.Lock()
+
+def get_ring(name, linktype, capacity_mb=None):
+    """
+    The ring called `name` (one per capture interface, plus SIMULATED),
+    created on first use in this process. None when disabled.
+    """
+    if not config.EVIDENCE_ENABLED:
+        return None
+    with _rings_lock:
+        ring = _rings.get(name)
+        if ring is None:
+            try:
+                ring = _rings[name] = EvidenceRing(os.path.join(config.EVIDENCE_DIR, f"{name}.ring"),
+                                                   capacity=int((capacity_mb or config.EVIDENCE_MB) * 1e6),
+                                                   linktype=linktype,
+                                                   snaplen=config.EVIDENCE_SNAPLEN)
+            except OSError as e:
+                print(f"⚠️ Evidence ring {name} unavailable: {e}")
+                return None
+    return ring
+
+def capturing():
+    """True when this process keeps frames of real traffic (so automatic pcaps have something to cut)."""
+    return any(name != SIMULATED for name in _rings)
+
+def ring_stats():
+    with _rings_lock:
+        return {name: ring.stats() for name, ring in _rings.items()}
+
+# --- 6. COMMAND LINE ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract packets from the Cyber-Rakshak evidence rings.")
+    parser.add_argument("address", nargs="+", help="IP address(es) whose packets to extract")
+    parser.add_argument("--since", type=float, default=600.0, help="seconds back from now (default 600)")
+    parser.add_argument("-o", "--output", help="pcapng file to write (default data/evidence/incidents/...)")
+    parser.add_argument("--dir", default=None, help="evidence directory (default RAKSHAK_EVIDENCE_DIR)")
+    args = parser.parse_args(argv)
+
+    result = extract(args.address, start=time.time() - args.since, out_path=args.output, directory=args.dir,
+                     max_age=0)
+    if result is None:
+        print("⚠️ No evidence rings found (is capture running with RAKSHAK_EVIDENCE=1?)")
+        return 1
+    note = "" if result["complete"] else " (ring wrapped during extraction; oldest frames lost)"
+    print(f"✅ {result['packets']:,} packets ({result['bytes'] / 1e6:,.2f} MB) from {result['rings']} ring(s) "
+          f"-> {result['path']}{note}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import os
+import time
+import heapq
+import shutil
+import platform
+import threading
+import ipaddress
+import subprocess
+
+import config
+import metrics
+
+SET_NAME = "cyber_rakshak"
+TABLE_NAME = "cyber_rakshak"
+
+def _privileged(cmd):
+    # Same as the old `sudo iptables ...`: only prefix sudo when we aren't root already
+    if hasattr(os, "geteuid") and os.geteuid() != 0 and shutil.which("sudo"):
+        return ["sudo", "-n"] + cmd
+    return cmd
+
+def _run(cmd, stdin=None):
+    subprocess.run(_privileged(cmd), input=stdin, text=True, check=True,
+                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+
+# --- 1. BACKENDS ---
+# Each backend applies one batch of additions / removals in a single
+# transaction (one subprocess). Additions are (ip, ttl_seconds) pairs.
+# Backends with kernel_expiry drop an address themselves when its TTL runs
+# out, so the enforcer never sends deletes for expired addresses to them.
+class NftablesBackend:
+    """One inet table with timeout-enabled address sets; the kernel does an O(1) set lookup per packet."""
+
+    name = "nftables"
+    kernel_expiry = True
+
+    def setup_script(self):
+        # The chain is flushed and refilled so a restart doesn't stack duplicate rules
+        return (
+            f"table inet {TABLE_NAME} {{\n"
+            f"  set blocklist4 {{ type ipv4_addr; flags timeout; }}\n"
+            f"  set blocklist6 {{ type ipv6_addr; flags timeout; }}\n"
+            f"  chain input {{ type filter hook input priority -10; policy accept; }}\n"
+            f"}}\n"
+            f"flush chain inet {TABLE_NAME} input\n"
+            f"add rule inet {TABLE_NAME} input ip saddr @blocklist4 drop\n"
+            f"add rule inet {TABLE_NAME} input ip6 saddr @blocklist6 drop\n"
+        )
+
+    def render(self, additions, removals):
+        # `add element` keeps the old timeout of an existing element and `delete element`
+        # fails on a missing one (failing the whole atomic batch), so both go through
+        # add (no-op if present) + delete; refreshes are then re-added with the new timeout.
+        lines = []
+        for family in (4, 6):
+            adds = [(ip, ttl) for ip, ttl in additions if ipaddress.ip_address(ip).version == family]
+            dels = [ip for ip in removals if ipaddress.ip_address(ip).version == family]
+            present = [ip for ip, _ in adds] + dels
+            if present:
+                lines.append(f"add element inet {TABLE_NAME} blocklist{family} {{ {', '.join(present)} }}")
+                lines.append(f"delete element inet {TABLE_NAME} blocklist{family} {{ {', '.join(present)} }}")
+            if adds:
+                elements = ", ".join(f"{ip} timeout {ttl}s" for ip, ttl in adds)
+                lines.append(f"add element inet {TABLE_NAME} blocklist{family} {{ {elements} }}")
+        return "\n".join(lines) + "\n"
+
+    def setup(self):
+        _run(["nft", "-f", "-"], stdin=self.setup_script())
+
+    def apply(self, additions, removals):
+        _run(["nft", "-f", "-"], stdin=self.render(additions, removals))
+
+class IpsetBackend:
+    """ipset hash:ip sets referenced by a single iptables rule each."""
+
+    name = "ipset"
+    kernel_expiry = True   # `add -exist` also resets the timeout of an existing entry
+
+    def render(self, additions, removals):
+        lines = []
+        for ip, ttl in additions:
+            lines.append(f"add {self._set(ip)} {ip} timeout {ttl} -exist")
+        for ip in removals:
+            lines.append(f"del {self._set(ip)} {ip} -exist")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _set(ip):
+        return SET_NAME if ipaddress.ip_address(ip).version == 4 else SET_NAME + "6"
+
+    def setup(self):
+        _run(["ipset", "create", SET_NAME, "hash:ip", "family", "inet", "timeout", "0", "-exist"])
+        _run(["ipset", "create", SET_NAME + "6", "hash:ip", "family", "inet6", "timeout", "0", "-exist"])
+        for tool, name in (("iptables", SET_NAME), ("ip6tables", SET_NAME + "6")):
+            rule = ["INPUT", "-m", "set", "--match-set", name, "src", "-j", "DROP"]
+            try:
+                _run([tool, "-C"] + rule)
+            except subprocess.CalledProcessError:
+                _run([tool, "-I"] + rule)
+
+    def apply(self, additions, removals):
+        _run(["ipset", "restore"], stdin=self.render(additions, removals))
+
+class NetshBackend:
+    """Windows Firewall: one rule whose remote address list is rewritten per batch."""
+
+    name = "netsh"
+    kernel_expiry = False
+
+    def __init__(self):
+        self.current = set()
+        self.created = False
+
+    def setup(self):
+        # Start from a clean rule so the address list matches our block set
+        subprocess.run(["netsh", "advfirewall", "firewall", "delete", "rule", "name=CYBER_RAKSHAK_BLOCK"],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+
+    def render(self, additions, removals):
+        self.current |= {ip for ip, _ in additions}
+        self.current -= set(removals)
+        return ",".join(sorted(self.current))
+
+    def apply(self, additions, removals):
+        remote = self.render(additions, removals)
+        rule = ["netsh", "advfirewall", "firewall"]
+        if not remote:
+            cmd = rule + ["delete", "rule", "name=CYBER_RAKSHAK_BLOCK"]
+        elif self.created:
+            cmd = rule + ["set", "rule", "name=CYBER_RAKSHAK_BLOCK", "new", f"remoteip={remote}"]
+        else:
+            cmd = rule + ["add", "rule", "name=CYBER_RAKSHAK_BLOCK", "dir=in", "action=block", f"remoteip={remote}"]
+        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+        self.created = bool(remote)
+
+class DryRunBackend:
+    """Writes the nftables ruleset that would be applied to a file instead of touching the OS."""
+
+    name = "dry-run"
+    kernel_expiry = False
+
+    def __init__(self, path):
+        self.path = path
+        self.renderer = NftablesBackend()
+        self.blocked = {}
+
+    def setup(self):
+        pass
+
+    def render(self, additions, removals):
+        return self.renderer.render(additions, removals)
+
+    def apply(self, additions, removals):
+        for ip, ttl in additions:
+            self.blocked[ip] = ttl
+        for ip in removals:
+            self.blocked.pop(ip, None)
+        with open(self.path, "w") as f:
+            f.write(f"# Cyber-Rakshak dry run @ {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(self.renderer.setup_script())
+            f.write(self.renderer.render(sorted(self.blocked.items()), []))
+
+def default_backend(name=None):
+    name = (name or config.FIREWALL_BACKEND).lower()
+    if name == "auto":
+        system = platform.system()
+        if system == "Windows":
+            name = "netsh"
+        elif system == "Linux" and shutil.which("nft"):
+            name = "nftables"
+        elif system == "Linux" and shutil.which("ipset"):
+            name = "ipset"
+        else:
+            name = "dryrun"
+    backends = {"nftables": NftablesBackend, "ipset": IpsetBackend, "netsh": NetshBackend}
+    if name in backends:
+        return backends[name]()
+    return DryRunBackend(config.FIREWALL_DRYRUN_PATH)
+
+# --- 2. ENFORCER ---
+class Enforcer:
+    """
+    Keeps the block set and applies changes to the OS in batches.
+
+    block()/unblock() are idempotent and only touch in-memory state; a
+    background thread (or an explicit flush()) pushes all pending changes
+    in one backend call and unblocks addresses whose TTL ran out.
+    """
+
+    def __init__(self, backend, default_ttl=3600, flush_interval=1.0):
+        self.backend = backend
+        self.default_ttl = int(default_ttl)
+        self.flush_interval = flush_interval
+        self.blocked = {}        # ip -> expiry (monotonic seconds)
+        self._expiries = []      # heap of (expiry, ip); stale entries skipped lazily
+        self._pending_add = {}   # ip -> ttl
+        self._pending_del = set()
+        self._del_failures = {}  # ip -> failed batches its removal was in
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()   # one backend transaction at a time, in order
+        self._ready = False
+        self._retry_at = 0.0
+        self.last_error = None
+        self.stats = {"blocked": 0, "unblocked": 0, "expired": 0, "batches": 0, "failed_batches": 0}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def block(self, ip, ttl=None):
+        """Returns True if the address was newly blocked, False if it only had its TTL refreshed."""
+        ip = str(ipaddress.ip_address(ip))
+        ttl = int(ttl or self.default_ttl)
+        expiry = time.monotonic() + ttl
+        with self._lock:
+            is_new = ip not in self.blocked
+            self.blocked[ip] = expiry
+            heapq.heappush(self._expiries, (expiry, ip))
+            self._pending_add[ip] = ttl
+            self._pending_del.discard(ip)
+            if is_new:
+                self.stats["blocked"] += 1
+        return is_new
+
+    def unblock(self, ip):
+        ip = str(ipaddress.ip_address(ip))
+        with self._lock:
+            if self.blocked.pop(ip, None) is None:
+                return False
+            self._pending_add.pop(ip, None)
+            self._pending_del.add(ip)
+            self.stats["unblocked"] += 1
+        return True
+
+    def is_blocked(self, ip):
+        return ip in self.blocked
+
+    def _expire(self, now):
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, ip = heapq.heappop(self._expiries)
+            if self.blocked.get(ip) == expiry:   # skip entries superseded by a refresh
+                del self.blocked[ip]
+                self._pending_add.pop(ip, None)
+                if not getattr(self.backend, "kernel_expiry", False):
+                    self._pending_del.add(ip)
+                self.stats["expired"] += 1
+
+    def flush(self, force=False):
+        """Applies everything pending in one transaction. Returns True on success."""
+        # The background thread and a forced flush (sever_connection) must not both run
+        # setup(), or apply batches out of order (an unblock overtaking its block)
+        with self._apply_lock:
+            return self._flush(force)
+
+    def _flush(self, force):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not self._pending_add and not self._pending_del:
+                return True
+            if not force and now < self._retry_at:
+                return False
+            additions = list(self._pending_add.items())
+            removals = list(self._pending_del)
+            self._pending_add, self._pending_del = {}, set()
+        try:
+            if not self._ready:
+                self.backend.setup()
+                self._ready = True
+            with metrics.STAGE_SECONDS.time("firewall"):
+                self.backend.apply(additions, removals)
+            self.stats["batches"] += 1
+            self.last_error = None
+            with self._lock:
+                for ip in removals:
+                    self._del_failures.pop(ip, None)
+            return True
+        except Exception as e:
+            # Typically missing admin rights. Keep the changes pending (the
+            # block set is still tracked in memory) and retry later.
+            with self._lock:
+                for ip, ttl in additions:
+                    if ip in self.blocked:
+                        self._pending_add.setdefault(ip, ttl)
+                for ip in removals:
+                    if ip in self.blocked:
+                        continue
+                    # A removal that keeps failing (address already gone) must not hold back every later batch
+                    failures = self._del_failures.get(ip, 0) + 1
+                    if failures < 3:
+                        self._del_failures[ip] = failures
+                        self._pending_del.add(ip)
+                    else:
+                        self._del_failures.pop(ip, None)
+            self._retry_at = time.monotonic() + 30.0
+            self.stats["failed_batches"] += 1
+            self.last_error = str(e)
+            return False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rakshak-firewall", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop_event.set()
+        self.flush()
+
+_enforcer = None
+_enforcer_lock = threading.Lock()
+
+def get_enforcer():
+    global _enforcer
+    with _enforcer_lock:
+        if _enforcer is None:
+            _enforcer = Enforcer(default_backend(), default_ttl=config.FIREWALL_TTL,
+                                 flush_interval=config.FIREWALL_FLUSH_INTERVAL).start()
+    return _enforcer
+
+metrics.REGISTRY.callback("firewall_blocked", "Addresses currently blocked by the enforcer.",
+                          lambda: len(_enforcer.blocked) if _enforcer is not None else 0)
+metrics.REGISTRY.callback("firewall_pending", "Block/unblock changes waiting for the next ruleset flush.",
+                          lambda: len(_enforcer._pending_add) + len(_enforcer._pending_del) if _enforcer is not None else 0)
@@ -0,0 +1,199 @@
+import math
+import ipaddress
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+# --- FLOW FEATURE SCHEMA ---
+# Order matters: this is the column order the detector is trained and scored on.
+FEATURE_NAMES = [
+    "bytes_per_s",    # decayed byte rate over the window
+    "pkts_per_s",     # decayed packet rate over the window
+    "mean_size",      # average packet size in the window
+    "iat_mean",       # EWMA of inter-arrival time (s)
+    "iat_std",        # EWMA std-dev of inter-arrival time (s)
+    "syn_frac",       # share of packets with SYN set
+    "rst_frac",       # share of packets with RST set
+    "fin_frac",       # share of packets with FIN set
+    "upload_frac",    # share of bytes going out of the local network
+    "duration",       # seconds since the flow was first seen
+]
+
+TCP_FIN, TCP_SYN, TCP_RST = 0x01, 0x02, 0x04
+
+# The protected LAN is the set of subnets the scanner sweeps (RAKSHAK_SCAN_SUBNETS,
+# else this host's /24). Every "which end is local" decision goes through here.
+_lan = None
+
+def set_lan(cidrs):
+    """Overrides the LAN subnets (an iterable of CIDR strings)."""
+    global _lan
+    _lan = [ipaddress.ip_network(c, strict=False) for c in cidrs]
+    is_local_address.cache_clear()
+
+@lru_cache(maxsize=65536)
+def is_local_address(ip):
+    """True for addresses on the protected (home) network; traffic from them counts as upload."""
+    if _lan is None:
+        from scanner import configured_subnets
+        set_lan(str(n) for n in configured_subnets())
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _lan)
+
+def flow_key(src, dst, sport, dport, proto):
+    """Direction-independent 5-tuple so both halves of a conversation share one flow."""
+    if (src, sport) <= (dst, dport):
+        return (proto, src, sport, dst, dport)
+    return (proto, dst, dport, src, sport)
+
+# --- FLOW TABLE ---
+class FlowTable:
+    """
+    Per-flow state stored in array-backed columns (8 bytes per field per flow)
+    instead of one Python object per flow, so a few hundred thousand flows
+    fit in tens of MB. Counters decay exponentially with a time constant of
+    `window` seconds, which gives sliding-window rates in O(1) memory.
+    Idle flows are evicted after `idle_timeout`; when `max_flows` is reached
+    the least recently seen flow is recycled.
+    """
+
+    _COLUMNS = ("first", "last", "pkts", "bytes", "up_bytes", "iat_mean", "iat_var", "syn", "rst", "fin")
+
+    def __init__(self, window=10.0, idle_timeout=60.0, max_flows=262144, sweep_interval=5.0, iat_alpha=0.2):
+        self.window = float(window)
+        self.idle_timeout = float(idle_timeout)
+        self.max_flows = int(max_flows)
+        self.sweep_interval = sweep_interval
+        self.iat_alpha = iat_alpha
+        self._capacity = 0
+        for name in self._COLUMNS:
+            setattr(self, name, array("d"))
+        self._keys = []          # slot -> key (None when free)
+        self._index = {}         # key -> slot
+        self._free = []
+        self._next_sweep = 0.0
+        self.evicted = 0
+        self.recycled = 0
+        self._grow(min(4096, self.max_flows))
+
+    def _grow(self, new_capacity):
+        extra = new_capacity - self._capacity
+        if extra <= 0:
+            return
+        zeros = array("d", bytes(8 * extra))
+        for name in self._COLUMNS:
+            getattr(self, name).extend(zeros)
+        # Free slots never look idle, so expire() only visits live flows
+        self.last[self._capacity:] = array("d", [math.inf]) * extra
+        self._keys.extend([None] * extra)
+        self._free.extend(range(new_capacity - 1, self._capacity - 1, -1))
+        self._capacity = new_capacity
+
+    def _release(self, slot):
+        del self._index[self._keys[slot]]
+        self._keys[slot] = None
+        self.last[slot] = math.inf
+        self._free.append(slot)
+
+    def _allocate(self, key, ts):
+        if not self._free:
+            if self._capacity < self.max_flows:
+                self._grow(min(self._capacity * 2, self.max_flows))
+            else:
+                self.expire(ts)
+                if not self._free:
+                    # Recycle the least recently seen flows in one batch so a
+                    # full table doesn't pay an O(n) scan per new flow.
+                    for victim in self._oldest_slots(max(1, self._capacity // 64)):
+                        self._release(victim)
+                        self.recycled += 1
+        slot = self._free.pop()
+        self._keys[slot] = key
+        self._index[key] = slot
+        for name in self._COLUMNS:
+            getattr(self, name)[slot] = 0.0
+        self.first[slot] = ts
+        self.last[slot] = ts
+        return slot
+
+    def _oldest_slots(self, n):
+        last = np.frombuffer(self.last, dtype=np.float64)
+        if n >= len(last):
+            return list(range(len(last)))
+        return np.argpartition(last, n - 1)[:n].tolist()
+
+    def update(self, ts, key, size, flags=0, upload=False):
+        """Fold one packet into its flow and return the flow's slot."""
+        if ts >= self._next_sweep:
+            self.expire(ts)
+            self._next_sweep = ts + self.sweep_interval
+
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._allocate(key, ts)
+            dt = 0.0
+            decay = 1.0
+        else:
+            dt = max(0.0, ts - self.last[slot])
+            decay = math.exp(-dt / self.window)
+            # EWMA mean / variance of the inter-arrival time
+            a = self.iat_alpha
+            diff = dt - self.iat_mean[slot]
+            self.iat_mean[slot] += a * diff
+            self.iat_var[slot] = (1 - a) * (self.iat_var[slot] + a * diff * diff)
+
+        self.last[slot] = ts
+        self.pkts[slot] = self.pkts[slot] * decay + 1.0
+        self.bytes[slot] = self.bytes[slot] * decay + size
+        self.up_bytes[slot] = self.up_bytes[slot] * decay + (size if upload else 0.0)
+        self.syn[slot] = self.syn[slot] * decay + (1.0 if flags & TCP_SYN else 0.0)
+        self.rst[slot] = self.rst[slot] * decay + (1.0 if flags & TCP_RST else 0.0)
+        self.fin[slot] = self.fin[slot] * decay + (1.0 if flags & TCP_FIN else 0.0)
+        return slot
+
+    def features(self, slot):
+        """Feature vector (FEATURE_NAMES order) for a flow as of its last packet."""
+        pkts = self.pkts[slot]
+        nbytes = self.bytes[slot]
+        return (
+            nbytes / self.window,
+            pkts / self.window,
+            nbytes / pkts,
+            self.iat_mean[slot],
+            math.sqrt(self.iat_var[slot]),
+            self.syn[slot] / pkts,
+            self.rst[slot] / pkts,
+            self.fin[slot] / pkts,
+            self.up_bytes[slot] / nbytes if nbytes else 0.0,
+            self.last[slot] - self.first[slot],
+        )
+
+    def expire(self, now):
+        """Evict every flow idle for longer than idle_timeout. Returns the count."""
+        if not self._index:
+            return 0
+        last = np.frombuffer(self.last, dtype=np.float64)
+        idle = np.flatnonzero(last < now - self.idle_timeout)
+        for slot in idle.tolist():
+            self._release(slot)
+        self.evicted += len(idle)
+        return len(idle)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def stats(self):
+        return {
+            "flows": len(self._index),
+            "capacity": self._capacity,
+            "max_flows": self.max_flows,
+            "evicted": self.evicted,
+            "recycled": self.recycled,
+        }
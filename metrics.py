@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+import bisect
+import threading
+import traceback
+from collections import Counter as _Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import config
+
+# --- 1. METRIC TYPES ---
+# Updates are plain attribute/list increments: cheap enough for per-batch
+# use on the hot path and safe under the GIL without a lock.
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, {}, self.value
+
+class CallbackMetric:
+    """Gauge (or counter) whose value is read from a callable at scrape time, e.g. a queue depth."""
+
+    def __init__(self, name, help_text, fn, kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is not None:
+            yield self.name, {}, value
+
+# Latency buckets in seconds: 10 us .. ~5 s, roughly x2.5 apart
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    """Fixed-bucket histogram with one series per label value (e.g. per pipeline stage)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}   # label value -> [bucket counts..., +Inf count], sum
+
+    def observe(self, label_value, value, count=1):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += count
+        series[1] += value * count
+
+    def time(self, label_value):
+        return _Timer(self, label_value)
+
+    def quantile(self, label_value, q):
+        """Upper bucket bound below which a fraction q of observations fall (None if empty)."""
+        series = self.series.get(label_value)
+        if not series:
+            return None
+        counts = series[0]
+        target = q * sum(counts)
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            if running >= target:
+                return bound
+        return None
+
+    def samples(self):
+        for label_value, (counts, total) in sorted(self.series.items()):
+            labels = {self.label: label_value}
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                yield self.name + "_bucket", dict(labels, le=repr(bound)), running
+            running += counts[-1]
+            yield self.name + "_bucket", dict(labels, le="+Inf"), running
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, running
+
+class _Timer:
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.label_value, time.perf_counter() - self.start)
+        return False
+
+# --- 2. REGISTRY ---
+class Registry:
+    def __init__(self, prefix="rakshak_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text):
+        return self._add(Counter(self.prefix + name, help_text))
+
+    def histogram(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help_text, label, buckets))
+
+    def callback(self, name, help_text, fn, kind="gauge"):
+        """Registers (or replaces) a metric computed at scrape time."""
+        metric = CallbackMetric(self.prefix + name, help_text, fn, kind)
+        with self._lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Plain-dict view for the dashboard: scalar values plus p50/p95/count per histogram series."""
+        out = {}
+        for name, metric in list(self.metrics.items()):
+            short = name[len(self.prefix):]
+            if isinstance(metric, Histogram):
+                out[short] = {
+                    label: {"count": sum(series[0]), "sum": series[1],
+                            "p50": metric.quantile(label, 0.5), "p95": metric.quantile(label, 0.95)}
+                    for label, series in list(metric.series.items())
+                }
+            else:
+                for _, _, value in metric.samples():
+                    out[short] = value
+        return out
+
+REGISTRY = Registry()
+render = REGISTRY.render
+snapshot = REGISTRY.snapshot
+
+# --- 3. PIPELINE METRICS ---
+# Stages: capture (packet age when the pipeline picks it up), decode,
+# enrich, inference, alert (webhook delivery), firewall (ruleset apply).
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Time spent per batch in each pipeline stage.", "stage")
+PACKETS_SCORED = REGISTRY.counter("packets_scored_total", "Packets that went through the detector.")
+PACKETS_FLAGGED = REGISTRY.counter("packets_flagged_total", "Packets the detector flagged as anomalous.")
+INFERENCE_BATCHES = REGISTRY.counter("inference_batches_total", "Model calls (one per scoring batch).")
+
+def resident_memory_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024   # peak, where current isn't available
+        except ImportError:
+            return None
+
+REGISTRY.callback("resident_memory_bytes", "Resident set size of this process.", resident_memory_bytes)
+REGISTRY.callback("uptime_seconds", "Seconds since the metrics module was loaded.",
+                  lambda started=time.time(): round(time.time() - started, 1))
+
+# --- 4. SAMPLING PROFILER ---
+def profile(seconds=5.0, interval=0.005, top=30):
+    """
+    Samples every thread's stack for `seconds` and returns the hottest stacks
+    in collapsed "frame;frame;frame count" form (flamegraph.pl / speedscope
+    input). Nothing runs unless this is called.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = _Tally()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = [f"{os.path.basename(fs.filename)}:{fs.name}" for fs in traceback.extract_stack(frame)]
+            stacks[names.get(ident, str(ident)) + ";" + ";".join(frames)] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common(top)) + "\n"
+
+# --- 5. HTTP ENDPOINT ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            body = render()
+            ctype = "text/plain; version=0.0.4"
+        elif url.path == "/debug/profile":
+            try:
+                seconds = float(parse_qs(url.query).get("seconds", ["5"])[0])
+            except ValueError:
+                self.send_error(400, "seconds must be a number")
+                return
+            body = profile(min(60.0, max(0.1, seconds)))
+            ctype = "text/plain"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass   # keep scrapes out of the console
+
+_server = None
+_server_lock = threading.Lock()
+
+def serve(address=None):
+    """Starts the /metrics (+ /debug/profile) endpoint once per process. Returns False if the port is taken."""
+    global _server
+    address = address if address is not None else config.METRICS_ADDRESS
+    if not address:
+        return False
+    with _server_lock:
+        if _server is None:
+            host, _, port = address.rpartition(":")
+            try:
+                _server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _Handler)
+            except OSError as e:
+                print(f"⚠️ Metrics endpoint not started on {address}: {e}")
+                return False
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="rakshak-metrics", daemon=True).start()
+    return True
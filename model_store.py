@@ -0,0 +1,224 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+import config
+from flows import FlowTable, FEATURE_NAMES, flow_key, is_local_address
+
+# --- 1. TRAINING ---
+def train_detector(X, contamination=0.1, random_state=42):
+    clf = IsolationForest(contamination=contamination, random_state=random_state)
+    clf.fit(np.asarray(X, dtype=np.float64))
+    return clf
+
+def synthetic_baseline(n=1000):
+    """Placeholder 'normal traffic' used until a baseline is built from real captures."""
+    return np.abs(np.random.normal(
+        loc=[20000, 20, 800, 0.05, 0.05, 0.02, 0.0, 0.01, 0.3, 30],
+        scale=[15000, 15, 400, 0.05, 0.05, 0.02, 0.01, 0.01, 0.2, 20],
+        size=(n, len(FEATURE_NAMES))))
+
+def features_from_records(records, max_samples=200000):
+    """
+    Replays capture records (capture.parse_packet tuples) through a private
+    FlowTable and returns the per-packet flow feature matrix the live
+    detector would have seen. Uniformly subsampled to max_samples rows.
+    """
+    table = FlowTable(window=config.FLOW_WINDOW, idle_timeout=config.FLOW_IDLE_TIMEOUT, max_flows=config.FLOW_MAX)
+    rows = []
+    seen = 0
+    rng = np.random.default_rng(42)
+    for ts, src, dst, sport, dport, proto, size, flags in records:
+        slot = table.update(ts, flow_key(src, dst, sport, dport, proto), size, flags, upload=is_local_address(src))
+        seen += 1
+        if len(rows) < max_samples:
+            rows.append(table.features(slot))
+        else:
+            # Reservoir sampling keeps the baseline bounded on huge captures
+            j = rng.integers(seen)
+            if j < max_samples:
+                rows[j] = table.features(slot)
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+
+def records_from_pcap(path):
+    from replay import read_records
+    return read_records(path)
+
+def records_from_event_log(path):
+    """
+    Event logs are CSV or JSON-lines files with the capture record fields:
+    timestamp, src, dst, sport, dport, protocol, size, tcp_flags
+    """
+    def to_record(row):
+        return (float(row["timestamp"]), row["src"], row["dst"], int(row.get("sport") or 0),
+                int(row.get("dport") or 0), row.get("protocol", "IP"), int(row["size"]), int(row.get("tcp_flags") or 0))
+
+    with open(path, newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    yield to_record(json.loads(line))
+        else:
+            for row in csv.DictReader(f):
+                yield to_record(row)
+
+# --- 2. MODEL STORE ---
+class ModelStore:
+    """
+    Persists the detector together with its feature schema and version.
+
+    The model is loaded lazily on the first get(). A retrain (in another
+    process or a background thread) writes a new file atomically; the live
+    process notices the newer file and loads it off the scoring path, then
+    swaps the reference in one assignment, so scoring never waits.
+    """
+
+    def __init__(self, path, check_interval=30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._model = None
+        self._meta = {}
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+
+    def get(self):
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load_or_bootstrap()
+                model = self._model
+        elif time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            self.reload_if_changed()
+        return model
+
+    @property
+    def meta(self):
+        return dict(self._meta)
+
+    def _read(self):
+        bundle = joblib.load(self.path)
+        if bundle.get("features") != FEATURE_NAMES:
+            raise ValueError(f"model at {self.path} was trained on {bundle.get('features')}, expected {FEATURE_NAMES}")
+        return bundle
+
+    def _install(self, bundle, mtime):
+        self._meta = {k: v for k, v in bundle.items() if k != "model"}
+        self._mtime = mtime
+        self._model = bundle["model"]
+
+    def _load_or_bootstrap(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            self._install(self._read(), mtime)
+            print(f"✅ AI Model v{self._meta['version']} loaded from {self.path}")
+            return
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Could not load model ({e}), rebuilding baseline.")
+        print("🧠 Training AI Model (synthetic baseline)...")
+        self.save(train_detector(synthetic_baseline()), source="synthetic", samples=1000)
+        print("✅ AI Model Trained & Ready.")
+
+    def save(self, model, source="unknown", samples=0):
+        """Write a new model version atomically and make it the live model."""
+        version = int(self._meta.get("version", 0)) + 1
+        if self._model is None and os.path.exists(self.path):
+            try:
+                version = max(version, int(joblib.load(self.path)["version"]) + 1)
+            except Exception:
+                pass
+        bundle = {
+            "model": model,
+            "features": list(FEATURE_NAMES),
+            "version": version,
+            "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "source": source,
+            "samples": int(samples),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        joblib.dump(bundle, tmp)
+        os.replace(tmp, self.path)
+        self._install(bundle, os.path.getmtime(self.path))
+        return version
+
+    def reload_if_changed(self):
+        """Load a newer model file in a background thread, then swap it in."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime or self._reloading:
+            return False
+        self._reloading = True
+
+        def worker():
+            try:
+                self._install(self._read(), mtime)
+                print(f"🔄 AI Model v{self._meta['version']} swapped in.")
+            except Exception as e:
+                self._mtime = mtime   # don't retry a broken file every check
+                print(f"⚠️ Model reload failed: {e}")
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=worker, name="rakshak-model-reload", daemon=True).start()
+        return True
+
+    def retrain_async(self, records, source="live"):
+        """Fit a new baseline from records in the background and swap it in when done."""
+        def worker():
+            X = features_from_records(records)
+            if len(X):
+                version = self.save(train_detector(X), source=source, samples=len(X))
+                print(f"🔄 AI Model v{version} retrained on {len(X)} samples.")
+        thread = threading.Thread(target=worker, name="rakshak-retrain", daemon=True)
+        thread.start()
+        return thread
+
+# --- 3. OFFLINE RETRAINING COMMAND ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the Cyber-Rakshak detector baseline from captured traffic.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    retrain = sub.add_parser("retrain", help="train a new model version")
+    source = retrain.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pcap", help="pcap/pcapng capture of normal traffic")
+    source.add_argument("--events", help="CSV or JSON-lines event log of capture records")
+    retrain.add_argument("--model", default=config.MODEL_PATH, help="model file to write")
+    retrain.add_argument("--max-samples", type=int, default=200000)
+    retrain.add_argument("--contamination", type=float, default=0.1)
+    sub.add_parser("info", help="show the stored model's metadata").add_argument("--model", default=config.MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    store = ModelStore(args.model)
+    if args.command == "info":
+        store.get()
+        print(json.dumps(store.meta, indent=2))
+        return 0
+
+    path = args.pcap or args.events
+    records = records_from_pcap(path) if args.pcap else records_from_event_log(path)
+    print(f"📦 Building baseline from {path}...")
+    X = features_from_records(records, max_samples=args.max_samples)
+    if not len(X):
+        print("⚠️ No IP traffic found, model unchanged.")
+        return 1
+    version = store.save(train_detector(X, contamination=args.contamination), source=os.path.basename(path), samples=len(X))
+    print(f"✅ Model v{version} saved to {args.model} ({len(X)} samples).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
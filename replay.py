@@ -0,0 +1,236 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+import threading
+
+# --- 1. STREAMING PCAP / PCAPNG READER ---
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),   # little-endian, microseconds
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),   # nanosecond variant
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB, PCAPNG_SPB, PCAPNG_EPB = 1, 3, 6
+
+class CaptureFileError(ValueError):
+    pass
+
+def read_frames(path):
+    """
+    Yields (timestamp, linktype, frame) for every packet in a pcap or pcapng
+    file. The file is memory-mapped and frames are memoryview slices of the
+    mapping, so multi-GB captures are paged in by the OS as we go instead of
+    being loaded. A frame is only valid until the generator advances; copy it
+    (bytes(frame)) to keep it.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                magic = bytes(view[:4])
+                if magic in PCAP_MAGIC:
+                    yield from _read_pcap(view, *PCAP_MAGIC[magic])
+                elif struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+                    yield from _read_pcapng(view)
+                else:
+                    raise CaptureFileError(f"{path} is not a pcap/pcapng file")
+            finally:
+                view.release()
+
+def _read_pcap(view, endian, ts_unit):
+    linktype = struct.unpack_from(endian + "I", view, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    offset, end = 24, len(view)
+    while offset + 16 <= end:
+        ts_sec, ts_frac, incl_len, _ = record.unpack_from(view, offset)
+        offset += 16
+        if offset + incl_len > end:
+            break   # truncated last packet (capture still being written)
+        frame = view[offset:offset + incl_len]
+        try:
+            yield ts_sec + ts_frac * ts_unit, linktype, frame
+        finally:
+            frame.release()
+        offset += incl_len
+
+def _read_pcapng(view):
+    end = len(view)
+    offset = 0
+    endian = "<"
+    interfaces = []   # (linktype, ts_unit) per interface id of the current section
+    while offset + 12 <= end:
+        block_type = struct.unpack_from(endian + "I", view, offset)[0]
+        if block_type == PCAPNG_SHB:
+            bom = bytes(view[offset + 8:offset + 12])
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+        block_len = struct.unpack_from(endian + "I", view, offset + 4)[0]
+        if block_len < 12 or offset + block_len > end:
+            break
+        body = offset + 8
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", view, body)[0]
+            interfaces.append((linktype, _idb_ts_unit(view, body + 8, offset + block_len - 4, endian)))
+        elif block_type == PCAPNG_EPB:
+            iface, ts_high, ts_low, cap_len, _ = struct.unpack_from(endian + "IIIII", view, body)
+            linktype, ts_unit = interfaces[iface] if iface < len(interfaces) else (1, 1e-6)
+            frame = view[body + 20:body + 20 + cap_len]
+            try:
+                yield ((ts_high << 32) | ts_low) * ts_unit, linktype, frame
+            finally:
+                frame.release()
+        elif block_type == PCAPNG_SPB:
+            orig_len = struct.unpack_from(endian + "I", view, body)[0]
+            cap_len = min(orig_len, block_len - 16)
+            linktype = interfaces[0][0] if interfaces else 1
+            frame = view[body + 4:body + 4 + cap_len]
+            try:
+                yield 0.0, linktype, frame   # simple packets carry no timestamp
+            finally:
+                frame.release()
+        offset += block_len
+
+def _idb_ts_unit(view, offset, end, endian):
+    """Reads the if_tsresol option of an Interface Description Block."""
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", view, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            resol = view[offset + 4]
+            return 2.0 ** -(resol & 0x7F) if resol & 0x80 else 10.0 ** -resol
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+# --- 2. DECODING TO CAPTURE RECORDS ---
+def read_records(path):
+    """
+    Yields capture records (same tuples as capture.parse_packet) from a
+    capture file, decoded straight from the mapped frames (decoder.py).
+    """
+    from decoder import decode_frame
+
+    for ts, linktype, frame in read_frames(path):
+        record = decode_frame(frame, ts, linktype)
+        if record is not None:
+            yield record
+
+def paced(records, speed=1.0):
+    """Re-emits records with their original spacing (speed=2.0 plays twice as fast)."""
+    start_wall = None
+    for record in records:
+        if start_wall is None:
+            start_wall, start_ts = time.monotonic(), record[0]
+        delay = (record[0] - start_ts) / speed - (time.monotonic() - start_wall)
+        if delay > 0:
+            time.sleep(delay)
+        yield record
+
+# --- 3. REPLAY SOURCE FOR THE LIVE PIPELINE ---
+class ReplayWorker(threading.Thread):
+    """Stands in for capture.CaptureWorker, feeding the ring buffer from a capture file."""
+
+    def __init__(self, buffer, path, realtime=True, speed=1.0, loop=False):
+        super().__init__(name="rakshak-replay", daemon=True)
+        self.buffer = buffer
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.seen = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import talkers
+        talkers.get_talkers().live = False   # rank as of the replayed packets, not the wall clock
+        while not self._stop_event.is_set():
+            try:
+                records = read_records(self.path)
+                if self.realtime:
+                    records = paced(records, self.speed)
+                for record in records:
+                    if self._stop_event.is_set():
+                        return
+                    self.seen += 1
+                    self.buffer.push(record)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Replay failed: {e}")
+                return
+            if not self.loop:
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+# --- 4. THROUGHPUT RUN ---
+REALTIME_FLUSH = 0.25   # seconds a paced run holds packets before pushing a partial batch through
+
+def run(path, realtime=False, speed=1.0, chunk=None, events_dir=None):
+    """
+    Pushes a capture file through the full backend pipeline (flows, batched
+    scoring) and returns throughput stats. Events are only stored when
+    `events_dir` is given, never in the live store a running pipeline writes.
+    """
+    import config
+    config.EVENTS_ENABLED, config.EVENTS_DIR = events_dir is not None, events_dir or config.EVENTS_DIR
+    import backend
+    import talkers
+
+    talkers.get_talkers().live = False
+    chunk = chunk or config.SCORE_BATCH_SIZE
+    records = read_records(path)
+    if realtime:
+        records = paced(records, speed)
+
+    packets = flagged = 0
+    pending = []
+    start = deadline = time.perf_counter()
+    for record in records:
+        if not pending:
+            deadline = time.perf_counter() + REALTIME_FLUSH
+        pending.append(record)
+        # Full batches at max speed; in real-time mode don't hold packets past the latency budget
+        if len(pending) >= chunk or (realtime and time.perf_counter() >= deadline):
+            flagged += _count_flagged(backend.process_records(pending))
+            packets += len(pending)
+            pending = []
+    if pending:
+        flagged += _count_flagged(backend.process_records(pending))
+        packets += len(pending)
+    elapsed = time.perf_counter() - start
+    return {
+        "file": path,
+        "packets": packets,
+        "flagged": flagged,
+        "seconds": round(elapsed, 3),
+        "packets_per_sec": round(packets / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def _count_flagged(rows):
+    return sum(1 for row in rows if row["AI_Status"] != "✅ SAFE")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a pcap/pcapng capture through the Cyber-Rakshak detection pipeline.")
+    parser.add_argument("pcap", help="capture file to replay")
+    parser.add_argument("--realtime", action="store_true", help="keep the original packet spacing (default: as fast as possible)")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback multiplier for --realtime")
+    parser.add_argument("--events-dir", help="store the replayed events in this event store directory (default: not stored)")
+    args = parser.parse_args(argv)
+
+    print(f"▶️ Replaying {args.pcap} ({'real-time x%g' % args.speed if args.realtime else 'max speed'})...")
+    stats = run(args.pcap, realtime=args.realtime, speed=args.speed, events_dir=args.events_dir)
+    print(f"✅ {stats['packets']:,} packets in {stats['seconds']}s = {stats['packets_per_sec']:,} pkt/s "
+          f"({stats['flagged']:,} flagged)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import threading
+
+import config
+import metrics
+from capture import sample_rate
+from flows import is_local_address, TCP_SYN
+from sketches import DecayedCountMin, WindowedDistinct
+
+TCP_ACK = 0x10
+RULES = ("port_scan", "host_sweep", "syn_flood", "exfil", "arp_spoof")
+RULE_HITS = {name: metrics.REGISTRY.counter(f"rule_{name}_hits_total", f"Packets flagged by the {name} rule.")
+             for name in RULES}
+
+# --- 1. FAST-PATH RULES ---
+class RulesEngine:
+    """
+    Cheap signature/threshold checks that run before the Isolation Forest.
+
+    - port_scan / host_sweep: distinct ports probed on one host, and distinct
+      LAN hosts probed by one source, within `window` seconds (HyperLogLogs)
+    - syn_flood: decayed rate of bare SYNs towards one destination (count-min)
+    - exfil: decayed upload byte rate from one local device to the internet
+    - arp_spoof: an ARP sender claiming an IP the scan inventory binds to a
+      different MAC
+
+    All state is bounded: the sketches have a fixed size and the per-source
+    distinct counters are capped at max_sources per window. Packets a rule
+    fires on are reported as threats directly and never reach the model.
+    """
+
+    def __init__(self, window=10.0, scan_ports=64, scan_hosts=32, syn_rate=500.0, exfil_rate=1e6,
+                 max_sources=8192, watch_arp=True):
+        self.window = float(window)
+        self.scan_ports = scan_ports
+        self.scan_hosts = scan_hosts
+        self.syn_rate = syn_rate
+        self.exfil_rate = exfil_rate
+        self.watch_arp = watch_arp
+        self.ports = WindowedDistinct(window, max_keys=max_sources)   # (src, dst) -> distinct dport
+        self.hosts = WindowedDistinct(window, max_keys=max_sources)   # src -> distinct dst
+        self.syn = DecayedCountMin(tau=window)                        # dst -> bare SYNs
+        self.upload = DecayedCountMin(tau=window)                     # local src -> bytes to remote hosts
+        self.bindings = {}            # ip -> mac from the scan inventory
+        self._inventory_version = None
+        self._lock = threading.Lock()
+
+    def check(self, record):
+        """(rule, reason, offending ip) if a rule fires on this capture record, else None."""
+        ts, src, dst, sport, dport, proto, size, flags = record
+        weight = sample_rate(flags)   # a sampled record stands for 2**shift packets of distinct flows
+        tcp_flags = flags & 0xFF
+
+        syn_only = proto == "TCP" and tcp_flags & (TCP_SYN | TCP_ACK) == TCP_SYN
+        if syn_only or (proto == "UDP" and dport < 1024) or proto == "ICMP":
+            # Connection attempts only, so busy servers answering many clients don't count
+            ports = self.ports.add((src, dst), dport, ts) * weight
+            if ports >= self.scan_ports:
+                return "port_scan", f"Port scan: {src} probed ~{ports:,.0f} ports on {dst} in {self.window:g}s", src
+            # Sweeps only count inside the LAN: a browser reaches dozens of internet hosts in seconds
+            if is_local_address(dst):
+                hosts = self.hosts.add(src, dst, ts) * weight
+                if hosts >= self.scan_hosts:
+                    return "host_sweep", f"Host sweep: {src} probed ~{hosts:,.0f} LAN hosts in {self.window:g}s", src
+
+        if syn_only:
+            rate = self.syn.add(dst, ts, weight) / self.window
+            if rate >= self.syn_rate:
+                return "syn_flood", f"SYN flood → {dst}: ~{rate:,.0f} SYN/s", src
+
+        if is_local_address(src) and not is_local_address(dst):
+            rate = self.upload.add(src, ts, size * weight) / self.window
+            if rate >= self.exfil_rate:
+                return "exfil", f"Exfil burst: {src} uploading ~{rate / 1e6:,.1f} MB/s", dst
+        return None
+
+    def split(self, records):
+        """Partitions a batch into (records for the model, [(record, rule, reason, offender), ...])."""
+        clean, hits = [], []
+        with self._lock, metrics.STAGE_SECONDS.time("rules"):
+            check = self.check
+            for record in records:
+                hit = check(record)
+                if hit is None:
+                    clean.append(record)
+                else:
+                    rule, reason, offender = hit
+                    RULE_HITS[rule].inc()
+                    hits.append((record, rule, reason, offender))
+        return clean, hits
+
+    # --- 2. ARP SPOOFING ---
+    def sync_inventory(self, inventory):
+        """Reloads IP -> MAC bindings when the scanner's inventory changes."""
+        if inventory is None or inventory.version == self._inventory_version:
+            return
+        self.bindings = {ip: mac.lower() for ip, mac in inventory.known_hosts()}
+        self._inventory_version = inventory.version
+
+    def check_arp(self, events):
+        """[(ts, ip, mac), ...] from capture.drain_arp() -> [(ts, ip, mac, reason), ...] conflicts."""
+        conflicts = []
+        if not self.watch_arp:
+            return conflicts
+        for ts, ip, mac in events:
+            known = self.bindings.get(ip)
+            if known and mac and known != mac and ip != "0.0.0.0":
+                RULE_HITS["arp_spoof"].inc()
+                conflicts.append((ts, ip, mac, f"ARP spoof: {mac} claims {ip} (inventory: {known})"))
+        return conflicts
+
+    def stats(self):
+        return {
+            "sources_tracked": len(self.ports),
+            "sources_overflowed": self.ports.overflowed,
+            "bindings": len(self.bindings),
+            "hits": {name: RULE_HITS[name].value for name in RULES},
+        }
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RulesEngine(window=config.RULE_WINDOW, scan_ports=config.RULE_SCAN_PORTS,
+                                  scan_hosts=config.RULE_SCAN_HOSTS, syn_rate=config.RULE_SYN_RATE,
+                                  exfil_rate=config.RULE_EXFIL_RATE, max_sources=config.RULE_MAX_SOURCES,
+                                  watch_arp=config.RULE_ARP)
+    return _engine
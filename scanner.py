@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import socket
+import threading
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+try:
+    from scapy.all import ARP, Ether, srp
+    SCAPY_AVAILABLE = True
+except ImportError:
+    SCAPY_AVAILABLE = False
+
+def get_local_ip():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(('10.255.255.255', 1))
+        IP = s.getsockname()[0]
+    except Exception:
+        IP = "127.0.0.1"
+    finally:
+        s.close()
+    return IP
+
+def configured_subnets():
+    """RAKSHAK_SCAN_SUBNETS (comma separated CIDRs), defaulting to this host's /24."""
+    if config.SCAN_SUBNETS:
+        return [ipaddress.ip_network(s.strip(), strict=False) for s in config.SCAN_SUBNETS.split(",") if s.strip()]
+    return [ipaddress.ip_network(get_local_ip() + "/24", strict=False)]
+
+def split_subnet(net, prefix=24):
+    """Big ranges are swept as /24 chunks so they can run in parallel."""
+    if net.prefixlen >= prefix:
+        return [net]
+    return list(net.subnets(new_prefix=prefix))
+
+# --- 1. PERSISTENT INVENTORY ---
+class DeviceInventory:
+    """MAC-keyed device table with first/last seen times, persisted as JSON."""
+
+    def __init__(self, path, online_window=300.0):
+        self.path = path
+        self.online_window = online_window
+        self.devices = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.version = 0         # bumped when an IP/MAC binding changes, so consumers can cache
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self.devices = {d["MAC"]: d for d in json.load(f)}
+        except (OSError, ValueError, KeyError):
+            self.devices = {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = list(self.devices.values())
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def observe(self, ip, mac, seen=None):
+        """Merge one ARP answer. Returns True for a device we have never seen before."""
+        seen = seen or time.time()
+        mac = mac.lower()
+        with self._lock:
+            device = self.devices.get(mac)
+            is_new = device is None
+            if is_new:
+                device = self.devices[mac] = {"IP": ip, "MAC": mac, "Type": "Unknown Device", "First_Seen": seen}
+            if is_new or device["IP"] != ip:
+                self.version += 1
+            device["IP"] = ip
+            device["Last_Seen"] = seen
+            self._dirty = True
+        return is_new
+
+    def snapshot(self):
+        """Devices for the dashboard, newest activity first, with live/offline status."""
+        now = time.time()
+        with self._lock:
+            devices = [dict(d) for d in self.devices.values()]
+        for d in devices:
+            d["Status"] = "🟢 ONLINE" if now - d.get("Last_Seen", 0) <= self.online_window else "⚫ OFFLINE"
+        devices.sort(key=lambda d: d.get("Last_Seen", 0), reverse=True)
+        return devices
+
+    def known_hosts(self):
+        with self._lock:
+            return [(d["IP"], d["MAC"]) for d in self.devices.values()]
+
+    def __len__(self):
+        return len(self.devices)
+
+# --- 2. SCANNER ---
+class NetworkScanner:
+    """
+    Background ARP scanner.
+
+    Every sweep_interval it sweeps all configured subnets, split into /24
+    chunks probed concurrently. In between it only re-probes known hosts
+    with unicast ARP (one packet each), which is enough to keep last-seen
+    fresh without re-sweeping whole ranges.
+    """
+
+    def __init__(self, inventory, subnets, workers=32, timeout=1.0, sweep_interval=600.0, refresh_interval=60.0):
+        self.inventory = inventory
+        self.subnets = subnets
+        self.workers = workers
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.refresh_interval = refresh_interval
+        self.last_sweep = 0.0
+        self.last_sweep_seconds = None
+        self.sweeps = 0
+        self._sweep_now = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _probe(self, packets):
+        answered = srp(packets, timeout=self.timeout, verbose=False)[0]
+        now = time.time()
+        new = 0
+        for _, reply in answered:
+            new += self.inventory.observe(reply.psrc, reply.hwsrc, now)
+        return new
+
+    def sweep(self):
+        """Full concurrent sweep of every configured subnet. Returns the number of new devices."""
+        chunks = [c for net in self.subnets for c in split_subnet(net)]
+        start = time.monotonic()
+        broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(chunks)))) as pool:
+            results = pool.map(lambda net: self._safe_probe(broadcast / ARP(pdst=str(net))), chunks)
+            new = sum(results)
+        self.last_sweep = time.time()
+        self.last_sweep_seconds = round(time.monotonic() - start, 2)
+        self.sweeps += 1
+        self.inventory.save()
+        return new
+
+    def refresh(self):
+        """Targeted unicast ARP to devices we already know about."""
+        hosts = self.inventory.known_hosts()
+        if hosts:
+            self._safe_probe([Ether(dst=mac) / ARP(pdst=ip) for ip, mac in hosts])
+            self.inventory.save()
+
+    def _safe_probe(self, packets):
+        try:
+            return self._probe(packets)
+        except Exception:
+            return 0
+
+    def request_sweep(self):
+        self._sweep_now.set()
+
+    def start(self):
+        if self._thread is None and SCAPY_AVAILABLE:
+            self._thread = threading.Thread(target=self._run, name="rakshak-scanner", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        next_refresh = 0.0
+        while not self._stop_event.is_set():
+            if self._sweep_now.is_set() or time.time() - self.last_sweep >= self.sweep_interval:
+                self._sweep_now.clear()
+                self.sweep()
+                next_refresh = time.monotonic() + self.refresh_interval
+            elif time.monotonic() >= next_refresh:
+                self.refresh()
+                next_refresh = time.monotonic() + self.refresh_interval
+            self._sweep_now.wait(1.0)
+
+    def stop(self):
+        self._stop_event.set()
+        self._sweep_now.set()
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+def get_scanner():
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            inventory = DeviceInventory(config.INVENTORY_PATH, online_window=2 * config.SCAN_REFRESH_INTERVAL)
+            _scanner = NetworkScanner(inventory, configured_subnets(), workers=config.SCAN_WORKERS,
+                                      timeout=config.SCAN_TIMEOUT, sweep_interval=config.SCAN_SWEEP_INTERVAL,
+                                      refresh_interval=config.SCAN_REFRESH_INTERVAL).start()
+    return _scanner
+
+def current_scanner():
+    """The scanner if something already started it, without starting one."""
+    return _scanner
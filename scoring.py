@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+
+import metrics
+
+# --- BATCH SCORING STAGE ---
+class BatchScorer:
+    """
+    Collects feature rows and scores them with one vectorized model call.
+    A batch is cut when batch_size rows are queued or when the caller
+    flushes; the pipeline flushes once per capture drain, so no row waits
+    longer than one drain for its score.
+
+    Scores are IsolationForest.score_samples values (lower = more anomalous,
+    roughly -1..0). A row is flagged when its score falls below the model's
+    offset_, i.e. exactly where clf.predict() would return -1.
+
+    With a baselines.BaselineRegistry, each row is also scored against its
+    device's own recent behaviour, and that verdict wins once the device's
+    baseline is warm; the global model only covers devices still warming up.
+    """
+
+    def __init__(self, model_source, batch_size=512, safe_label="✅ SAFE", flag_label="⚠️ CHECK", baselines=None):
+        self.model_source = model_source   # callable returning the live model
+        self.baselines = baselines
+        self.batch_size = max(1, int(batch_size))
+        self.safe_label = safe_label
+        self.flag_label = flag_label
+        self._features = []
+        self._records = []
+        self._devices = []
+        self.batches = 0
+        self.scored = 0
+
+    def add(self, features, record, device=None):
+        """Queue one row (device: the local address it belongs to); returns the scored batch if this row filled it, else []."""
+        self._features.append(features)
+        self._records.append(record)
+        self._devices.append(device)
+        if len(self._records) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        if not self._records:
+            return []
+        records, features, devices = self._records, self._features, self._devices
+        self._records, self._features, self._devices = [], [], []
+
+        # Take one reference per batch so a model swap never splits a batch
+        model = self.model_source()
+        X = np.asarray(features, dtype=np.float64)
+        with metrics.STAGE_SECONDS.time("inference"):
+            scores = model.score_samples(X)
+        metrics.INFERENCE_BATCHES.inc()
+        threshold = float(model.offset_)
+        if self.baselines is not None and any(device is not None for device in devices):
+            baseline_scores = self.baselines.score(devices, X).tolist()
+        else:
+            baseline_scores = [None] * len(records)
+        for record, score, baseline in zip(records, scores.tolist(), baseline_scores):
+            self.label(record, score, threshold, baseline)
+
+        self.batches += 1
+        self.scored += len(records)
+        return records
+
+    def label(self, record, score, threshold, baseline=None):
+        """Fills in a row's score fields and verdict (baseline is None / NaN while the device warms up)."""
+        record["Anomaly_Score"] = round(score, 4)
+        record["Threshold"] = round(threshold, 4)
+        if baseline is None or math.isnan(baseline):
+            flagged = score < threshold
+        else:
+            record["Baseline_Score"] = round(baseline, 3)
+            flagged = baseline >= self.baselines.threshold
+            if flagged:
+                record["Alert"] = "Unusual for this device"
+        record["AI_Status"] = self.flag_label if flagged else self.safe_label
+
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,260 @@
+import os
+import threading
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+import config
+from flows import FlowTable, FEATURE_NAMES, flow_key, is_local_address
+
+# --- 1. SHARED RECORD LAYOUT ---
+# Capture records are copied into fixed-width slots of a shared-memory ring
+# (one per worker); only (start, count) descriptors go over the pipes. The
+# worker writes each packet's score back into the same slot.
+PROTOCOLS = ["TCP", "UDP", "ICMP", "IP"]
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOLS)}
+
+RECORD_DTYPE = np.dtype([
+    ("ts", "f8"),
+    ("src", "S39"),     # textual address, long enough for any IPv6 address
+    ("dst", "S39"),
+    ("sport", "u2"),
+    ("dport", "u2"),
+    ("proto", "u1"),
+    ("flags", "u1"),
+    ("size", "u4"),
+    ("score", "f4"),    # filled in by the worker
+    ("baseline", "f4"), # the device baseline's score, NaN while it warms up
+])
+
+def pack_records(records, out):
+    """Writes capture record tuples into a slice of the shared ring."""
+    out["ts"] = [r[0] for r in records]
+    out["src"] = [r[1] for r in records]
+    out["dst"] = [r[2] for r in records]
+    out["sport"] = [r[3] for r in records]
+    out["dport"] = [r[4] for r in records]
+    out["proto"] = [PROTOCOL_CODES.get(r[5], PROTOCOL_CODES["IP"]) for r in records]
+    out["flags"] = [r[7] & 0xFF for r in records]
+    out["size"] = [r[6] for r in records]
+
+def unpack_records(slots):
+    return [(ts, src.decode(), dst.decode(), sport, dport, PROTOCOLS[proto], size, flags)
+            for ts, src, dst, sport, dport, proto, flags, size, _, _ in slots.tolist()]
+
+# --- 2. WORKER PROCESS ---
+def _worker_main(shm_name, ring_size, conn, index=0):
+    """
+    Owns one shard: its own FlowTable and its own copy of the model.
+    Batches arrive in order and are answered in order, so packets of a flow
+    (always the same shard) are processed in capture order.
+
+    Device baselines are per shard too: flows are spread by hash, so each
+    shard learns every device from its own sample of that device's flows.
+    """
+    import baselines
+    from model_store import ModelStore
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((ring_size,), dtype=RECORD_DTYPE, buffer=shm.buf)
+    table = FlowTable(window=config.FLOW_WINDOW, idle_timeout=config.FLOW_IDLE_TIMEOUT,
+                      max_flows=max(1024, config.FLOW_MAX // max(1, config.SCORE_WORKERS)))
+    store = ModelStore(config.MODEL_PATH, check_interval=config.MODEL_CHECK_INTERVAL)
+    registry = None
+    if config.BASELINES_ENABLED:
+        registry = baselines.new_registry(os.path.join(config.BASELINE_DIR, f"shard-{index}"))
+    features = np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+    slots = None
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            start, count = message
+            slots = ring[start:start + count]
+            if len(features) < count:
+                features = np.empty((count, len(FEATURE_NAMES)), dtype=np.float64)
+            devices = []
+            for k, (ts, src, dst, sport, dport, proto, size, flags) in enumerate(unpack_records(slots)):
+                slot = table.update(ts, flow_key(src, dst, sport, dport, proto), size, flags,
+                                    upload=is_local_address(src))
+                features[k] = table.features(slot)
+                devices.append(baselines.device_of(src, dst))
+            model = store.get()
+            slots["score"] = model.score_samples(features[:count])
+            slots["baseline"] = registry.score(devices, features[:count]) if registry is not None else np.nan
+            conn.send((start, count, float(model.offset_)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if registry is not None:
+            registry.save_all()
+        del ring, slots
+        shm.close()
+
+# --- 3. DISPATCHER ---
+class ShardFailed(RuntimeError):
+    """A worker died mid-batch; it has been restarted, but this batch was not scored."""
+
+class Shard:
+    def __init__(self, ctx, ring_size, index=0):
+        self.ring_size = ring_size
+        self.shm = shared_memory.SharedMemory(create=True, size=ring_size * RECORD_DTYPE.itemsize)
+        self.ring = np.ndarray((ring_size,), dtype=RECORD_DTYPE, buffer=self.shm.buf)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(self.shm.name, ring_size, child_conn, index),
+                                   name="rakshak-shard", daemon=True)
+        self.head = 0          # next slot to write
+        self.in_flight = 0     # slots written but not answered yet
+        self.sent = deque()    # (input positions, original record tuples) of each outstanding batch, in send order
+
+    def free(self):
+        return self.ring_size - self.in_flight
+
+    def close(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+        self.conn.close()
+        del self.ring
+        self.shm.close()
+        self.shm.unlink()
+
+class ShardedPipeline:
+    """
+    Fans capture records out to worker processes by flow hash.
+
+    Both directions of a conversation hash to the same shard (flow_key is
+    direction independent), so each worker sees complete flows and no flow
+    state is shared. process() hands out every shard's batch first and then
+    collects, so all workers score in parallel. A worker that dies is
+    replaced with a fresh one (empty flow state) and the batch it held
+    fails with ShardFailed.
+    """
+
+    def __init__(self, workers, ring_size=65536):
+        self.workers = max(1, int(workers))
+        self.ring_size = max(1024, int(ring_size))
+        self.shards = []
+        self._lock = threading.Lock()
+        self._ctx = None
+        self.stats = {"batches": 0, "records": 0, "restarts": 0}
+
+    def start(self):
+        # spawn: forking a process that already runs capture threads is unsafe
+        self._ctx = mp.get_context("spawn")
+        self.shards = [Shard(self._ctx, self.ring_size, i) for i in range(self.workers)]
+        for shard in self.shards:
+            shard.process.start()
+        return self
+
+    def _restart(self, i):
+        """Replaces shard i (and its ring, so no half-written slots or stale replies survive)."""
+        old = self.shards[i]
+        print(f"⚠️ Scoring shard {i} {'stopped responding' if old.process.is_alive() else 'died'} "
+              f"(exit code {old.process.exitcode}); restarting it.")
+        old.close()
+        shard = self.shards[i] = Shard(self._ctx, self.ring_size, i)
+        shard.process.start()
+        self.stats["restarts"] += 1
+
+    def shard_of(self, record):
+        _, src, dst, sport, dport, proto, _, _ = record
+        return hash(flow_key(src, dst, sport, dport, proto)) % self.workers
+
+    def _send(self, shard, records, indices):
+        """Copies records (from input positions `indices`) into the shard's ring, splitting at the wrap point, and queues them."""
+        sent = []
+        pos = 0
+        while pos < len(records):
+            if shard.head == shard.ring_size:
+                shard.head = 0
+            count = min(len(records) - pos, shard.ring_size - shard.head)
+            start = shard.head
+            batch = records[pos:pos + count]
+            pack_records(batch, shard.ring[start:start + count])
+            shard.sent.append((indices[pos:pos + count], batch))
+            shard.conn.send((start, count))
+            shard.head += count
+            shard.in_flight += count
+            sent.append((start, count))
+            pos += count
+        return sent
+
+    def _receive(self, shard):
+        start, count, threshold = shard.conn.recv()
+        indices, records = shard.sent.popleft()   # replies come back in send order
+        scores = shard.ring["score"][start:start + count].astype(np.float64).tolist()
+        baseline_scores = shard.ring["baseline"][start:start + count].astype(np.float64).tolist()
+        shard.in_flight -= count
+        return indices, (records, scores, [threshold] * count, baseline_scores)
+
+    def process(self, records):
+        """
+        Scores a batch across all shards. Returns (records, scores,
+        thresholds, baseline scores) in the order the records came in.
+        """
+        if not records:
+            return ([], [], [], [])
+        out = tuple([None] * len(records) for _ in range(4))
+        with self._lock:
+            groups = [[] for _ in self.shards]
+            for k, record in enumerate(records):
+                groups[self.shard_of(record)].append(k)
+
+            pending = {}   # conn -> outstanding replies
+            failed = set()
+            for i, group in enumerate(groups):
+                shard = self.shards[i]
+                # Chunks no bigger than half the ring, so a batch never waits on itself
+                step = self.ring_size // 2
+                try:
+                    for pos in range(0, len(group), step):
+                        indices = group[pos:pos + step]
+                        while shard.free() < len(indices):
+                            self._collect_one(shard, out)
+                            pending[shard.conn] -= 1
+                        chunk = [records[k] for k in indices]
+                        pending[shard.conn] = pending.get(shard.conn, 0) + len(self._send(shard, chunk, indices))
+                except (EOFError, OSError):
+                    failed.add(i)
+                    pending[shard.conn] = 0
+
+            # The healthy shards are always drained, so none is left holding replies to this batch
+            conns = {shard.conn: i for i, shard in enumerate(self.shards)}
+            while any(pending.values()):
+                for conn in wait([c for c, n in pending.items() if n]):
+                    try:
+                        self._collect_one(self.shards[conns[conn]], out)
+                        pending[conn] -= 1
+                    except (EOFError, OSError):
+                        failed.add(conns[conn])
+                        pending[conn] = 0
+
+            if failed:
+                for i in sorted(failed):
+                    self._restart(i)
+                raise ShardFailed(f"scoring shard(s) {sorted(failed)} failed; batch of {len(records)} not scored")
+            self.stats["batches"] += 1
+            self.stats["records"] += len(records)
+        return out
+
+    def _collect_one(self, shard, out):
+        indices, columns = self._receive(shard)
+        for column, values in zip(out, columns):
+            for k, value in zip(indices, values):
+                column[k] = value
+
+    def stop(self):
+        for shard in self.shards:
+            try:
+                shard.conn.send(None)
+            except OSError:
+                pass
+        for shard in self.shards:
+            shard.process.join(timeout=5)
+            shard.close()
+        self.shards = []
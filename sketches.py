@@ -0,0 +1,278 @@
+import math
+import heapq
+from array import array
+
+import numpy as np
+
+# --- 1. HASHING ---
+_MASK64 = (1 << 64) - 1
+
+def mix64(x):
+    """splitmix64 finalizer: spreads Python's hash() over all 64 bits so sketch indexes are independent."""
+    x &= _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+# --- 2. TIME-DECAYED COUNT-MIN ---
+class DecayedCountMin:
+    """
+    Count-min sketch whose counts decay exponentially with time constant
+    `tau` seconds, so estimate(key) / tau is a sliding-window rate.
+
+    Uses forward decay: an update at time t adds amount * e^((t - landmark)/tau)
+    and queries divide by the same factor for "now", so nothing is rescaled
+    per update. The table is renormalized only when the factor grows large.
+    Memory is depth x width doubles no matter how many keys are seen, and
+    estimates never undercount (conservative update keeps overcounting low).
+    """
+
+    def __init__(self, width=2048, depth=4, tau=10.0):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.width = width
+        self.depth = depth
+        self.bits = width.bit_length() - 1
+        if self.bits * depth > 64:
+            raise ValueError("width x depth needs more than 64 hash bits")
+        self.tau = float(tau)
+        self.rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+        self.landmark = None
+
+    def _indexes(self, key):
+        h = mix64(hash(key))
+        mask = self.width - 1
+        return [(h >> (self.bits * i)) & mask for i in range(self.depth)]
+
+    def _factor(self, ts):
+        if self.landmark is None or ts < self.landmark - self.tau * 10:
+            self.clear(ts)   # first use, or time jumped backwards (a new replay)
+        exponent = (ts - self.landmark) / self.tau
+        if exponent > 50:
+            scale = math.exp(-exponent)
+            for row in self.rows:
+                np.frombuffer(row, dtype=np.float64)[:] *= scale
+            self.landmark = ts
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def add(self, key, ts, amount=1.0):
+        """Adds amount at time ts and returns the key's decayed count afterwards."""
+        landmark = self.landmark
+        if landmark is not None and landmark - self.tau * 10 <= ts <= landmark + self.tau * 50:
+            factor = math.exp((ts - landmark) / self.tau)
+        else:
+            factor = self._factor(ts)
+        h = mix64(hash(key))
+        mask, bits = self.width - 1, self.bits
+        cells = []
+        current = math.inf
+        for row in self.rows:
+            i = h & mask
+            h >>= bits
+            value = row[i]
+            if value < current:
+                current = value
+            cells.append((row, i, value))
+        target = current + amount * factor
+        # Conservative update: raise only the cells that are below the new minimum
+        for row, i, value in cells:
+            if value < target:
+                row[i] = target
+        return target / factor
+
+    def estimate(self, key, ts):
+        factor = self._factor(ts)
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key))) / factor
+
+    def clear(self, ts=None):
+        for row in self.rows:
+            np.frombuffer(row, dtype=np.float64)[:] = 0.0
+        self.landmark = ts
+
+# --- 3. HYPERLOGLOG ---
+class HyperLogLog:
+    """
+    Distinct counter in 2**p one-byte registers (p=6: 64 bytes, ~13% error).
+    The estimate is maintained incrementally, so count() is O(1); registers
+    only change a handful of times per doubling of the distinct count.
+    """
+
+    __slots__ = ("p", "m", "registers", "_inv_sum", "_zeros", "_alpha")
+
+    def __init__(self, p=6):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._inv_sum = float(self.m)   # sum of 2^-register
+        self._zeros = self.m
+        self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(self.m, 0.7213 / (1 + 1.079 / self.m))
+
+    def add_hash(self, h):
+        """Adds a 64-bit (mixed) hash. Returns True if the estimate changed."""
+        idx = h & (self.m - 1)
+        rank = (64 - self.p) - (h >> self.p).bit_length() + 1
+        old = self.registers[idx]
+        if rank <= old:
+            return False
+        self.registers[idx] = rank
+        self._inv_sum += 2.0 ** -rank - 2.0 ** -old
+        if old == 0:
+            self._zeros -= 1
+        return True
+
+    def add(self, item):
+        return self.add_hash(mix64(hash(item)))
+
+    def count(self):
+        m = self.m
+        estimate = self._alpha * m * m / self._inv_sum
+        if estimate <= 2.5 * m and self._zeros:
+            return m * math.log(m / self._zeros)   # linear counting for small sets
+        return estimate
+
+    def merge(self, other):
+        for i, value in enumerate(other.registers):
+            if value > self.registers[i]:
+                self.registers[i] = value
+        self._inv_sum = sum(2.0 ** -r for r in self.registers)
+        self._zeros = self.registers.count(0)
+
+class WindowedDistinct:
+    """
+    Per-key HyperLogLogs over a tumbling window of `window` seconds.
+
+    Keys are bounded by max_keys per window; once the window is full, new
+    keys are ignored until the next rotation. The previous window is kept,
+    and count() returns the larger of the two, so a burst spanning a window
+    boundary is not forgotten.
+    """
+
+    def __init__(self, window=10.0, max_keys=8192, p=6):
+        self.window = float(window)
+        self.max_keys = int(max_keys)
+        self.p = p
+        self.current = {}
+        self.previous = {}
+        self.window_end = None
+        self.overflowed = 0
+
+    def _rotate(self, ts):
+        if self.window_end is None or ts < self.window_end - 2 * self.window:
+            self.previous, self.current = {}, {}
+            self.window_end = ts + self.window
+        elif ts >= self.window_end:
+            # A gap longer than a window leaves nothing worth keeping
+            self.previous = self.current if ts < self.window_end + self.window else {}
+            self.current = {}
+            self.window_end = ts + self.window
+
+    def add(self, key, item, ts):
+        """Adds item to key's set and returns key's distinct estimate."""
+        if self.window_end is None or ts >= self.window_end or ts < self.window_end - 2 * self.window:
+            self._rotate(ts)
+        hll = self.current.get(key)
+        if hll is None:
+            if len(self.current) >= self.max_keys:
+                self.overflowed += 1
+                return self.count(key)
+            hll = self.current[key] = HyperLogLog(self.p)
+        hll.add(item)
+        return self.count(key)
+
+    def count(self, key):
+        current = self.current.get(key)
+        previous = self.previous.get(key)
+        return max(current.count() if current else 0.0, previous.count() if previous else 0.0)
+
+    def __len__(self):
+        return len(self.current)
+
+# --- 4. HEAVY HITTERS ---
+class DecayedSpaceSaving:
+    """
+    Space-saving top-k over a time-decayed stream: at most `capacity` keys
+    are tracked, and a new key takes over the smallest entry (inheriting
+    its count as the error bound). Any key with a true share above
+    1/capacity of the decayed total is guaranteed to be tracked.
+
+    Weights use the same forward decay as DecayedCountMin (time constant
+    `tau`), so counts approximate the traffic of the last ~tau seconds.
+    The minimum is found with a lazily cleaned heap: O(log k) per update.
+    """
+
+    def __init__(self, capacity=256, tau=60.0):
+        self.capacity = max(1, int(capacity))
+        self.tau = float(tau)
+        self.counts = {}    # key -> [count, error] in landmark units
+        self._heap = []     # (count, key); entries are stale once the key's count moved on
+        self.total = 0.0
+        self.landmark = None
+
+    def _factor(self, ts):
+        if self.landmark is None or ts < self.landmark - self.tau * 10:
+            self.clear(ts)
+        exponent = (ts - self.landmark) / self.tau
+        if exponent > 50:
+            scale = math.exp(-exponent)
+            for entry in self.counts.values():
+                entry[0] *= scale
+                entry[1] *= scale
+            self.total *= scale
+            self._rebuild()
+            self.landmark = ts
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def _rebuild(self):
+        self._heap = [(entry[0], key) for key, entry in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, key, amount, ts):
+        weight = amount * self._factor(ts)
+        self.total += weight
+        counts = self.counts
+        entry = counts.get(key)
+        if entry is not None:
+            entry[0] += weight
+        elif len(counts) < self.capacity:
+            entry = counts[key] = [weight, 0.0]
+        else:
+            heap = self._heap
+            while True:
+                count, victim = heapq.heappop(heap)
+                current = counts.get(victim)
+                if current is not None and current[0] == count:
+                    break
+            del counts[victim]
+            entry = counts[key] = [count + weight, count]
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.capacity + 64:
+            self._rebuild()
+
+    def _query_factor(self, ts):
+        # Clamped: a query long after the last update must not overflow, and
+        # one before the landmark (clock stepped back) must not inflate counts
+        return math.exp(min(max((ts - self.landmark) / self.tau, 0.0), 700.0))
+
+    def top(self, n, ts):
+        """[(key, decayed count, error bound), ...] for the n largest keys as of time ts."""
+        if self.landmark is None:
+            return []
+        factor = self._query_factor(ts)
+        ranked = heapq.nlargest(n, self.counts.items(), key=lambda item: item[1][0])
+        return [(key, count / factor, error / factor) for key, (count, error) in ranked]
+
+    def decayed_total(self, ts):
+        if self.landmark is None:
+            return 0.0
+        return self.total / self._query_factor(ts)
+
+    def clear(self, ts=None):
+        self.counts = {}
+        self._heap = []
+        self.total = 0.0
+        self.landmark = ts
+
+    def __len__(self):
+        return len(self.counts)
@@ -0,0 +1,99 @@
+import time
+import threading
+
+import config
+from capture import sample_rate
+from sketches import DecayedSpaceSaving
+
+# --- 1. WINDOWS & DIMENSIONS ---
+WINDOWS = {"1m": 60.0, "15m": 900.0, "1h": 3600.0}   # decay time constants
+DIMENSIONS = ("source", "destination", "device", "protocol")
+
+# --- 2. TOP TALKERS ---
+class TopTalkers:
+    """
+    Bytes moved per source IP, destination IP, device and protocol over
+    decayed 1 min / 15 min / 1 h windows, one space-saving summary each
+    (so memory is capped at capacity keys per dimension and window).
+
+    observe() folds a processed batch in: the batch is summed per key
+    first, so the summaries see one update per distinct key, not per packet.
+    """
+
+    def __init__(self, capacity=256, windows=WINDOWS, live=True):
+        self.windows = dict(windows)
+        self.summaries = {(dim, name): DecayedSpaceSaving(capacity, tau)
+                          for dim in DIMENSIONS for name, tau in self.windows.items()}
+        self.last_ts = None
+        self.live = live   # False while a capture file is replayed (see now())
+        self._lock = threading.Lock()
+
+    def observe(self, records, rows):
+        """records: capture tuples of the batch; rows: the dashboard rows built from them (any order)."""
+        sums = {dim: {} for dim in DIMENSIONS}
+        source, destination, protocol = sums["source"], sums["destination"], sums["protocol"]
+        latest = None
+        for ts, src, dst, sport, dport, proto, size, flags in records:
+            nbytes = size * sample_rate(flags)
+            source[src] = source.get(src, 0) + nbytes
+            destination[dst] = destination.get(dst, 0) + nbytes
+            protocol[proto] = protocol.get(proto, 0) + nbytes
+            if latest is None or ts > latest:
+                latest = ts
+        device = sums["device"]
+        for row in rows:
+            nbytes = (row.get("Size_KB") or 0) * (row.get("Sample_Rate") or 1)
+            if nbytes:
+                device[row["Device"]] = device.get(row["Device"], 0) + nbytes
+        if latest is None:
+            return
+        with self._lock:
+            # One timestamp per batch; batches span well under a second
+            self.last_ts = latest if self.last_ts is None else max(latest, self.last_ts)
+            for (dim, _), summary in self.summaries.items():
+                add = summary.add
+                for key, nbytes in sums[dim].items():
+                    add(key, nbytes, latest)
+
+    def now(self):
+        """
+        Query time: the wall clock for live capture, so talkers keep decaying
+        through quiet spells; the last packet's time for a replayed capture
+        (whose timestamps lie in the past).
+        """
+        if self.live or self.last_ts is None:
+            return time.time()
+        return self.last_ts
+
+    def top(self, dimension="device", window="1m", n=10):
+        """
+        {"window", "dimension", "bytes_per_s", "top": [(key, bytes, bytes_per_s, error), ...]}
+        bytes are decayed totals (roughly the last `window` of traffic);
+        error bounds how much of a key's count may belong to evicted keys.
+        """
+        tau = self.windows[window]
+        with self._lock:
+            summary = self.summaries[(dimension, window)]
+            ts = self.now()
+            ranked = summary.top(n, ts)
+            total = summary.decayed_total(ts)
+        return {
+            "window": window,
+            "dimension": dimension,
+            "bytes_per_s": total / tau,
+            "top": [(key, count, count / tau, error) for key, count, error in ranked],
+        }
+
+    def stats(self):
+        with self._lock:
+            return {f"{dim}/{name}": len(summary) for (dim, name), summary in self.summaries.items()}
+
+_talkers = None
+_talkers_lock = threading.Lock()
+
+def get_talkers():
+    global _talkers
+    with _talkers_lock:
+        if _talkers is None:
+            _talkers = TopTalkers(capacity=config.TALKERS_CAPACITY)
+    return _talkers
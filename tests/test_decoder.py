@@ -0,0 +1,81 @@
+"""The header decoder must read every link type and IP shape the capture loop sees, and give up cleanly on garbage."""
+import struct
+
+import pytest
+from scapy.layers.dns import DNS, DNSQR, DNSRR
+from scapy.layers.inet import ICMP, IP, TCP, UDP
+from scapy.layers.inet6 import IPv6, IPv6ExtHdrDestOpt, IPv6ExtHdrFragment, IPv6ExtHdrHopByHop, IPv6ExtHdrRouting
+from scapy.layers.l2 import CookedLinux, Dot1Q, Ether
+
+from decoder import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_RAW, decode_dns, decode_frame
+
+TS = 1000.0
+SRC, DST = "192.168.1.23", "203.0.113.9"
+SRC6, DST6 = "fd00::23", "2001:db8::9"
+
+def _tcp():
+    return IP(src=SRC, dst=DST) / TCP(sport=40000, dport=443, flags="PA") / (b"x" * 20)
+
+@pytest.mark.parametrize("linktype, frame", [
+    (LINKTYPE_ETHERNET, Ether() / _tcp()),
+    (LINKTYPE_ETHERNET, Ether() / Dot1Q(vlan=10) / _tcp()),
+    (LINKTYPE_ETHERNET, Ether(type=0x88A8) / Dot1Q(vlan=100) / Dot1Q(vlan=10) / _tcp()),
+    (LINKTYPE_LINUX_SLL, CookedLinux(proto=0x0800) / _tcp()),
+    (LINKTYPE_RAW, _tcp()),
+])
+def test_link_types(linktype, frame):
+    raw = bytes(frame)
+    assert decode_frame(raw, TS, linktype) == (TS, SRC, DST, 40000, 443, "TCP", len(raw), 0x18)
+
+def test_udp_and_icmp():
+    udp = bytes(Ether() / IP(src=SRC, dst=DST) / UDP(sport=5353, dport=53))
+    icmp = bytes(Ether() / IP(src=SRC, dst=DST) / ICMP())
+    assert decode_frame(udp, TS) == (TS, SRC, DST, 5353, 53, "UDP", len(udp), 0)
+    assert decode_frame(icmp, TS) == (TS, SRC, DST, 0, 0, "ICMP", len(icmp), 0)
+
+def test_ipv6_extension_headers():
+    chain = IPv6ExtHdrHopByHop() / IPv6ExtHdrRouting() / IPv6ExtHdrDestOpt()
+    raw = bytes(Ether() / IPv6(src=SRC6, dst=DST6) / chain / UDP(sport=5000, dport=53))
+    assert decode_frame(raw, TS) == (TS, SRC6, DST6, 5000, 53, "UDP", len(raw), 0)
+    first = bytes(IPv6(src=SRC6, dst=DST6) / IPv6ExtHdrFragment(offset=0, m=1) / TCP(sport=1, dport=2, flags="S"))
+    assert decode_frame(first, TS, LINKTYPE_RAW) == (TS, SRC6, DST6, 1, 2, "TCP", len(first), 0x02)
+
+def test_non_first_fragments_have_no_ports():
+    v4 = bytes(IP(src=SRC, dst=DST, frag=185, proto=6) / (b"x" * 40))
+    v6 = bytes(IPv6(src=SRC6, dst=DST6) / IPv6ExtHdrFragment(offset=185, nh=6) / (b"x" * 40))
+    assert decode_frame(v4, TS, LINKTYPE_RAW) == (TS, SRC, DST, 0, 0, "IP", len(v4), 0)
+    assert decode_frame(v6, TS, LINKTYPE_RAW) == (TS, SRC6, DST6, 0, 0, "IP", len(v6), 0)
+
+@pytest.mark.parametrize("linktype, frame", [
+    (LINKTYPE_ETHERNET, bytes(Ether() / _tcp())[:13]),
+    (LINKTYPE_ETHERNET, bytes(Ether() / _tcp())[:30]),
+    (LINKTYPE_ETHERNET, bytes(Ether() / IPv6(src=SRC6, dst=DST6))[:50]),
+    (LINKTYPE_LINUX_SLL, bytes(CookedLinux(proto=0x0800) / _tcp())[:15]),
+    (LINKTYPE_RAW, b""),
+    (LINKTYPE_ETHERNET, bytes(Ether() / IP(src=SRC, dst=DST, ihl=2) / TCP())),   # IHL below the fixed header
+    (LINKTYPE_RAW, b"\x50" + bytes(_tcp())[1:]),   # neither IPv4 nor IPv6
+    (LINKTYPE_ETHERNET, bytes(Ether(type=0x0806) / (b"\x00" * 28))),
+])
+def test_undecodable_frames(linktype, frame):
+    assert decode_frame(frame, TS, linktype) is None
+
+def _dns_response(**dns):
+    return bytes(Ether() / IP(src=DST, dst=SRC) / UDP(sport=53, dport=40000) / DNS(**dns))
+
+def test_dns_answers():
+    raw = _dns_response(qr=1, qd=DNSQR(qname="Example.COM"),
+                        an=[DNSRR(rrname="example.com", rdata="198.51.100.7"), DNSRR(rrname="example.com", rdata="198.51.100.8")])
+    assert decode_dns(raw, TS) == (TS, SRC, DST, "example.com", ["198.51.100.7", "198.51.100.8"])
+
+def test_dns_pointer_loops_terminate():
+    header = struct.pack("!HHHHHH", 1, 0x8180, 1, 1, 0, 0)
+    # The question name is a pointer to itself (offset 12 from the DNS header)
+    looped = bytes(Ether() / IP(src=DST, dst=SRC) / UDP(sport=53, dport=40000) / (header + b"\xc0\x0c" + b"\x00\x01\x00\x01"))
+    assert decode_dns(looped, TS) is None
+    # A valid question followed by an answer whose name points at itself: the question still comes through
+    question = b"\x07example\x03com\x00\x00\x01\x00\x01"
+    answer = b"\xc0\x1d" + struct.pack("!HHIH", 1, 1, 60, 4) + bytes([198, 51, 100, 7])
+    body = header + question + answer
+    assert body.index(b"\xc0\x1d") == 0x1d
+    raw = bytes(Ether() / IP(src=DST, dst=SRC) / UDP(sport=53, dport=40000) / body)
+    assert decode_dns(raw, TS)[3] == "example.com"
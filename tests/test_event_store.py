@@ -0,0 +1,145 @@
+"""EventStore queries must return exactly what a brute-force filter over every appended row would."""
+import os
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+import event_store
+from event_store import EventStore
+
+LOCAL = [f"192.168.1.{i}" for i in range(2, 12)]
+REMOTE = [f"203.0.113.{i}" for i in range(1, 40)]
+
+def _rows(rng, count, start, span):
+    rows = []
+    for _ in range(count):
+        rows.append({
+            "Epoch": start + rng.random() * span,
+            "Local_IP": rng.choice(LOCAL),
+            "Remote_IP": rng.choice(REMOTE),
+            "Device": "Laptop",
+            "Protocol": rng.choice(["TCP", "UDP"]),
+            "AI_Status": rng.choice(["✅ SAFE", "⚠️ CHECK"]),
+            "Size_KB": 1.5,
+            "Anomaly_Score": -0.4,
+        })
+    return rows
+
+def _brute_force(rows, start, end, ip):
+    return sorted(row["Epoch"] for row in rows
+                  if start <= row["Epoch"] <= end and ip in (row["Local_IP"], row["Remote_IP"]))
+
+def _assert_queries(store, rows, rng, n=30):
+    lo = min(row["Epoch"] for row in rows)
+    hi = max(row["Epoch"] for row in rows)
+    for _ in range(n):
+        ip = rng.choice(LOCAL + REMOTE + ["198.51.100.7"])   # the last one never occurs
+        start = rng.uniform(lo - 10, hi)
+        end = rng.uniform(start, hi + 10)
+        df = store.query(start=start, end=end, ip=ip)
+        assert df["epoch"].tolist() == _brute_force(rows, start, end, ip)
+
+def test_flush_compact_query_matches_brute_force(tmp_path):
+    rng = random.Random(1)
+    store = EventStore(str(tmp_path), fanin=3, row_group_rows=16)
+    rows = []
+    for k in range(9):
+        # Every third batch overlaps the one before it in time
+        batch = _rows(rng, 200, 1000.0 + (k - (k % 3 == 2)) * 100, 100)
+        rows.extend(batch)
+        store.append(batch)
+        store.flush()
+        _assert_queries(store, rows, rng, n=5)
+    assert store.compact() == 4   # three level-0 merges, then one level-1 merge
+    assert [entry["level"] for entry in store.segments] == [2]
+    _assert_queries(store, rows, rng)
+    # Rows still in the buffer are visible too
+    late = _rows(rng, 50, 2000.0, 10)
+    rows.extend(late)
+    store.append(late)
+    _assert_queries(store, rows, rng)
+
+@pytest.mark.parametrize("overlap", [False, True])
+def test_compaction_keeps_time_order(tmp_path, overlap):
+    rng = random.Random(2)
+    store = EventStore(str(tmp_path), fanin=2, row_group_rows=32)
+    first, second = _rows(rng, 300, 0.0, 100), _rows(rng, 300, 50.0 if overlap else 100.0, 100)
+    for batch in (first, second):
+        store.append(batch)
+        store.flush()
+    assert store.compact() == 1
+    (entry,) = store.segments
+    assert entry["level"] == 1 and entry["rows"] == 600
+    epochs = store.query()["epoch"].to_numpy()
+    assert len(epochs) == 600 and (np.diff(epochs) >= 0).all()
+    _assert_queries(store, first + second, rng)
+
+def test_row_groups_past_63_share_the_last_mask_bit(tmp_path):
+    rng = random.Random(3)
+    store = EventStore(str(tmp_path), row_group_rows=10)
+    rows = _rows(rng, 1000, 0.0, 1000)
+    rows.sort(key=lambda row: row["Epoch"])
+    for k in (5, 70, 99):   # one address only in group 5, one only in groups 70 and 99
+        rows[k * 10]["Remote_IP"] = "198.51.100.1" if k == 5 else "198.51.100.2"
+    store.append(rows)
+    store.flush()
+    hashes, masks = store._ip_index[store.segments[0]["name"]]
+    mask = masks[np.searchsorted(hashes, event_store.ip_hashes(["198.51.100.2"])[0])]
+    assert int(mask) == 1 << 63
+    assert store.query(ip="198.51.100.1")["epoch"].tolist() == [rows[50]["Epoch"]]
+    assert store.query(ip="198.51.100.2")["epoch"].tolist() == [rows[700]["Epoch"], rows[990]["Epoch"]]
+    _assert_queries(store, rows, rng)
+
+def test_expire_drops_whole_segments(tmp_path):
+    rng = random.Random(4)
+    store = EventStore(str(tmp_path), retention=100.0)
+    old, straddling, new = _rows(rng, 50, 0.0, 50), _rows(rng, 50, 80.0, 50), _rows(rng, 50, 200.0, 50)
+    for batch in (old, straddling, new):
+        store.append(batch)
+        store.flush()
+    gone = store.segments[0]["name"]
+    assert store.expire(now=200.0) == 50   # cutoff 100: only the segment ending before it goes
+    assert len(store.segments) == 2
+    assert not os.path.exists(os.path.join(str(tmp_path), gone + ".parquet"))
+    assert sorted(store.query()["epoch"]) == sorted(row["Epoch"] for row in straddling + new)
+
+def test_reopen_cleans_up_crash_leftovers(tmp_path):
+    rng = random.Random(5)
+    directory = str(tmp_path)
+    store = EventStore(directory)
+    rows = _rows(rng, 100, 0.0, 100)
+    store.append(rows)
+    store.flush()
+    store.close()   # the writer exits, releasing the directory
+    # A segment written but never recorded in the manifest, and a half-written one
+    for name in ("L0-dead.parquet", "L0-dead.ips.npy", "L1-half.parquet.tmp"):
+        open(os.path.join(directory, name), "wb").close()
+    EventStore(directory, readonly=True)
+    assert os.path.exists(os.path.join(directory, "L0-dead.parquet"))   # readers never delete
+    reopened = EventStore(directory)
+    leftovers = {"L0-dead.parquet", "L0-dead.ips.npy", "L1-half.parquet.tmp"} & set(os.listdir(directory))
+    assert not leftovers
+    assert reopened.segments == store.segments
+    _assert_queries(reopened, rows, rng)
+
+def test_second_writer_is_refused_and_readers_follow(tmp_path):
+    if event_store.fcntl is None:
+        pytest.skip("no advisory file locks on this platform")
+    rng = random.Random(6)
+    directory = str(tmp_path)
+    writer = EventStore(directory)
+    first = _rows(rng, 100, 0.0, 100)
+    writer.append(first)
+    writer.flush()
+    with pytest.raises(event_store.StoreLocked):
+        EventStore(directory)
+    reader = EventStore(directory, readonly=True)
+    reader.append(_rows(rng, 10, 0.0, 10))   # ignored: readers never write
+    second = _rows(rng, 100, 100.0, 100)
+    writer.append(second)
+    writer.flush()
+    _assert_queries(reader, first + second, rng)
+    writer.close()
+    EventStore(directory).close()   # the lock goes with the writer
@@ -0,0 +1,144 @@
+"""Evidence ring extraction must return exactly the frames still in the ring, in order, as a readable pcapng."""
+import mmap
+import random
+import socket
+
+import pytest
+
+import evidence
+from decoder import LINKTYPE_RAW
+from evidence import EvidenceRing, synthetic_packet
+
+TARGET, OTHER, PEER = "192.168.1.23", "192.168.1.40", "203.0.113.9"
+CAPACITY, SLOTS = 256 * 1024, 64   # 4 KiB chunks
+
+def _frame(rng):
+    """A random frame; some carry the target's address only in their payload."""
+    src, dst = rng.choice([(TARGET, PEER), (PEER, TARGET), (OTHER, PEER), (PEER, OTHER)])
+    frame = synthetic_packet(src, dst, rng.randrange(1024, 65535), 443, rng.randrange(40, 1500))
+    if TARGET not in (src, dst) and rng.random() < 0.3:
+        frame = frame[:40] + socket.inet_aton(TARGET) + frame[44:]
+    return src, dst, frame
+
+def _fill(ring, rng, count, t0=1000.0):
+    """Writes `count` frames; returns [(ts, pos, stored bytes, src, dst)] in write order."""
+    written = []
+    for k in range(count):
+        src, dst, frame = _frame(rng)
+        ts = t0 + k * 0.01
+        ring.write(ts, frame)
+        stored = frame[:ring.snaplen]
+        written.append((ts, ring.pos - 16 - len(stored), stored, src, dst))
+    return written
+
+def _present(ring, written):
+    """The frames extraction may return: from the first indexed frame at or past the safety floor."""
+    floor = max(0, ring.pos - ring.capacity + ring.capacity // 16)
+    firsts = {}
+    for frame in written:
+        firsts.setdefault(frame[1] // ring.chunk, frame[1])
+    oldest = min(pos for pos in firsts.values() if pos >= floor)
+    return [frame for frame in written if frame[1] >= oldest]
+
+def _expected(frames, start=float("-inf"), end=float("inf")):
+    return [(ts, data) for ts, _, data, src, dst in frames if TARGET in (src, dst) and start <= ts <= end]
+
+def _assert_pcap(path, expected):
+    from scapy.utils import rdpcap
+    packets = rdpcap(path)
+    assert [bytes(pkt) for pkt in packets] == [data for _, data in expected]
+    assert [float(pkt.time) for pkt in packets] == pytest.approx([ts for ts, _ in expected], abs=2e-6)
+
+@pytest.fixture
+def ring(tmp_path):
+    ring = EvidenceRing(str(tmp_path / "eth0.ring"), capacity=CAPACITY, linktype=LINKTYPE_RAW, slots=SLOTS)
+    yield ring
+    ring.close()
+
+def test_extract_after_several_laps(ring, tmp_path):
+    pytest.importorskip("scapy")
+    written = _fill(ring, random.Random(1), 2000)
+    assert ring.pos // ring.capacity >= 5
+    result = evidence.extract([TARGET], directory=str(tmp_path), out_path=str(tmp_path / "out.pcapng"), max_age=0)
+    expected = _expected(_present(ring, written))
+    assert result["complete"] and result["packets"] == len(expected) > 0
+    _assert_pcap(result["path"], expected)
+
+def test_extract_time_window(ring, tmp_path):
+    pytest.importorskip("scapy")
+    present = _present(ring, _fill(ring, random.Random(2), 1500))
+    start, end = present[len(present) // 3][0] + 0.001, present[2 * len(present) // 3][0]
+    result = evidence.extract([TARGET], start=start, end=end, directory=str(tmp_path),
+                              out_path=str(tmp_path / "window.pcapng"), max_age=0)
+    _assert_pcap(result["path"], _expected(present, start, end))
+
+@pytest.mark.parametrize("tail", [0, 8, 15, 16, 100])
+def test_lap_endings(ring, tmp_path, tail):
+    """A lap ends exactly, leaves no room for a marker (< 16 bytes), or leaves room for one."""
+    pytest.importorskip("scapy")
+    written = []
+
+    def put(size):
+        ts = 1000.0 + len(written) * 0.01
+        frame = synthetic_packet(TARGET, PEER, 5000 + len(written) % 60000, 443, size)
+        ring.write(ts, frame)
+        written.append((ts, ring.pos - 16 - size, frame, TARGET, PEER))
+
+    for _ in range(2):
+        while ring.capacity - ring.pos % ring.capacity > 2000:
+            put(1000)
+        put(ring.capacity - ring.pos % ring.capacity - 16 - tail)
+    while ring.pos % ring.capacity < ring.capacity // 2:
+        put(1000)
+    result = evidence.extract([TARGET], directory=str(tmp_path), out_path=str(tmp_path / "laps.pcapng"), max_age=0)
+    _assert_pcap(result["path"], _expected(_present(ring, written)))
+
+def test_first_position_respects_floor(ring):
+    written = _fill(ring, random.Random(3), 1500)
+    present = _present(ring, written)
+    floor = ring.pos - ring.capacity + ring.capacity // 16
+    with open(ring.path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # Before everything still buffered: the oldest indexed frame past the floor, never a torn one
+        assert evidence._first_position(mm, SLOTS, floor, ring.pos, 0.0) == present[0][1]
+        # Inside the ring: the last indexed frame (the first of its chunk) at or before the start time
+        chunks = [frame[1] // ring.chunk for frame in present]
+        k = next(k for k in range(len(present) // 2, len(present)) if chunks[k] != chunks[k - 1])
+        assert evidence._first_position(mm, SLOTS, floor, ring.pos, present[k][0] + 0.001) == present[k][1]
+        assert evidence._first_position(mm, SLOTS, floor, ring.pos, present[k][0] - 0.001) < present[k][1]
+    finally:
+        mm.close()
+
+def test_snaplen_truncates_but_keeps_original_length(tmp_path):
+    pytest.importorskip("scapy")
+    from scapy.utils import rdpcap
+    ring = EvidenceRing(str(tmp_path / "short.ring"), capacity=CAPACITY, linktype=LINKTYPE_RAW, snaplen=64, slots=SLOTS)
+    ring.write(1000.0, synthetic_packet(TARGET, PEER, 5000, 443, 900))
+    ring.close()
+    result = evidence.extract([TARGET], directory=str(tmp_path), out_path=str(tmp_path / "short.pcapng"), max_age=0)
+    (pkt,) = rdpcap(result["path"])
+    assert len(bytes(pkt)) == 64 and pkt.wirelen == 900
+
+def test_lapped_during_extraction(ring, tmp_path, monkeypatch):
+    rng = random.Random(4)
+    written = _fill(ring, rng, 1500)
+    write_pcapng = evidence._write_pcapng
+    laps = {"left": 1}
+
+    def lapping_writer(out, rings, comment):
+        result = write_pcapng(out, rings, comment)
+        if laps["left"]:
+            laps["left"] -= 1
+            written.extend(_fill(ring, rng, 400, t0=written[-1][0] + 1))
+        return result
+
+    monkeypatch.setattr(evidence, "_write_pcapng", lapping_writer)
+    out = str(tmp_path / "retry.pcapng")
+    result = evidence.extract([TARGET], directory=str(tmp_path), out_path=out, max_age=0)
+    assert result["complete"]   # the second pass saw a quiet ring
+    assert result["packets"] == len(_expected(_present(ring, written)))
+
+    laps["left"] = 10   # the writer laps every pass: give up and say so
+    result = evidence.extract([TARGET], directory=str(tmp_path), out_path=out, max_age=0)
+    assert not result["complete"]
@@ -0,0 +1,100 @@
+"""The enforcer must render the same nftables batch it would apply, expire TTLs, and apply one batch at a time."""
+import threading
+import time
+
+import firewall
+from firewall import TABLE_NAME, DryRunBackend, Enforcer, NftablesBackend
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_nftables_render_splits_families_and_refreshes_timeouts():
+    script = NftablesBackend().render([("203.0.113.9", 60), ("2001:db8::9", 120)], ["198.51.100.7"])
+    assert script.splitlines() == [
+        f"add element inet {TABLE_NAME} blocklist4 {{ 203.0.113.9, 198.51.100.7 }}",
+        f"delete element inet {TABLE_NAME} blocklist4 {{ 203.0.113.9, 198.51.100.7 }}",
+        f"add element inet {TABLE_NAME} blocklist4 {{ 203.0.113.9 timeout 60s }}",
+        f"add element inet {TABLE_NAME} blocklist6 {{ 2001:db8::9 }}",
+        f"delete element inet {TABLE_NAME} blocklist6 {{ 2001:db8::9 }}",
+        f"add element inet {TABLE_NAME} blocklist6 {{ 2001:db8::9 timeout 120s }}",
+    ]
+
+def test_dry_run_ruleset_and_ttl_expiry(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(firewall.time, "monotonic", clock)
+    path = tmp_path / "ruleset.nft"
+    enforcer = Enforcer(DryRunBackend(str(path)), default_ttl=3600)
+    assert enforcer.block("203.0.113.9", ttl=60) and enforcer.block("2001:db8::9")
+    assert not enforcer.block("203.0.113.9", ttl=60)   # a refresh, not a new block
+    assert enforcer.flush()
+    ruleset = path.read_text()
+    assert NftablesBackend().setup_script() in ruleset
+    assert f"add element inet {TABLE_NAME} blocklist4 {{ 203.0.113.9 timeout 60s }}" in ruleset
+    assert f"add element inet {TABLE_NAME} blocklist6 {{ 2001:db8::9 timeout 3600s }}" in ruleset
+
+    clock.now += 61
+    assert enforcer.flush()
+    assert not enforcer.is_blocked("203.0.113.9") and enforcer.is_blocked("2001:db8::9")
+    assert "203.0.113.9" not in path.read_text()
+    assert enforcer.stats["expired"] == 1
+
+    # A refresh moves the expiry: the old heap entry must not unblock it
+    enforcer.block("2001:db8::9", ttl=7200)
+    clock.now += 3600
+    enforcer.flush()
+    assert enforcer.is_blocked("2001:db8::9")
+    enforcer.unblock("2001:db8::9")
+    enforcer.flush()
+    assert "2001:db8::9" not in path.read_text() and not enforcer.blocked
+
+class SlowBackend:
+    """Records whether two transactions ever overlapped and the order adds/removes arrived in."""
+    kernel_expiry = True
+
+    def __init__(self):
+        self.active = 0
+        self.overlapped = False
+        self.setups = 0
+        self.batches = []
+
+    def setup(self):
+        self.setups += 1
+        time.sleep(0.01)
+
+    def apply(self, additions, removals):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        time.sleep(0.002)
+        self.batches.append(([ip for ip, _ in additions], list(removals)))
+        self.active -= 1
+
+def test_concurrent_flushes_apply_one_batch_at_a_time():
+    backend = SlowBackend()
+    enforcer = Enforcer(backend)
+
+    def worker(k):
+        for i in range(20):
+            ip = f"10.{k}.0.{i}"
+            enforcer.block(ip)
+            enforcer.flush(force=True)
+            enforcer.unblock(ip)
+            enforcer.flush(force=True)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.setups == 1 and not backend.overlapped
+    # Every address was added before it was removed
+    added = {}
+    for n, (adds, removals) in enumerate(backend.batches):
+        for ip in adds:
+            added.setdefault(ip, n)
+        for ip in removals:
+            assert added[ip] < n
+    assert not enforcer.blocked and len(added) == 80
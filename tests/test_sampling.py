@@ -0,0 +1,52 @@
+"""The kernel sampling filter must keep exactly the flows flow_sampled() keeps."""
+import ctypes
+import random
+
+import pytest
+
+pytest.importorskip("scapy")
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.layers.l2 import Ether
+from scapy.packet import Raw
+
+try:
+    from scapy.libs import winpcapy
+    from scapy.arch.common import compile_filter
+except (ImportError, OSError):
+    pytest.skip("libpcap is not available", allow_module_level=True)
+
+import capture
+import decoder
+
+DLT_EN10MB = 1
+
+def _address(rng):
+    return ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+
+def _samples(rng, count=200):
+    for _ in range(count):
+        src, dst = _address(rng), _address(rng)
+        sport, dport = rng.randrange(1, 65536), rng.randrange(1, 65536)
+        yield IP(src=src, dst=dst) / TCP(sport=sport, dport=dport)
+        yield IP(src=src, dst=dst) / UDP(sport=sport, dport=dport) / Raw(b"payload")
+        yield IP(src=src, dst=dst) / ICMP()
+        # Later fragments: the protocol says TCP/UDP but there is no transport header
+        yield IP(src=src, dst=dst, proto=6, frag=rng.randrange(1, 0x2000)) / Raw(b"x" * 16)
+        yield IP(src=src, dst=dst, proto=17, frag=rng.randrange(1, 0x2000)) / Raw(b"x" * 16)
+
+def _matches(program, frame):
+    header = winpcapy.pcap_pkthdr(caplen=len(frame), len=len(frame))
+    data = ctypes.create_string_buffer(frame, len(frame))
+    return winpcapy._lib.pcap_offline_filter(ctypes.byref(program), ctypes.byref(header), data) != 0
+
+@pytest.mark.parametrize("shift", [1, 3, 8])
+def test_kernel_filter_agrees_with_flow_sampled(shift):
+    program = compile_filter(capture.sampling_bpf(shift), linktype=DLT_EN10MB)
+    kept = {}
+    for pkt in _samples(random.Random(shift)):
+        frame = bytes(Ether() / pkt)
+        _, src, dst, sport, dport, proto, _, _ = decoder.decode_frame(frame, 0.0)
+        expected = capture.flow_sampled(src, dst, sport, dport, shift)
+        assert _matches(program, frame) == expected, (proto, src, dst, sport, dport, pkt.frag)
+        kept[proto] = kept.get(proto, 0) + expected
+    assert set(kept) == {"TCP", "UDP", "ICMP", "IP"}
@@ -0,0 +1,83 @@
+"""The sharded pipeline must score like one process would: input order out, each flow's state intact."""
+import random
+
+import numpy as np
+import pytest
+
+import config
+import flows
+import sharding
+from model_store import ModelStore
+
+LAN = "192.168.1.0/24"
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("model") / "detector.joblib")
+    ModelStore(path).get()   # bootstrap a model on disk for the workers to load
+    return path
+
+@pytest.fixture
+def pipeline(model_path, monkeypatch):
+    # Workers are spawned and read their settings from the environment
+    monkeypatch.setenv("RAKSHAK_MODEL_PATH", model_path)
+    monkeypatch.setenv("RAKSHAK_BASELINES", "0")
+    monkeypatch.setenv("RAKSHAK_SCAN_SUBNETS", LAN)
+    pipeline = sharding.ShardedPipeline(2, ring_size=1024).start()
+    yield pipeline
+    pipeline.stop()
+
+def _interleaved(rng, count, flows_count=40, t0=1000.0):
+    """Packets of many flows, both directions, shuffled together."""
+    conversations = [(f"192.168.1.{rng.randrange(2, 60)}", f"203.0.113.{rng.randrange(1, 250)}",
+                      rng.randrange(1024, 65535), rng.choice([443, 53, 80]), rng.choice(["TCP", "UDP"]))
+                     for _ in range(flows_count)]
+    records = []
+    for k in range(count):
+        local, remote, lport, rport, proto = rng.choice(conversations)
+        ts = t0 + k * 0.002
+        if rng.random() < 0.5:
+            records.append((ts, local, remote, lport, rport, proto, rng.randrange(60, 1500), 0x18 if proto == "TCP" else 0))
+        else:
+            records.append((ts, remote, local, rport, lport, proto, rng.randrange(60, 1500), 0x10 if proto == "TCP" else 0))
+    return records
+
+def _reference_scores(model_path, batches):
+    """What a single process with one flow table would score."""
+    flows.set_lan([LAN])
+    table = flows.FlowTable(window=config.FLOW_WINDOW, idle_timeout=config.FLOW_IDLE_TIMEOUT, max_flows=config.FLOW_MAX)
+    model = ModelStore(model_path).get()
+    scores = []
+    for records in batches:
+        features = [table.features(table.update(ts, flows.flow_key(src, dst, sport, dport, proto), size, flags,
+                                                upload=flows.is_local_address(src)))
+                    for ts, src, dst, sport, dport, proto, size, flags in records]
+        scores.append(model.score_samples(np.asarray(features, dtype=np.float64)))
+    return scores
+
+def test_input_order_and_per_flow_state(pipeline, model_path):
+    rng = random.Random(1)
+    # The second batch is bigger than the ring, so it is chunked and waits for free slots
+    batches = [_interleaved(rng, 300), _interleaved(rng, 2500, t0=1001.0)]
+    expected = _reference_scores(model_path, batches)
+    for records, reference in zip(batches, expected):
+        scored, scores, thresholds, baselines = pipeline.process(records)
+        assert scored == records
+        assert np.allclose(scores, reference, rtol=1e-5, atol=1e-6)
+        assert len(thresholds) == len(baselines) == len(records)
+    assert pipeline.process([]) == ([], [], [], [])
+
+def test_dead_worker_is_replaced(pipeline):
+    rng = random.Random(2)
+    records = _interleaved(rng, 400)
+    pipeline.process(records)
+    pipeline.shards[0].process.kill()
+    pipeline.shards[0].process.join()
+    with pytest.raises(sharding.ShardFailed):
+        pipeline.process(_interleaved(rng, 400, t0=1001.0))
+    assert pipeline.stats["restarts"] == 1 and pipeline.shards[0].process.is_alive()
+    # Healthy shards were drained and the new one starts clean: later batches line up again
+    for t0 in (1002.0, 1003.0):
+        records = _interleaved(rng, 400, t0=t0)
+        scored, scores, _, _ = pipeline.process(records)
+        assert scored == records and not any(np.isnan(scores))
@@ -0,0 +1,74 @@
+"""The sketches trade exactness for memory; these pin down the guarantees the detectors rely on."""
+import math
+import random
+from collections import defaultdict
+
+from sketches import DecayedCountMin, DecayedSpaceSaving, HyperLogLog
+
+def _decayed(events, ts, tau):
+    """Exact decayed count per key as of ts."""
+    totals = defaultdict(float)
+    for key, at, amount in events:
+        totals[key] += amount * math.exp((at - ts) / tau)
+    return totals
+
+def test_count_min_never_underestimates():
+    rng = random.Random(1)
+    tau = 5.0
+    # A small table forces collisions; the stream spans several renormalizations
+    sketch = DecayedCountMin(width=64, depth=3, tau=tau)
+    events = []
+    ts = 0.0
+    for _ in range(20000):
+        ts += rng.expovariate(25.0)
+        key = int(rng.paretovariate(1.2)) if rng.random() < 0.7 else rng.randrange(100000)
+        amount = rng.choice([1.0, 60.0, 1500.0])
+        returned = sketch.add(key, ts, amount)
+        events.append((key, ts, amount))
+        assert returned >= amount * (1 - 1e-9)
+    assert ts > 60 * tau
+    truth = _decayed(events, ts, tau)
+    for key, count in truth.items():
+        assert sketch.estimate(key, ts) >= count * (1 - 1e-9) - 1e-9
+
+def test_hyperloglog_error_at_1e5():
+    distinct = 100000
+    for p in (12, 14):
+        hll, low, high = HyperLogLog(p), HyperLogLog(p), HyperLogLog(p)
+        for item in range(distinct):
+            hll.add(item)
+            hll.add(item)   # repeats never count twice
+            (low if item < distinct // 2 else high).add(item)
+        assert abs(hll.count() - distinct) / distinct < 0.05
+        # The incrementally kept estimate matches one recomputed by merging halves
+        low.merge(high)
+        assert math.isclose(low.count(), hll.count())
+
+def test_space_saving_keeps_heavy_hitters_after_decay():
+    rng = random.Random(2)
+    tau, capacity = 10.0, 32
+    top = DecayedSpaceSaving(capacity=capacity, tau=tau)
+    events = []
+
+    def feed(start, heavy, seconds):
+        ts = start
+        while ts < start + seconds:
+            ts += 0.01
+            if rng.random() < 0.3:
+                key, amount = rng.choice(heavy), 1500.0
+            else:
+                key, amount = ("noise", rng.randrange(5000)), float(rng.randrange(40, 600))
+            top.add(key, amount, ts)
+            events.append((key, ts, amount))
+        return ts
+
+    feed(0.0, ["old-a", "old-b"], 60.0)
+    # Well past several time constants the old talkers have decayed away
+    ts = feed(200.0, ["new-a", "new-b", "new-c"], 60.0)
+    ranked = top.top(3, ts)
+    assert {key for key, _, _ in ranked} == {"new-a", "new-b", "new-c"}
+    truth = _decayed(events, ts, tau)
+    for key, count, error in top.top(capacity, ts):
+        # Space-saving only overcounts, by at most the inherited error
+        assert count - error - 1e-6 <= truth[key] <= count + 1e-6
+    assert math.isclose(top.decayed_total(ts), sum(truth.values()), rel_tol=1e-9)
@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+THREAT_STATUS = "🚨 THREAT"
+
+def to_local_datetime(epoch):
+    """Epoch seconds -> naive local-time datetimes (matches the HH:MM:SS shown in the table)."""
+    return pd.to_datetime(epoch, unit="s") + pd.Timedelta(seconds=time.localtime().tm_gmtoff)
+
+# --- 1. CATEGORY CODES ---
+class Categories:
+    """Maps repeated strings (devices, protocols, statuses...) to small integer codes."""
+
+    def __init__(self, initial=()):
+        self.codes = {}
+        self.values = []
+        for value in initial:
+            self.code(value)
+
+    def code(self, value):
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def decode(self, codes):
+        return np.asarray(self.values, dtype=object)[codes]
+
+# --- 2. COLUMNAR RING BUFFER ---
+class TrafficStore:
+    """
+    Preallocated columnar history of dashboard rows.
+
+    Every column is a NumPy array of 2 x capacity and each row is written
+    twice (slot i and i + capacity). Appends stay O(1) and the latest n rows
+    are always one contiguous slice, so views are handed out without copying.
+    Totals (events, threats, bytes, protocols) are kept incrementally rather
+    than recomputed from the history.
+    """
+
+    CATEGORY_COLUMNS = ("Device", "Destination", "Direction", "Protocol", "AI_Status", "Alert")
+
+    def __init__(self, capacity=5000):
+        self.capacity = max(1, int(capacity))
+        size = 2 * self.capacity
+        self.epoch = np.zeros(size, dtype=np.float64)
+        self.size = np.zeros(size, dtype=np.float32)
+        self.score = np.zeros(size, dtype=np.float32)
+        self.codes = {name: np.zeros(size, dtype=np.int32) for name in self.CATEGORY_COLUMNS}
+        self.categories = {name: Categories() for name in self.CATEGORY_COLUMNS}
+        self._threat_code = self.categories["AI_Status"].code(THREAT_STATUS)
+        self.count = 0
+        # Incremental counters
+        self.total_bytes = 0.0
+        self.estimated_events = 0
+        self.total_threats = 0
+        self.window_threats = 0
+        self.protocol_counts = {}
+
+    def append(self, row):
+        i = self.count % self.capacity
+        j = i + self.capacity
+        status = self.categories["AI_Status"].code(row.get("AI_Status", "-"))
+        if self.count >= self.capacity and self.codes["AI_Status"][i] == self._threat_code:
+            self.window_threats -= 1   # the row being overwritten leaves the window
+
+        self.epoch[i] = self.epoch[j] = row.get("Epoch") or time.time()
+        self.size[i] = self.size[j] = row.get("Size_KB") or 0
+        self.score[i] = self.score[j] = row.get("Anomaly_Score") or 0.0
+        for name in self.CATEGORY_COLUMNS:
+            code = status if name == "AI_Status" else self.categories[name].code(row.get(name, "-"))
+            self.codes[name][i] = self.codes[name][j] = code
+        self.count += 1
+
+        # Sampled rows are scaled back up so totals estimate the real traffic
+        weight = row.get("Sample_Rate") or 1
+        self.estimated_events += weight
+        self.total_bytes += (row.get("Size_KB") or 0) * weight
+        if status == self._threat_code:
+            self.total_threats += 1
+            self.window_threats += 1
+        proto = row.get("Protocol", "-")
+        self.protocol_counts[proto] = self.protocol_counts.get(proto, 0) + 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _window(self, n):
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity + self.capacity
+        return slice(end - n, end)
+
+    def columns(self, n=None, newest_first=True):
+        """Zero-copy views of the latest n rows: numeric arrays plus category codes."""
+        window = self._window(n)
+        step = -1 if newest_first else 1
+        cols = {"Epoch": self.epoch[window][::step], "Size_KB": self.size[window][::step],
+                "Anomaly_Score": self.score[window][::step]}
+        for name in self.CATEGORY_COLUMNS:
+            cols[name] = self.codes[name][window][::step]
+        return cols
+
+    def frame(self, n=None, newest_first=True):
+        """DataFrame of the latest n rows with categorical columns (codes are not copied)."""
+        cols = self.columns(n, newest_first)
+        data = {
+            "Timestamp": to_local_datetime(cols["Epoch"]),
+            "Size_KB": cols["Size_KB"],
+            "Anomaly_Score": cols["Anomaly_Score"],
+        }
+        for name in self.CATEGORY_COLUMNS:
+            data[name] = pd.Categorical.from_codes(cols[name], categories=self.categories[name].values)
+        return pd.DataFrame(data, copy=False)
+
+    def _rows(self, cols):
+        decoded = {name: self.categories[name].decode(cols[name]) for name in self.CATEGORY_COLUMNS}
+        rows = []
+        for k in range(len(cols["Epoch"])):
+            epoch = float(cols["Epoch"][k])
+            row = {"Timestamp": time.strftime("%H:%M:%S", time.localtime(epoch)), "Epoch": epoch}
+            for name in self.CATEGORY_COLUMNS:
+                row[name] = decoded[name][k]
+            row["Size_KB"] = float(cols["Size_KB"][k])
+            row["Anomaly_Score"] = float(cols["Anomaly_Score"][k])
+            rows.append(row)
+        return rows
+
+    def records(self, n=None):
+        """Latest n rows as dicts (newest first), for small displays like the HTML table."""
+        return self._rows(self.columns(n))
+
+    def since(self, count):
+        """
+        Rows appended after event number `count`, oldest first, and the new
+        event count to pass next time. Lets another process mirror the store
+        incrementally; anything older than the window is skipped.
+        """
+        n = self.count - count if 0 <= count <= self.count else self.count
+        return self.count, self._rows(self.columns(n, newest_first=False))
+
+    def stats(self):
+        return {
+            "events": self.count,
+            "events_estimated": self.estimated_events,
+            "buffered": len(self),
+            "capacity": self.capacity,
+            "threats_total": self.total_threats,
+            "threats_in_window": self.window_threats,
+            "bytes_total": self.total_bytes,
+            "protocols": dict(self.protocol_counts),
+        }